@@ -0,0 +1,198 @@
+"""
+Wall-clock for equal work: sequential Evolution loop vs island-model evolution
+
+Runs on CPU without an LLM: a seeded mock LLM answers after a fixed latency with a candidate
+that improves on its parents by a random step (hill climbing on a hidden "skill" k), and
+candidates are executed on the real sandbox against the test cases.
+The islands run a fixed number of epochs; the sequential loop then runs until it has made the
+same number of LLM calls (so the same number of candidates), and neither stops at the target:
+the time to target is read off each run.
+Reference runs (defaults): 52-54 LLM calls and 208-216 evaluated candidates each. 4 islands finish
+the budget in 4.4-4.9s vs 11.8-12.5s sequential, because the islands overlap their LLM latency.
+That is throughput only: the islands do not reach the (easy) target sooner, they got there at
+2.6-3.1s vs 1.5-3.1s sequential. This benchmark shows no time-to-target gain from the island model.
+
+    cd eoh && python benchmarks/islands.py
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from itertools import cycle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from methods.islands import DEFAULT_OPERATORS, IslandModel  # noqa: E402
+from methods.meta_prompt import MetaPrompt, PromptMode  # noqa: E402
+from methods.population import Evolution  # noqa: E402
+
+CANDIDATE = """{{"reasoning": "square the inputs below {k}"}}
+```python
+def square(x: int) -> int:
+    k = {k}
+    variant = {variant}
+    return x * x if x < k else -1
+```"""
+SKILL = re.compile(r"k = (\d+)")
+STEPS = [-1, 0, 1, 1, 2]
+
+
+class MockLLM:
+    """
+    Seeded stand-in for an LLM endpoint: every call takes `latency` seconds (a batch is served
+    concurrently), and each candidate's k is the best parent k found in the prompt plus a random step
+    - The random stream is keyed on (prompt, times seen, batch position), so runs are reproducible
+    """
+
+    def __init__(self, latency: float, seed: int = 0):
+        self.latency = latency
+        self.seed = seed
+        self.calls = 0
+        self.candidates = 0
+        self.seen = Counter()
+        self._lock = threading.Lock()
+
+    def _candidate(self, prompt: str, index: int) -> str:
+        with self._lock:
+            self.seen[prompt] += 1
+            occurrence = self.seen[prompt]
+        digest = hashlib.sha256(f"{self.seed}|{occurrence}|{index}|{prompt}".encode())
+        rng = random.Random(digest.hexdigest())
+        parents = [int(k) for k in SKILL.findall(prompt)]
+        if parents:
+            k = max(0, max(parents) + rng.choice(STEPS))
+        else:  # i1
+            k = rng.randint(0, 2)
+        # every candidate is distinct code, so each one is evaluated in both modes
+        return CANDIDATE.format(k=k, variant=rng.getrandbits(32))
+
+    def __call__(self, prompts, desc=""):
+        with self._lock:
+            self.calls += 1
+            self.candidates += 1 if isinstance(prompts, str) else len(prompts)
+        time.sleep(self.latency)
+        if isinstance(prompts, str):
+            return self._candidate(prompts, 0)
+        return [self._candidate(prompt, i) for i, prompt in enumerate(prompts)]
+
+
+def build_task(num_cases: int):
+    meta_prompt = MetaPrompt(
+        task="Square an integer",
+        func_name="square",
+        inputs=["x"],
+        outputs=["y"],
+        input_types=["int"],
+        output_types=["int"],
+        mode=PromptMode.CODE,
+    )
+    test_cases = [({"x": x}, {"y": x * x}) for x in range(num_cases)]
+    return meta_prompt, test_cases
+
+
+def best_fitness(pop) -> float:
+    return max((indiv["fitness"] or 0.0 for indiv in pop), default=0.0)
+
+
+def run_islands(args, llm: MockLLM) -> dict:
+    meta_prompt, test_cases = build_task(args.num_cases)
+    model = IslandModel(
+        args.islands,
+        args.pop_size,
+        meta_prompt,
+        llm,
+        test_cases=test_cases,
+        max_attempts=1,
+        migration_interval=args.migration_interval,
+        query_node=False,
+        seed=args.seed,
+        sandbox=True,
+    )
+    for island in model.islands:
+        island.evol.library_dir = args.library_dir
+    start_time = time.perf_counter()
+    model.evolve(args.epochs)
+    return {
+        "elapsed": time.perf_counter() - start_time,
+        "to_target": model.time_to_fitness(args.target),
+        "fitness": model.best_fitness,
+        "evaluated": sum(len(island.evol.telemetry) for island in model.islands),
+    }
+
+
+def run_sequential(args, llm: MockLLM, budget: int) -> dict:
+    meta_prompt, test_cases = build_task(args.num_cases)
+    evolution = Evolution(
+        args.pop_size,
+        meta_prompt,
+        llm,
+        test_cases=test_cases,
+        max_attempts=1,
+        query_node=False,
+        seed=args.seed,
+        sandbox=True,
+    )
+    # keep solved nodes out of the node library
+    evolution.evol.library_dir = args.library_dir
+    start_time, to_target = time.perf_counter(), None
+    operators = cycle(DEFAULT_OPERATORS)
+    while llm.calls < budget:
+        evolution.get_offspring(next(operators))
+        if to_target is None and best_fitness(evolution.population) >= args.target:
+            to_target = time.perf_counter() - start_time
+    return {
+        "elapsed": time.perf_counter() - start_time,
+        "to_target": to_target,
+        "fitness": best_fitness(evolution.population),
+        "evaluated": len(evolution.evol.telemetry),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--islands", type=int, default=4)
+    parser.add_argument("--pop-size", type=int, default=4)
+    parser.add_argument("--num-cases", type=int, default=12)
+    parser.add_argument("--target", type=float, default=1.0)
+    parser.add_argument(
+        "--epochs", type=int, default=3, help="island epochs, sets the budget"
+    )
+    parser.add_argument("--migration-interval", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f" :: Target fitness {args.target} on {args.num_cases} test cases, "
+        f"{args.latency * 1e3:.0f}ms mock LLM latency, batches of {args.pop_size}"
+    )
+    budget = None
+    for label in [f"{args.islands} islands", "sequential loop"]:
+        llm = MockLLM(args.latency, args.seed)
+        with tempfile.TemporaryDirectory() as args.library_dir:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if budget is None:
+                    result = run_islands(args, llm)
+                    budget = llm.calls
+                else:
+                    result = run_sequential(args, llm, budget)
+        to_target = result["to_target"]
+        reached = f"{to_target:6.2f}s" if to_target is not None else "not reached"
+        print(
+            f"     :: {label:<16} {result['elapsed']:6.2f}s for {llm.calls} LLM calls "
+            f"({llm.candidates} candidates, {result['evaluated']} evaluated), "
+            f"target at {reached}, best fitness {result['fitness']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Parent selection on large populations: per-tournament loop vs vectorised selection schemes
+
+Times one parent_selection call (m distinct parents) on synthetic populations of 10k+
+individuals with clone-heavy fitness (few distinct values), as late-stage populations have.
+The loop reference is the selection used before it was vectorised.
+
+    cd eoh && python benchmarks/selection.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from methods.population import parent_selection  # noqa: E402
+from methods.population_store import fitness_rank  # noqa: E402
+from methods.selection import SELECTION_MODES, code_embedding  # noqa: E402
+
+
+def loop_parent_selection(pop, m, proportion=0.8):
+    selected_parents = []
+    tournament_size = min(len(pop) // m, int(len(pop) * proportion))
+    while len(selected_parents) != m:
+        tournament = np.random.choice(pop, size=max(2, tournament_size), replace=False)
+        winner = max(tournament, key=fitness_rank)
+        if winner not in selected_parents:
+            selected_parents.append(winner)
+    return selected_parents
+
+
+def build_population(size: int, levels: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "reasoning": f"Approach {i}",
+            "code": f"def solve(xs: list) -> int:\n    k = {i}\n"
+            + "".join(f"    step_{j} = {rng.integers(100)} * k\n" for j in range(6))
+            + "    return sum(xs) + k\n",
+            "fitness": float(rng.integers(levels)) / levels,
+        }
+        for i in range(size)
+    ]
+
+
+def time_call(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--parents", type=int, nargs="+", default=[2, 32])
+    parser.add_argument("--levels", type=int, default=5, help="distinct fitness values")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f" :: One parent_selection call, {args.levels} distinct fitness values, "
+        f"best of {args.repeat}"
+    )
+    for size in args.sizes:
+        pop = build_population(size, args.levels)
+        start = time.perf_counter()
+        for indiv in pop:
+            code_embedding(indiv["code"])
+        embed_time = time.perf_counter() - start
+        print(
+            f"     :: {size} individuals (code embeddings: {embed_time:.2f}s uncached, cached after)"
+        )
+        for m in args.parents:
+            timings = [
+                (
+                    "loop tournament",
+                    time_call(lambda: loop_parent_selection(pop, m), args.repeat),
+                )
+            ]
+            rng = np.random.default_rng(0)
+            for mode in SELECTION_MODES:
+                timings.append(
+                    (
+                        mode,
+                        time_call(
+                            lambda: parent_selection(pop, m, rng=rng, mode=mode),
+                            args.repeat,
+                        ),
+                    )
+                )
+            row = ", ".join(f"{label} {t * 1e3:.1f}ms" for label, t in timings)
+            print(f"         :: m={m:<3} {row}")
+
+
+if __name__ == "__main__":
+    main()
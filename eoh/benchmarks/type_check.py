@@ -0,0 +1,124 @@
+"""
+Node I/O type validation: recursive check_type vs compiled checkers and sampling modes
+
+Times one validation of typical (and large) node inputs / outputs against their annotations.
+The recursive reference is the checker evaluation used before checkers were compiled.
+
+    cd eoh && python benchmarks/type_check.py
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from typing import Any, Dict, List, Optional, Set, Tuple, get_args, get_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from methods.meta_execute import (  # noqa: E402
+    TYPE_CHECK_MODES,
+    check_type,
+    compile_type_checker,
+    set_type_check_mode,
+)
+
+
+def reference_check_type(value, expected_type):
+    if expected_type is Any:
+        return True
+
+    origin = get_origin(expected_type)
+    if origin is None:
+        return isinstance(value, expected_type)
+    if not isinstance(value, origin):
+        return False
+
+    args = get_args(expected_type)
+    if not args:
+        return True
+    if isinstance(value, (list, tuple, set)):
+        return all(reference_check_type(item, args[0]) for item in value)
+    elif isinstance(value, dict):
+        return all(reference_check_type(k, args[0]) for k in value.keys()) and all(
+            reference_check_type(v, args[1]) for v in value.values()
+        )
+    return True
+
+
+def build_cases(size: int) -> List[Tuple[str, Any, Any]]:
+    """
+    (label, annotation, value) triples, all of which type-check
+    """
+    return [
+        ("int", int, 7),
+        ("List[str] (10)", List[str], [f"paper {i}" for i in range(10)]),
+        ("List[int]", List[int], list(range(size))),
+        ("List[float]", List[float], [i / 3 for i in range(size)]),
+        ("Set[int]", Set[int], set(range(size))),
+        (
+            "Dict[str, List[float]]",
+            Dict[str, List[float]],
+            {f"k{i}": [0.5] * 8 for i in range(size // 8)},
+        ),
+        (
+            "List[List[int]]",
+            List[List[int]],
+            [list(range(8)) for _ in range(size // 8)],
+        ),
+        (
+            "List[Optional[int]]",
+            List[Optional[int]],
+            [None if i % 7 == 0 else i for i in range(size)],
+        ),
+    ]
+
+
+def time_call(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--sample-size", type=int, default=32)
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = build_cases(args.size)
+    for label, annotation, value in cases:
+        assert check_type(value, annotation), label
+        bad = [*value, object()] if isinstance(value, list) else object()
+        assert not check_type(bad, annotation), label
+
+    header = f"{'annotation':<26}{'recursive':>12}" + "".join(
+        f"{mode:>12}" for mode in TYPE_CHECK_MODES
+    )
+    print(
+        f" :: {len(cases)} annotations, containers of {args.size} elements, times per check"
+    )
+    print(f"     :: {header}")
+    for label, annotation, value in cases:
+        try:
+            reference = time_call(
+                lambda: reference_check_type(value, annotation), args.number
+            )
+        except TypeError:  # e.g. Optional[...] inside a container
+            reference = None
+        timings = []
+        checker = compile_type_checker(annotation)
+        for mode in TYPE_CHECK_MODES:
+            set_type_check_mode(mode, args.sample_size)
+            timings.append(time_call(lambda: checker(value), args.number))
+        set_type_check_mode("full")
+        row = "".join(f"{t * 1e3:>10.3f}ms" for t in timings)
+        if reference is None:
+            print(f"     :: {label:<26}{'TypeError':>12}{row}")
+        else:
+            print(
+                f"     :: {label:<26}{reference * 1e3:>10.3f}ms{row}   "
+                f"({reference / timings[0]:.1f}x full vs recursive)"
+            )
+
+
+if __name__ == "__main__":
+    main()
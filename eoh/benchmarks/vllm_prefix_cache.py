@@ -0,0 +1,205 @@
+"""
+Prefill tokens saved by prefix-ordered batching on a realistic EvolNode prompt batch
+
+Runs on CPU without vLLM: a mock engine replays vLLM's automatic prefix caching
+(hash-chained KV blocks with LRU eviction) and a mock tokenizer renders the
+Llama-3.1 chat template.
+
+    cd eoh && python benchmarks/vllm_prefix_cache.py
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from methods.evolnode import EvolNode  # noqa: E402
+from methods.llm import ChatTemplate, prefix_order  # noqa: E402
+from methods.meta_prompt import (  # noqa: E402
+    ALIGNMENT_CHECK_PROMPT,
+    MetaPrompt,
+    PromptMode,
+)
+
+LIBRARY_DIR = os.path.join(os.path.dirname(__file__), "..", "methods", "nodes")
+LIBRARY_NODES = ["search_google", "get_arxiv_papers", "extract_paper_info"]
+
+LLAMA_31_TEMPLATE = (
+    "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n"
+    "Cutting Knowledge Date: December 2023\nToday Date: 26 Jul 2024\n\n<|eot_id|>"
+    "{turns}"
+)
+TURN = "<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>"
+
+
+class MockTokenizer:
+    """
+    Stand-in for a HF tokenizer: renders the Llama-3.1 template turn by turn
+    """
+
+    def apply_chat_template(self, messages: List[dict], tokenize: bool = False):
+        turns = "".join(
+            TURN.format(role=m["role"], content=m["content"].strip()) for m in messages
+        )
+        return LLAMA_31_TEMPLATE.format(turns=turns)
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+|[^\w\s]|\s+", text)
+
+
+class MockPrefixCacheEngine:
+    """
+    vLLM-style automatic prefix caching: full KV blocks are keyed on the hash of all
+    tokens up to and including the block, and evicted least-recently-used
+    """
+
+    def __init__(self, block_size: int = 16, num_blocks: int = 512):
+        self.block_size = block_size
+        self.num_blocks = num_blocks
+        self.blocks = OrderedDict()
+
+    def prefill(self, prompt: str) -> int:
+        """
+        Number of prompt tokens that had to be computed (not served from cache)
+        """
+        tokens = tokenize(prompt)
+        computed, parent = 0, None
+        for start in range(0, len(tokens), self.block_size):
+            block = tuple(tokens[start : start + self.block_size])
+            key = hash((parent, block))
+            parent = key
+            if len(block) < self.block_size:  # partial blocks are never cached
+                computed += len(block)
+            elif key in self.blocks:
+                self.blocks.move_to_end(key)
+            else:
+                computed += len(block)
+                self.blocks[key] = True
+                if len(self.blocks) > self.num_blocks:
+                    self.blocks.popitem(last=False)
+        return computed
+
+    def generate(self, prompts: List[str]) -> int:
+        return sum(self.prefill(prompt) for prompt in prompts)
+
+
+def fake_response(prompts, desc=""):
+    return "" if isinstance(prompts, str) else [""] * len(prompts)
+
+
+def build_prompts(num_generations: int, seed: int = 0) -> List[str]:
+    """
+    Prompts of a few EvolNodes evolving side by side (as under PlanNode.evolve_sub_nodes):
+    crossover / mutation prompts over a population plus alignment-check prompts
+    """
+    rng = random.Random(seed)
+    library = [
+        EvolNode.load(name, LIBRARY_DIR, get_response=fake_response)
+        for name in LIBRARY_NODES
+    ]
+    tasks = [
+        ("rank_papers", "Rank arxiv papers by relevance to a research question"),
+        ("summarise_paper", "Summarise the key contributions of a paper"),
+        ("find_collaborators", "Find likely collaborators for an author"),
+    ]
+    prompts = []
+    for func_name, task in tasks:
+        meta_prompt = MetaPrompt(
+            task=task,
+            func_name=func_name,
+            inputs=["query"],
+            outputs=["result"],
+            input_types=["str"],
+            output_types=["str"],
+            mode=PromptMode.CODE,
+        )
+        node = EvolNode(
+            meta_prompt,
+            get_response=fake_response,
+            test_cases=[({"query": "q"}, {"result": "r"})],
+        )
+        node.relevant_nodes = library
+        population = [
+            {
+                "reasoning": f"Approach {i}: score candidates with heuristic {i}",
+                "code": f"def {func_name}(query: str) -> str:\n"
+                + "".join(f"    step_{j} = {i} * {j}\n" for j in range(12))
+                + "    return str(query)\n",
+                "fitness": rng.random(),
+            }
+            for i in range(8)
+        ]
+        for _ in range(num_generations):
+            prompts.append(node._get_evolve_prompt("i1"))
+            for method in ("e1", "e2"):
+                prompts.append(
+                    node._get_evolve_prompt(method, rng.sample(population, 2))
+                )
+            for method in ("m1", "m2"):
+                prompts.append(node._get_evolve_prompt(method, rng.choice(population)))
+            for case in range(4):
+                prompts.append(
+                    ALIGNMENT_CHECK_PROMPT.format(
+                        pred_output={
+                            "result": f"{func_name} {case} {rng.random():.3f}"
+                        },
+                        target_output={"result": f"{func_name} {case}"},
+                    )
+                )
+    rng.shuffle(prompts)  # arrival order of concurrent nodes
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--generations", type=int, default=8)
+    parser.add_argument("--block-size", type=int, default=16)
+    parser.add_argument("--num-blocks", type=int, default=512)
+    args = parser.parse_args()
+
+    prompts = build_prompts(args.generations)
+    tokenizer = MockTokenizer()
+    template = ChatTemplate(tokenizer)
+
+    start_time = time.perf_counter()
+    rendered = [template.render(prompt.strip()) for prompt in prompts]
+    render_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    spliced = [template(prompt.strip()) for prompt in prompts]
+    splice_time = time.perf_counter() - start_time
+    assert rendered == spliced, "cached chat template differs from per-prompt rendering"
+
+    total = sum(len(tokenize(prompt)) for prompt in spliced)
+    arrival = MockPrefixCacheEngine(args.block_size, args.num_blocks).generate(spliced)
+    ordered = MockPrefixCacheEngine(args.block_size, args.num_blocks).generate(
+        [spliced[i] for i in prefix_order(spliced)]
+    )
+
+    mode = "spliced" if template.prefix is not None else "memoised"
+    print(f" :: {len(prompts)} prompts, {total} prompt tokens")
+    print(
+        f" :: Chat template: {render_time * 1e3:.1f}ms per-prompt rendering, "
+        f"{splice_time * 1e3:.2f}ms cached ({mode})"
+    )
+    print(
+        f" :: Prefill tokens, cache of {args.num_blocks} x {args.block_size}-token blocks:"
+    )
+    for label, computed in [
+        ("no prefix caching", total),
+        ("prefix caching, arrival order", arrival),
+        ("prefix caching, prefix order", ordered),
+    ]:
+        print(
+            f"     :: {label:<32} {computed:>8} computed ({1 - computed / total:6.1%} saved)"
+        )
+
+
+if __name__ == "__main__":
+    main()
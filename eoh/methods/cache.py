@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .sampling import expand_samples, mark_samples
+
+# Content-addressed caching for LLM calls
+# - Key: (model, system prompt, prompt, sampling params, sample index)
+# - Sample index: occurrence of the prompt so far in the run, across calls, so `[prompt] * batch_size`
+#   and retries of the same prompt get fresh samples, while a replayed run hits the same entries
+# - Misses go to the backend as the caller's prompt objects: `(prompt, n)` entries and SampledPrompt
+#   markings survive, and a repeated prompt stays marked as sampled when only some of its samples miss
+# - SQLite backend with LRU eviction bounded by entry count and total bytes
+
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+
+
+def hash_key(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def sample_indices(prompts: List[str]) -> List[int]:
+    """
+    Occurrence index of each prompt within the batch
+    - ["a", "b", "a"] -> [0, 0, 1]
+    """
+    seen = {}
+    indices = []
+    for prompt in prompts:
+        indices.append(seen.get(prompt, 0))
+        seen[prompt] = indices[-1] + 1
+    return indices
+
+
+class SQLiteLRUStore:
+    """
+    Key-value store on SQLite, evicting least-recently-used entries
+    once either `max_entries` or `max_bytes` is exceeded
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.path = path or ":memory:"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, access INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_access ON cache(access)"
+            )
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(MAX(access), 0) FROM cache"
+            ).fetchone()
+        self._count, self._bytes, self._clock = row
+        # export path -> access clock at its last export
+        self._exported: Dict[str, int] = {}
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE cache SET access = ? WHERE key = ?", (self._tick(), key)
+            )
+            return row[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock, self._conn:
+            old = self._conn.execute(
+                "SELECT size FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if old is not None:
+                self._count -= 1
+                self._bytes -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), self._tick()),
+            )
+            self._count += 1
+            self._bytes += len(value)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._count > self.max_entries or (
+            self._bytes > self.max_bytes and self._count > 0
+        ):
+            overflow = max(self._count - self.max_entries, 1)
+            rows = self._conn.execute(
+                "SELECT key, size FROM cache ORDER BY access LIMIT ?", (overflow,)
+            ).fetchall()
+            self._conn.executemany(
+                "DELETE FROM cache WHERE key = ?", [(key,) for key, _ in rows]
+            )
+            self._count -= len(rows)
+            self._bytes -= sum(size for _, size in rows)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+            self._count, self._bytes = 0, 0
+
+    def export_to(self, path: str) -> int:
+        """
+        Copy this store's entries into the store at `path` (created if needed)
+        - Incremental: after a first full copy, only entries set or read since the previous export
+          to the same path (past its access clock) are written; returns the number of entries written
+        """
+        path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            since = self._exported.get(path, -1)
+            self._conn.execute("ATTACH DATABASE ? AS export", (path,))
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "CREATE TABLE IF NOT EXISTS export.cache ("
+                        "key TEXT PRIMARY KEY, value BLOB, size INTEGER, access INTEGER)"
+                    )
+                    cursor = self._conn.execute(
+                        "INSERT OR REPLACE INTO export.cache "
+                        "SELECT * FROM main.cache WHERE access > ?",
+                        (since,),
+                    )
+                self._exported[path] = self._clock
+                return cursor.rowcount
+            finally:
+                self._conn.execute("DETACH DATABASE export")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class CachedResponse:
+    """
+    Drop-in caching `get_response` for EvolNode, PlanNode and Evolution
+    - Cache hits are served locally, only misses go to the wrapped callable
+    - Empty responses (failed calls) are never cached
+    - model: identity of the backend in the keys, defaults to `get_response.model`
+    - occurrences: prompt hash -> samples asked so far, restored by a resumed run
+    """
+
+    def __init__(
+        self,
+        get_response: Callable,
+        model: Optional[str] = None,
+        system_prompt: str = "",
+        sampling_params: Optional[dict] = None,
+        path: Optional[str] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self._get_response = get_response
+        # a function name would let every model and endpoint share the same keys
+        self.model = model or getattr(get_response, "model", None)
+        if not self.model:
+            raise ValueError(
+                "CachedResponse needs the model identity: pass `model` or set `get_response.model`"
+            )
+        self.system_prompt = system_prompt
+        self.sampling_params = sampling_params or {}
+        self.store = SQLiteLRUStore(path, max_entries, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.occurrences: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def key(self, prompt: str, sample_index: int = 0) -> str:
+        return hash_key(
+            self.model,
+            self.system_prompt,
+            prompt,
+            self.sampling_params,
+            sample_index,
+        )
+
+    def _call(self, prompts: List[str], desc: str) -> List[str]:
+        try:
+            return self._get_response(prompts, desc)
+        except Exception as e:
+            print(f"Batch call failed ({e}), falling back to sequential calls")
+            return [self._get_response(prompt) for prompt in prompts]
+
+    def _sample_indices(self, prompts: List[str]) -> List[int]:
+        """
+        Occurrence index of each prompt in the run: batch position offset by earlier calls
+        """
+        digests = [hash_key(prompt) for prompt in prompts]
+        with self._lock:
+            indices = [
+                self.occurrences.get(digest, 0) + i
+                for digest, i in zip(digests, sample_indices(prompts))
+            ]
+            for digest, index in zip(digests, indices):
+                self.occurrences[digest] = max(
+                    self.occurrences.get(digest, 0), index + 1
+                )
+        return indices
+
+    def _lookup(self, prompts: List[str]) -> Tuple[List[str], list, List[int]]:
+        keys = [self.key(p, i) for p, i in zip(prompts, self._sample_indices(prompts))]
+        cached = self.store.get_many(keys)
+
+        responses = [None] * len(prompts)
+        missing = []
+        for i, key in enumerate(keys):
+            if key in cached:
+                responses[i] = cached[key].decode("utf-8")
+            else:
+                missing.append(i)
+
+        with self._lock:
+            self.hits += len(prompts) - len(missing)
+            self.misses += len(missing)
+        return keys, responses, missing
+
+    def _store(self, key: str, response: str) -> None:
+        if isinstance(response, str) and response != "":
+            self.store.set(key, response.encode("utf-8"))
+
+    @staticmethod
+    def _prompts(prompt: Union[str, Tuple[str, int], list]) -> List[str]:
+        if isinstance(prompt, str):
+            return [prompt]
+        prompts = expand_samples([prompt] if isinstance(prompt, tuple) else prompt)
+        return mark_samples(prompts)
+
+    def __call__(
+        self, prompt: Union[str, Tuple[str, int], list], desc: str = ""
+    ) -> Union[str, List[str]]:
+        prompts = self._prompts(prompt)
+        keys, responses, missing = self._lookup(prompts)
+
+        if missing:
+            if isinstance(prompt, str):
+                new_responses = [self._get_response(prompt)]
+            else:
+                new_responses = self._call([prompts[i] for i in missing], desc)
+            for i, response in zip(missing, new_responses):
+                responses[i] = response
+                self._store(keys[i], response)
+
+        responses = ["" if r is None else r for r in responses]
+        if isinstance(prompt, str):
+            return responses[0]
+        return responses
+
+    def stream(self, prompts: List[str], desc: str = "") -> Iterator[Tuple[int, str]]:
+        """
+        Yield (index, response): cache hits first, then misses as the wrapped callable completes them
+        """
+        prompts = self._prompts(list(prompts))
+        keys, responses, missing = self._lookup(prompts)
+        for i, response in enumerate(responses):
+            if response is not None:
+                yield i, response
+        if not missing:
+            return
+
+        missing_prompts = [prompts[i] for i in missing]
+        stream = getattr(self._get_response, "stream", None)
+        if stream is not None:
+            completed = stream(missing_prompts, desc)
+        else:
+            completed = enumerate(self._call(missing_prompts, desc))
+        for j, response in completed:
+            self._store(keys[missing[j]], response)
+            yield missing[j], "" if response is None else response
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.store),
+            "bytes": self.store.size_bytes,
+        }
+
+    def __repr__(self):
+        stats = self.stats
+        return (
+            f"CachedResponse(model={self.model!r}, hits={stats['hits']}, "
+            f"misses={stats['misses']}, entries={stats['entries']})"
+        )
@@ -0,0 +1,282 @@
+import json
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .cache import CachedResponse, SQLiteLRUStore
+from .evolnode import EvolNode, PlanNode
+from .memo import EvaluationMemo
+from .meta_prompt import MetaPlan, MetaPrompt
+from .population_store import code_key
+
+# Checkpoint / resume for long Evolution runs
+# - One SQLite file (WAL): each save is a single transaction, so a crash mid-save keeps the previous checkpoint
+# - Incremental: individuals are stored once under their code key, a save only writes new ones and drops evicted ones
+# - State: population order, step counter, strategy trace, usage history, RNG states (evolution, numpy, random),
+#   EvolNode (code, reasoning, fitness, test cases, relevant nodes, telemetry) and PlanNode plan dicts
+# - Pointers: paths of the LLM cache and the evaluation memo; in-memory stores are exported next to the checkpoint,
+#   so a resumed run replays LLM calls and evaluations it already paid for instead of repeating them;
+#   each save only exports the entries added (or read) since the previous one
+# - Calls made after the last save are only replayed if the LLM cache lives on disk (CachedResponse(path=...))
+
+CHECKPOINT_DB = "checkpoint.sqlite"
+LLM_CACHE_DB = "llm_cache.sqlite"
+MEMO_DB = "memo.sqlite"
+
+
+def _node_dict(node: EvolNode) -> dict:
+    return {
+        "meta_prompt": node.meta_prompt.to_dict(),
+        "code": node.code,
+        "reasoning": node.reasoning,
+        "fitness": node.fitness,
+        "efficiency": node.efficiency,
+        "test_cases": node.test_cases,
+    }
+
+
+class Checkpoint:
+    """
+    Checkpoint directory of an Evolution run
+    - save(evolution): persist the run state, atomic and incremental
+    - restore(evolution): load it into a freshly built Evolution of the same task
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.saves = 0
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, CHECKPOINT_DB), check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS individuals (key TEXT PRIMARY KEY, data TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, data BLOB)"
+            )
+
+    def exists(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM state WHERE name = 'evolution'"
+            ).fetchone()
+        return row is not None
+
+    def _persist(self, store: SQLiteLRUStore, filename: str) -> str:
+        """
+        Path of an on-disk copy of `store`: its own file, or an export next to the checkpoint
+        """
+        if store.path != ":memory:":
+            return os.path.abspath(store.path)
+        path = os.path.abspath(os.path.join(self.path, filename))
+        store.export_to(path)
+        return path
+
+    def _pointers(self, evolution) -> dict:
+        # exported before the state commits: a crash in between only leaves extra cache entries
+        pointers = {}
+        get_response = evolution.get_response
+        if isinstance(get_response, CachedResponse):
+            pointers["llm_cache"] = {
+                "path": self._persist(get_response.store, LLM_CACHE_DB),
+                "model": get_response.model,
+                "system_prompt": get_response.system_prompt,
+                "sampling_params": get_response.sampling_params,
+                "occurrences": dict(get_response.occurrences),
+            }
+        memo = evolution.evol.evaluation_memo
+        if memo is not None:
+            pointers["memo"] = self._persist(memo.store, MEMO_DB)
+        return pointers
+
+    def save(self, evolution) -> dict:
+        population = list(evolution.population)
+        keys = [code_key(indiv.get("code")) for indiv in population]
+        members = dict(zip(keys, population))
+        node = evolution.evol
+        codes = {indiv.get("code") for indiv in population} | {node.code}
+        plan_node = getattr(evolution, "plan_node", None)
+
+        state = {
+            "evolution": {
+                "func_name": evolution.meta_prompt.func_name,
+                "step": evolution.step,
+                "population": keys,
+                "strategy_trace": evolution.strategy_trace,
+                "usage_history": evolution.usage_history,
+                "saved_at": time.time(),
+            },
+            "node": {
+                **_node_dict(node),
+                "error_msg": node.error_msg,
+                "relevant_nodes": [_node_dict(n) for n in node.relevant_nodes or []],
+                # resource usage of the codes still around, not of every candidate ever run
+                "telemetry": {
+                    code: telemetry
+                    for code, telemetry in node.telemetry.items()
+                    if code in codes
+                },
+            },
+            "plan": (
+                {
+                    "meta_prompt": plan_node.meta_prompt.to_dict(),
+                    "plan_dict": plan_node.plan_dict,
+                    "plan_dicts": plan_node.plan_dicts,
+                }
+                if plan_node is not None
+                else None
+            ),
+            "rng": {
+                "evolution": (
+                    evolution.rng.bit_generator.state
+                    if evolution.rng is not None
+                    else None
+                ),
+                "numpy": np.random.get_state(),
+                "random": random.getstate(),
+            },
+            "pointers": self._pointers(evolution),
+        }
+
+        with self._lock, self._conn:
+            stored = {
+                row[0] for row in self._conn.execute("SELECT key FROM individuals")
+            }
+            new = [
+                (key, json.dumps(indiv))
+                for key, indiv in members.items()
+                if key not in stored
+            ]
+            dropped = [(key,) for key in stored - members.keys()]
+            self._conn.executemany(
+                "INSERT INTO individuals (key, data) VALUES (?, ?)", new
+            )
+            self._conn.executemany("DELETE FROM individuals WHERE key = ?", dropped)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO state (name, data) VALUES (?, ?)",
+                [(name, pickle.dumps(value)) for name, value in state.items()],
+            )
+        self.saves += 1
+        return {"written": len(new), "dropped": len(dropped), "population": len(keys)}
+
+    def _load_state(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, data FROM state").fetchall()
+        return {name: pickle.loads(data) for name, data in rows}
+
+    def restore(self, evolution) -> int:
+        """
+        Load the checkpoint into `evolution`, returns the step to resume from
+        """
+        state = self._load_state()
+        if "evolution" not in state:
+            raise FileNotFoundError(f"No checkpoint saved in {self.path}")
+        run = state["evolution"]
+        if run["func_name"] != evolution.meta_prompt.func_name:
+            raise ValueError(
+                f"Checkpoint of {run['func_name']!r} cannot resume a run on {evolution.meta_prompt.func_name!r}"
+            )
+
+        self._restore_pointers(evolution, state["pointers"])
+        get_response = evolution.get_response
+
+        with self._lock:
+            individuals = dict(
+                self._conn.execute("SELECT key, data FROM individuals").fetchall()
+            )
+        evolution.population.clear()
+        evolution.population.extend(
+            json.loads(individuals[key]) for key in run["population"]
+        )
+        evolution.step = run["step"]
+        evolution.strategy_trace = run["strategy_trace"]
+        evolution.usage_history = run["usage_history"]
+
+        node, saved = evolution.evol, state["node"]
+        node.code, node.reasoning = saved["code"], saved["reasoning"]
+        node.fitness, node.efficiency = saved["fitness"], saved["efficiency"]
+        node.error_msg = saved["error_msg"]
+        node.test_cases = saved["test_cases"]
+        node.telemetry.update(saved["telemetry"])
+        node.relevant_nodes = [
+            EvolNode(
+                MetaPrompt.from_dict(n["meta_prompt"]),
+                n["code"],
+                n["reasoning"],
+                get_response=get_response,
+                test_cases=n["test_cases"],
+                fitness=n["fitness"],
+                efficiency=n["efficiency"],
+            )
+            for n in saved["relevant_nodes"]
+        ]
+
+        if state["plan"]:
+            plan = state["plan"]
+            evolution.plan_node = PlanNode(
+                MetaPlan.from_dict(plan["meta_prompt"]),
+                get_response,
+                plan_dict=plan["plan_dict"],
+            )
+            evolution.plan_node.plan_dicts = plan["plan_dicts"]
+
+        rng = state["rng"]
+        if rng["evolution"] is not None:
+            evolution.rng = evolution.rng or np.random.default_rng()
+            evolution.rng.bit_generator.state = rng["evolution"]
+        np.random.set_state(rng["numpy"])
+        random.setstate(rng["random"])
+        return evolution.step
+
+    @staticmethod
+    def _restore_pointers(evolution, pointers: dict) -> None:
+        llm_cache = pointers.get("llm_cache")
+        get_response = evolution.get_response
+        if llm_cache is not None and not (
+            isinstance(get_response, CachedResponse)
+            and os.path.abspath(get_response.store.path) == llm_cache["path"]
+        ):
+            limits = ()
+            if isinstance(get_response, CachedResponse):
+                limits = (get_response.store.max_entries, get_response.store.max_bytes)
+                get_response = get_response._get_response
+            evolution.get_response = CachedResponse(
+                get_response,
+                llm_cache["model"],
+                llm_cache["system_prompt"],
+                llm_cache["sampling_params"],
+                llm_cache["path"],
+                *limits,
+            )
+            evolution.evol._get_response = evolution.get_response
+        if llm_cache is not None:
+            # the resumed run asks for the same sample indices as the original one
+            evolution.get_response.occurrences.update(llm_cache["occurrences"])
+
+        memo_path = pointers.get("memo")
+        memo = evolution.evol.evaluation_memo
+        if (
+            memo_path is not None
+            and memo is not None
+            and os.path.abspath(memo.store.path) != memo_path
+        ):
+            evolution.evol.memo = EvaluationMemo(
+                memo_path, memo.store.max_entries, memo.store.max_bytes
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __repr__(self):
+        return f"Checkpoint(path={self.path!r}, saves={self.saves})"
@@ -2,26 +2,28 @@ import asyncio
 import json
 import os
 import re
+import threading
 import time
 from collections import Counter, defaultdict
-from typing import Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Tuple, Union
 
 import httpx
-from langchain_community.document_transformers import Html2TextTransformer
-from langchain_core.documents import Document
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
 
-from .llm import get_multiple_response, get_openai_response
+from .llm import get_multiple_response, get_openai_response, iter_responses
 from .meta_execute import (
+    BatchResult,
+    ExecutionTelemetry,
     call_func_code,
+    call_func_code_batch,
     call_func_prompt,
     call_func_prompt_parallel,
     call_func_prompts,
     combine_errors,
     combine_scores,
     compile_code_with_references,
+    resolve_timeout,
 )
 from .meta_prompt import (
     ALIGNMENT_CHECK_PROMPT,
@@ -36,11 +38,18 @@ from .meta_prompt import (
     parse_evol_response,
     spawn_test_cases,
 )
+from .memo import EvaluationMemo, get_evaluation_memo
+from .sandbox import SandboxPool, get_sandbox
+from .usage import get_usage_tracker, tagged
 
 MAX_ATTEMPTS = 6
 SPAWN_TEST_MAX_TRIES = 20
 NODE_EVOLVE_MAX_ATTEMPTS = 5
 NODE_EVOLVE_BATCH_SIZE = 20
+RACING_MIN_CASES = 2  # test cases in the first racing rung
+RACING_ETA = 2  # rung growth factor
+PIPELINE_MAX_IN_FLIGHT = 8  # candidates between generation and scoring
+PIPELINE_WORKERS = 4  # candidates awaiting execution results / being scored at once
 
 
 def map_input_output(
@@ -148,6 +157,7 @@ def _check_alignment_with_metric(
     return True, ""
 
 
+@tagged("alignment")
 def _check_alignment_with_llm_sequential(
     pred_output: dict,
     target_output: dict,
@@ -244,6 +254,7 @@ def _check_alignment_with_metric_parallel(
     return scores_per_code_per_test, errors_per_code_per_test
 
 
+@tagged("alignment")
 def _check_alignment_with_llm_parallel(
     output_per_code_per_test: Dict[int, Dict[int, Dict]],
     errors_per_code_per_test: Dict[int, Dict[int, List[str]]],
@@ -289,7 +300,7 @@ def _check_alignment_with_llm_parallel(
     desc_str = (
         f"Running LLM-based alignment check in parallel with batch size {len(prompts)}"
     )
-    responses = get_response(prompts, desc=desc_str)
+    responses = get_response(prompts, desc=desc_str) if prompts else []
 
     # Pack response into scores dictionary
     scores_per_code_per_test = defaultdict(lambda: defaultdict(list))
@@ -391,10 +402,25 @@ def check_alignment_parallel(
 
 
 def print_individual_info(
-    code_index: int, fitness: float, err_msg: str, reasoning: str, code: str
+    code_index: int,
+    fitness: float,
+    err_msg: str,
+    reasoning: str,
+    code: str,
+    telemetry: Optional[ExecutionTelemetry] = None,
 ):
     print("\n" + "=" * 80)  # Top separator
     print(f"📊 Code {code_index}: Fitness: {fitness*100:.1f}%")
+    if telemetry is not None and telemetry.calls:
+        rss = (
+            f", peak RSS {telemetry.peak_rss / 2**20:.0f} MiB"
+            if telemetry.peak_rss
+            else ""
+        )  # 0: not measured on this platform
+        print(
+            f"⏱️ Per call: {telemetry.mean_wall_time * 1e3:.2f}ms wall, "
+            f"{telemetry.mean_cpu_time * 1e3:.2f}ms CPU{rss}"
+        )
     if err_msg.strip():  # Only print error section if there are errors
         print("-" * 80)  # Separator between sections
         print(f"❌ Error Messages:\n{err_msg}")
@@ -402,9 +428,21 @@ def print_individual_info(
 
 
 class Fitness:
-    def __init__(self, structural_fitness: float, functional_fitness: float):
+    def __init__(
+        self,
+        structural_fitness: float,
+        functional_fitness: float,
+        efficiency: Optional[float] = None,
+        partial: bool = False,
+    ):
+        """
+        - efficiency: in (0, 1], higher for less CPU time per call; a tie-break, not part of the score
+        - partial: evaluation stopped early (racing), the score is a lower bound counting unseen cells as failed
+        """
         self.structural_fitness = structural_fitness
         self.functional_fitness = functional_fitness
+        self.efficiency = efficiency
+        self.partial = partial
 
     def __call__(self):
         return (self.structural_fitness + self.functional_fitness) / 2
@@ -444,9 +482,18 @@ class EvolNode:
         custom_metric_map: Optional[Dict[str, Callable]] = None,
         libary_dir: str = "methods/nodes/",
         fitness: float = 0.0,
+        sandbox: Union[SandboxPool, bool] = False,
+        memo: Union[EvaluationMemo, bool] = True,
+        profile: Optional[str] = None,
+        efficiency: float = 0.0,
     ):
         """
         Executable Task
+        - sandbox: pool running candidate code in parallel worker processes (True: shared pool, False: in-process)
+          workers re-import the __main__ script, so a script opting in needs an `if __name__ == "__main__":` guard
+        - memo: evaluation memo of (code, test case) cells (True: shared in-memory memo, False: re-evaluate everything)
+        - profile: extra profiling of candidate calls, None / "memory" (tracemalloc) / "cpu" (cProfile)
+        - efficiency: of the current code, breaks fitness ties in favour of cheaper code
         """
         self.code = code
         self.reasoning = reasoning
@@ -458,6 +505,12 @@ class EvolNode:
         self.relevant_nodes = []
         self.error_msg = ""  # contains information about encountered error :: TBD :: use LLM to summarize it
         self.custom_metric_map = custom_metric_map
+        self.usage = {}  # LLM usage per caller tag of the last evolve call
+        self.sandbox = sandbox
+        self.memo = memo
+        self.profile = profile
+        self.efficiency = efficiency
+        self.telemetry: Dict[str, ExecutionTelemetry] = {}  # code -> resource usage
 
         if test_cases is not None:
             self.test_cases = test_cases
@@ -483,6 +536,15 @@ class EvolNode:
         else:
             return responses
 
+    def get_response_stream(self, prompts: List[str], desc: str = ""):
+        """
+        Yield (index, response) as each completes, when the LLM backend supports streaming
+        """
+        if getattr(self._get_response, "stream", None) is not None:
+            yield from iter_responses(self._get_response, prompts, desc)
+        else:
+            yield from enumerate(self.get_response(prompts, desc))
+
     def _get_extend_test_cases_response(self, num_cases: int = 1, feedback: str = ""):
         if feedback != "":
             eval_prompt = self.meta_prompt._get_eval_prompt_with_feedback(
@@ -525,6 +587,7 @@ class EvolNode:
                 filtered_cases.append(case_tuple)
         self.test_cases = filtered_cases
 
+    @tagged("test-case")
     def get_test_cases(self, num_cases: int = 100, feedback: str = ""):
         """
         Generate test cases for current node
@@ -589,25 +652,39 @@ class EvolNode:
         responses = self.get_response(prompts, desc=desc_str)
         return responses
 
-    def _evolve(
+    def _evolve_stream(
         self, method: str, parents: list = None, feedback: str = "", batch_size: int = 5
     ):
         """
-        Note: Evolution process will be decoupled with the fitness assignment process
+        Yield (reasoning, code) as soon as each response is parsed and compiled
+        - Stragglers keep generating while earlier candidates are consumed
         """
-        responses = self._get_evolve_response(method, parents, feedback, batch_size)
-        reasonings, codes = [], []
-        for response in responses:
+        prompt_content = self._get_evolve_prompt(method, parents, feedback)
+        prompts = [prompt_content] * batch_size
+        desc_str = f"Running evolution strategy {method} in parallel with batch size {batch_size}"
+        for _, response in self.get_response_stream(prompts, desc=desc_str):
             try:
                 reasoning, code = parse_evol_response(response)
                 code = compile_code_with_references(
                     code, self.referrable_function_dict
                 )  # deal with node references
-                reasonings.append(reasoning)
-                codes.append(code)
+                yield reasoning, code
             except Exception:
                 print("ERROR PARSING CODE")
 
+    def _evolve(
+        self, method: str, parents: list = None, feedback: str = "", batch_size: int = 5
+    ):
+        """
+        Note: Evolution process will be decoupled with the fitness assignment process
+        """
+        reasonings, codes = [], []
+        for reasoning, code in self._evolve_stream(
+            method, parents, feedback, batch_size
+        ):
+            reasonings.append(reasoning)
+            codes.append(code)
+
         return reasonings, codes
 
     async def get_search_text(self, batch_size: int, search_mode: int) -> str:
@@ -661,6 +738,11 @@ class EvolNode:
             async with httpx.AsyncClient() as client:
                 responses = await asyncio.gather(*[client.get(link) for link in links])
 
+            from langchain_community.document_transformers import (
+                Html2TextTransformer,
+            )
+            from langchain_core.documents import Document
+
             docs = [Document(page_content=response.text) for response in responses[:3]]
             html2text = Html2TextTransformer()
             docs_transformed = html2text.transform_documents(docs)
@@ -674,6 +756,7 @@ class EvolNode:
         else:
             return ""
 
+    @tagged("evolve")
     def evolve(
         self,
         method: str,
@@ -690,15 +773,21 @@ class EvolNode:
         search: int = 0,
         search_threshold: float = 1.0,
         search_batch_size: int = 5,
+        skip_codes: Optional[Collection[str]] = None,
+        racing: bool = False,
     ):
         """
         Evolve node and only accept structurally fit solutions
         Attempts multiple evolutions before returning the final output
+        - skip_codes: codes already held elsewhere (e.g. the population), never re-evaluated
+        - Duplicate candidates within the batch are evaluated once
+        - racing: evaluate on growing rungs of test cases, candidates that can no longer win stop early
         """
         import nest_asyncio
 
         nest_asyncio.apply()
 
+        usage_mark = get_usage_tracker().mark()
         rest = 0
         count = 0
         if search:
@@ -720,22 +809,70 @@ class EvolNode:
         print(f"     :: Query time: {query_time:.2f}s")
 
         # Evolve many times
-        reasonings, codes = self._evolve(
-            method, parents, feedback=feedback, batch_size=batch_size
-        )
+        executed = None
+        seen_codes = set(skip_codes or ())
+        reasonings, codes = [], []
+
+        def collect_codes():
+            for reasoning, code in self._evolve_stream(
+                method, parents, feedback=feedback, batch_size=batch_size
+            ):
+                if code in seen_codes:
+                    continue
+                seen_codes.add(code)
+                reasonings.append(reasoning)
+                codes.append(code)
+                yield code
+
+        scored = None
+        if self.meta_prompt.mode == PromptMode.CODE:
+            # Execute and score each candidate on the (first rung's) test cases as soon as it compiles
+            test_cases = (
+                self.test_cases[:RACING_MIN_CASES] if racing else self.test_cases
+            )
+            executed, scored = self._pipeline(
+                collect_codes(),
+                test_cases,
+                num_runs=num_runs,
+                custom_metric_map=self.custom_metric_map,
+                timeout=timeout,
+            )
+        else:
+            for _ in collect_codes():
+                pass
         evolve_end_time = time.time()
         evolve_time = evolve_end_time - query_end_time
         print(f"     :: Evolution time: {evolve_time:.2f}s")
+        if len(codes) < batch_size:
+            print(
+                f"     :: Skipped {batch_size - len(codes)} duplicate / unparsable candidates"
+            )
 
         self.reasonings = reasonings
         self.codes = codes
-        fitness_per_code, errors_per_code, global_summary = self._evaluate_fitness(
-            codes=codes,
-            max_tries=max_tries,
-            num_runs=num_runs,
-            custom_metric_map=self.custom_metric_map,
-            timeout=timeout,
-        )
+        if codes and racing:
+            fitness_per_code, errors_per_code, global_summary = self._race_fitness(
+                codes=codes,
+                max_tries=max_tries,
+                num_runs=num_runs,
+                custom_metric_map=self.custom_metric_map,
+                timeout=timeout,
+                executed=executed,
+                scored=scored,
+            )
+        elif codes:
+            fitness_per_code, errors_per_code, global_summary = self._evaluate_fitness(
+                codes=codes,
+                max_tries=max_tries,
+                num_runs=num_runs,
+                custom_metric_map=self.custom_metric_map,
+                timeout=timeout,
+                executed=executed,
+                scored=scored,
+            )
+        else:  # nothing new to evaluate
+            fitness_per_code, errors_per_code = {}, {}
+            global_summary = "🏆 No new candidates to evaluate\n"
         end_time = time.time()
         evaluation_time = end_time - evolve_end_time
         if print_summary:
@@ -747,6 +884,8 @@ class EvolNode:
                 + f"     :: Evolution time: {evolve_time:.2f}s\n"
                 + f"     :: Evaluation time: {evaluation_time:.2f}s\n"
                 + f"     :: Total time: {total_time:.2f}s\n"
+                + "  🪙 LLM usage:\n"
+                + get_usage_tracker().report(since=usage_mark)
             )
 
         for code_index in fitness_per_code:
@@ -762,13 +901,24 @@ class EvolNode:
                 if len(errors_per_code[code_index]) > 0
                 else ""
             )
+            efficiency = fitness_per_code[code_index].efficiency or 0.0
+            # raced out: a lower bound, not a measurement
+            partial = fitness_per_code[code_index].partial
+            telemetry = self.telemetry.get(code)
             if print_summary:
-                print_individual_info(code_index, fitness, err_msg, reasoning, code)
+                print_individual_info(
+                    code_index, fitness, err_msg, reasoning, code, telemetry
+                )
 
-            if fitness >= self.fitness:
+            # at equal fitness, prefer the cheaper code
+            if not partial and (
+                fitness > self.fitness
+                or (fitness == self.fitness and efficiency >= self.efficiency)
+            ):
                 if replace:
                     self.reasoning, self.code = reasoning, code
                     self.fitness = fitness
+                    self.efficiency = efficiency
                     self.error_msg = err_msg
 
             if fitness > fitness_threshold:
@@ -779,7 +929,10 @@ class EvolNode:
                     "reasoning": reasoning,
                     "code": code,
                     "fitness": fitness,
+                    "efficiency": efficiency,
+                    "telemetry": telemetry.to_dict() if telemetry else {},
                     "err_msg": err_msg,
+                    "partial": partial,
                 }
             )
 
@@ -802,9 +955,14 @@ class EvolNode:
                     timeout,
                     2,
                     search_threshold,
+                    skip_codes=seen_codes,
+                    racing=racing,
                 )
             )
 
+        # per-caller tokens / cost / latency of this evolve call
+        self.usage = get_usage_tracker().summary(since=usage_mark)
+
         if not replace:
             return offsprings
         else:
@@ -846,6 +1004,7 @@ class EvolNode:
 
         return passed_tests / total_tests, error_msg
 
+    @tagged("evaluate")
     def call_prompt_function(
         self, test_input: Dict, code: Optional[str] = None, max_tries: int = 3
     ):  # TBD: Batch inference and pick the one which works
@@ -864,6 +1023,7 @@ class EvolNode:
         error_msg = "--- Calling Prompt Function Error:\n" + "\n".join(list(error_msg))
         return None, error_msg
 
+    @tagged("evaluate")
     def call_prompt_functions(
         self, test_input: Dict, code: Optional[str] = None, max_tries: int = 3
     ):
@@ -897,40 +1057,204 @@ class EvolNode:
         output_dict = {output_name: output_value}
         return output_dict, error_msg
 
+    def call_code_function_batch(
+        self,
+        test_inputs: List[Dict],
+        code: Optional[str] = None,
+        timeout: bool = True,
+    ) -> BatchResult:
+        """
+        Run the code function over all inputs in one call, with columnar outputs / errors
+        """
+        if code is None:
+            code = self.code
+        return call_func_code_batch(
+            test_inputs, code, self.meta_prompt.func_name, timeout=timeout
+        )
+
+    @property
+    def evaluation_memo(self) -> Optional[EvaluationMemo]:
+        if self.memo is True:
+            return get_evaluation_memo()
+        return self.memo or None
+
+    @property
+    def response_model(self) -> str:
+        """
+        Identity of the LLM backend, part of every memo key that depends on its answers
+        """
+        return getattr(self._get_response, "model", None) or getattr(
+            self._get_response, "__qualname__", type(self._get_response).__name__
+        )
+
+    def execution_signature(self, max_tries: int = 3) -> tuple:
+        if self.meta_prompt.mode == PromptMode.PROMPT:
+            return (
+                self.meta_prompt.mode,
+                self.meta_prompt.func_name,
+                self.meta_prompt.outputs,
+                max_tries,
+                self.response_model,
+            )
+        return (self.meta_prompt.mode, self.meta_prompt.func_name)
+
+    def metric_config(
+        self, num_runs: int, custom_metric_map: Optional[Dict[str, Callable]] = None
+    ) -> tuple:
+        metrics = {
+            name: f"{getattr(metric, '__module__', '')}.{getattr(metric, '__qualname__', repr(metric))}"
+            for name, metric in (custom_metric_map or {}).items()
+        }
+        return (self.meta_prompt.mode, metrics, num_runs, self.response_model)
+
+    @tagged("evaluate")
     def call_prompt_function_parallel(
         self,
         test_inputs: List[Dict],
         codes: Optional[List[str]] = None,
         max_tries: int = 3,
     ):
+        """
+        - memoised per code: a candidate runs again unless every test input has a memoised output
+        """
         if codes is None:
             codes = [self.code]
-        return call_func_prompt_parallel(
-            test_inputs, codes, max_tries, self.get_response
-        )
+        codes = list(codes)
+        get_response = (
+            self._get_response
+            if getattr(self._get_response, "stream", None) is not None
+            else self.get_response
+        )  # streaming backends let responses be parsed as they land
+
+        memo = self.evaluation_memo
+        if memo is None:
+            return call_func_prompt_parallel(
+                test_inputs, codes, max_tries, get_response
+            )
 
-    def call_code_function_parallel(
-        self,
-        test_inputs: List[Dict],
-        codes: Optional[List[str]] = None,
-        file_path: Optional[str] = None,
-        timeout: bool = True,
-    ):
         output_per_code_per_test = defaultdict(lambda: defaultdict(dict))
         errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
+        signature = self.execution_signature(max_tries)
+        keys_per_code = [
+            [
+                memo.execution_key(code, test_input, signature)
+                for test_input in test_inputs
+            ]
+            for code in codes
+        ]
+        cached = memo.get_many([key for keys in keys_per_code for key in keys])
+        missing = []
+        for code_index, keys in enumerate(keys_per_code):
+            if not all(key in cached for key in keys):
+                missing.append(code_index)
+                continue
+            for test_index, key in enumerate(keys):
+                output_dict, errors = cached[key]
+                output_per_code_per_test[code_index][test_index] = output_dict
+                errors_per_code_per_test[code_index][test_index].extend(errors)
+
+        if missing:
+            outputs, errors = call_func_prompt_parallel(
+                test_inputs, [codes[i] for i in missing], max_tries, get_response
+            )
+            for j, code_index in enumerate(missing):
+                for test_index, key in enumerate(keys_per_code[code_index]):
+                    errors_per_code_per_test[code_index][test_index].extend(
+                        errors[j][test_index]
+                    )
+                    if test_index in outputs[j]:
+                        output_dict = outputs[j][test_index]
+                        output_per_code_per_test[code_index][test_index] = output_dict
+                        memo.set(key, (output_dict, list(errors[j][test_index])))
 
-        if codes is None:
-            codes = [self.code]
+        return output_per_code_per_test, errors_per_code_per_test
 
-        for test_index, test_input in enumerate(test_inputs):
-            for code_index, code in enumerate(codes):
-                output_value, error_msg = call_func_code(
-                    test_input,
+    def _start_code_execution(
+        self,
+        code: str,
+        test_inputs: List[Dict],
+        file_path: Optional[str] = None,
+        timeout: bool = True,
+        vectorised: bool = False,
+    ) -> Callable[[], list]:
+        """
+        Start running `code` on the test inputs, return a thunk for its CallResults
+        - memoised per (code, test input): only the missing cells are executed, timeouts and crashes are never memoised
+        - the thunk blocks until the sandbox is done, then records the candidate's telemetry
+        """
+        sandbox = None
+        if self.sandbox and file_path is None:
+            sandbox = get_sandbox() if self.sandbox is True else self.sandbox
+
+        def execute(inputs: List[Dict]) -> Callable[[], list]:
+            if sandbox is not None:
+                if vectorised:
+                    futures = sandbox.submit_batch(
+                        code,
+                        self.meta_prompt.func_name,
+                        inputs,
+                        timeout=resolve_timeout(timeout),
+                    )
+                    return lambda: BatchResult.concat(
+                        [future.result() for future in futures]
+                    ).rows()
+                futures = sandbox.submit(
                     code,
                     self.meta_prompt.func_name,
-                    file_path=file_path,
-                    timeout=timeout,
+                    inputs,
+                    timeout=resolve_timeout(timeout),
+                    profile=self.profile,
                 )
+                return lambda: [future.result() for future in futures]
+            if vectorised and file_path is None:
+                results = self.call_code_function_batch(inputs, code, timeout).rows()
+            else:
+                results = [
+                    call_func_code(
+                        test_input,
+                        code,
+                        self.meta_prompt.func_name,
+                        file_path=file_path,
+                        timeout=timeout,
+                        profile=self.profile,
+                    )
+                    for test_input in inputs
+                ]
+            return lambda: results
+
+        memo = self.evaluation_memo if file_path is None else None
+        keys, cached = [None] * len(test_inputs), {}
+        if memo is not None:
+            signature = self.execution_signature()
+            keys = [
+                memo.execution_key(code, test_input, signature)
+                for test_input in test_inputs
+            ]
+            cached = memo.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        resolve = execute([test_inputs[i] for i in missing]) if missing else list
+
+        def collect() -> list:
+            results = [cached.get(key) for key in keys]
+            for i, result in zip(missing, resolve()):
+                results[i] = result
+                if memo is not None and result.reproducible:
+                    memo.set(keys[i], result)
+            telemetry = self.telemetry.setdefault(code, ExecutionTelemetry())
+            for result in results:
+                telemetry.add(result)  # memoised results carry their recorded usage
+            return results
+
+        return collect
+
+    def _collect_outputs(self, results_per_code: List[list]) -> Tuple[Dict, Dict]:
+        """
+        CallResults per code -> (output_per_code_per_test, errors_per_code_per_test)
+        """
+        output_per_code_per_test = defaultdict(lambda: defaultdict(dict))
+        errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
+        for code_index, results in enumerate(results_per_code):
+            for test_index, (output_value, error_msg) in enumerate(results):
                 if error_msg != "":
                     errors_per_code_per_test[code_index][test_index].append(error_msg)
                 else:
@@ -940,6 +1264,91 @@ class EvolNode:
 
         return output_per_code_per_test, errors_per_code_per_test
 
+    def call_code_function_parallel(
+        self,
+        test_inputs: List[Dict],
+        codes: Optional[List[str]] = None,
+        file_path: Optional[str] = None,
+        timeout: bool = True,
+        vectorised: bool = False,
+    ):
+        """
+        - vectorised: run each candidate over its inputs in batched calls (type checks per column)
+        - memoised per (code, test input): only the missing cells are executed, timeouts and crashes are never memoised
+        """
+        if codes is None:
+            codes = [self.code]
+
+        # codes may be a generator: each candidate runs as soon as it is yielded
+        pending = [
+            self._start_code_execution(
+                code, test_inputs, file_path, timeout=timeout, vectorised=vectorised
+            )
+            for code in codes
+        ]
+        return self._collect_outputs([collect() for collect in pending])
+
+    def _pipeline(
+        self,
+        codes: Iterable[str],
+        test_cases: List[Tuple[Dict, Dict]],
+        num_runs: int = 1,
+        custom_metric_map: Optional[Dict[str, Callable]] = None,
+        timeout: bool = True,
+        max_in_flight: int = PIPELINE_MAX_IN_FLIGHT,
+        num_workers: int = PIPELINE_WORKERS,
+    ) -> Tuple[Tuple[Dict, Dict], Tuple[Dict, Dict]]:
+        """
+        Generate -> execute -> score pipeline over candidate codes
+        - codes: typically a generator parsing / compiling LLM responses as they stream in
+        - each candidate starts executing as soon as it is yielded, and is scored (metric check,
+          then LLM judge) by a worker as soon as its execution finishes
+        - at most `max_in_flight` candidates sit between generation and scoring: generation
+          waits for a slot, so memory and sandbox backlog stay flat
+        - returns executed (outputs, errors) and scored (scores, judge errors), indexed like codes
+        """
+        test_inputs = [case[0] for case in test_cases]
+        output_per_code_per_test = defaultdict(lambda: defaultdict(dict))
+        errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
+        score_per_code_per_test = defaultdict(lambda: defaultdict(float))
+        evaluate_errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
+        slots = threading.BoundedSemaphore(max(1, max_in_flight))
+
+        def score(code_index: int, code: str, collect: Callable[[], list]) -> None:
+            try:
+                outputs, errors = self._collect_outputs([collect()])
+                scores, evaluate_errors = self._check_alignment(
+                    [code], outputs, test_cases, num_runs, custom_metric_map
+                )
+                output_per_code_per_test[code_index].update(outputs[0])
+                errors_per_code_per_test[code_index].update(errors[0])
+                score_per_code_per_test[code_index].update(scores.get(0, {}))
+                evaluate_errors_per_code_per_test[code_index].update(
+                    evaluate_errors.get(0, {})
+                )
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+            futures = []
+            for code_index, code in enumerate(codes):
+                slots.acquire()
+                try:
+                    collect = self._start_code_execution(
+                        code, test_inputs, timeout=timeout
+                    )
+                except BaseException:
+                    slots.release()
+                    raise
+                futures.append(executor.submit(score, code_index, code, collect))
+            for future in futures:
+                future.result()
+
+        return (output_per_code_per_test, errors_per_code_per_test), (
+            score_per_code_per_test,
+            evaluate_errors_per_code_per_test,
+        )
+
     def summarize_fitness(
         self,
         codes,
@@ -996,12 +1405,104 @@ class EvolNode:
 
         fitness_per_code = defaultdict(Fitness)
         for code_index in structual_fitness_per_code:
+            telemetry = self.telemetry.get(codes[code_index])
             fitness_per_code[code_index] = Fitness(
                 structual_fitness_per_code[code_index],
                 functional_fitness_per_code[code_index],
+                telemetry.efficiency if telemetry is not None else None,
             )
         return fitness_per_code
 
+    def _execute(
+        self,
+        test_inputs: List[Dict],
+        codes: List[str],
+        max_tries: int = 3,
+        timeout: bool = True,
+    ) -> Tuple[Dict, Dict]:
+        if self.meta_prompt.mode == PromptMode.CODE:
+            return self.call_code_function_parallel(test_inputs, codes, timeout=timeout)
+        elif self.meta_prompt.mode == PromptMode.PROMPT:
+            return self.call_prompt_function_parallel(test_inputs, codes, max_tries)
+        raise ValueError(f"Unknown mode: {self.meta_prompt.mode}")
+
+    def _check_alignment(
+        self,
+        codes: List[str],
+        output_per_code_per_test: Dict[int, Dict[int, Dict]],
+        test_cases: List[Tuple[Dict, Dict]],
+        num_runs: int = 1,
+        custom_metric_map: Optional[Dict[str, Callable]] = None,
+    ) -> Tuple[Dict, Dict]:
+        """
+        Alignment checking, only for the cells without a memoised score
+        """
+        test_inputs = [case[0] for case in test_cases]
+        target_outputs = [case[1] for case in test_cases]
+        memo = self.evaluation_memo
+        score_keys, cached = {}, {}
+        if memo is not None:
+            config = self.metric_config(num_runs, custom_metric_map)
+            for code_index in output_per_code_per_test:
+                for test_index in output_per_code_per_test[code_index]:
+                    score_keys[(code_index, test_index)] = memo.score_key(
+                        codes[code_index],
+                        test_inputs[test_index],
+                        target_outputs[test_index],
+                        config,
+                    )
+            cached = memo.get_many(list(score_keys.values()))
+
+        unscored_output_per_code_per_test = defaultdict(dict)
+        for code_index in output_per_code_per_test:
+            for test_index, output in output_per_code_per_test[code_index].items():
+                if score_keys.get((code_index, test_index)) not in cached:
+                    unscored_output_per_code_per_test[code_index][test_index] = output
+
+        score_per_code_per_test, evaluate_errors_per_code_per_test = (
+            check_alignment_parallel(
+                unscored_output_per_code_per_test,
+                test_inputs,
+                target_outputs,
+                self.get_response,
+                batch_size=num_runs,
+                custom_metric_map=custom_metric_map,
+            )
+            if unscored_output_per_code_per_test
+            else (
+                defaultdict(lambda: defaultdict(float)),
+                defaultdict(lambda: defaultdict(list)),
+            )
+        )
+
+        for (code_index, test_index), key in score_keys.items():
+            if key in cached:
+                score, errors = cached[key]
+                if score is not None:
+                    score_per_code_per_test[code_index][test_index] = score
+                evaluate_errors_per_code_per_test[code_index][test_index].extend(errors)
+                continue
+            errors = evaluate_errors_per_code_per_test[code_index][test_index]
+            if any(error.startswith("LLM Evaluation Failed") for error in errors):
+                continue  # judge failure, score again next time
+            score = score_per_code_per_test.get(code_index, {}).get(test_index)
+            memo.set(key, (score, list(errors)))
+
+        return score_per_code_per_test, evaluate_errors_per_code_per_test
+
+    @staticmethod
+    def _fitness_summary(fitness_per_code: Dict[int, Fitness], num_codes: int) -> str:
+        best_fitness = max(
+            fitness_per_code.values(), key=lambda x: x(), default=Fitness(0.0, 0.0)
+        )
+        return (
+            f"🏆 Best Code Performance Summary 🏆\n"
+            f"  ⚡ Structural fitness: {best_fitness.structural_fitness:.2f}\n"
+            f"  🎯 Functional fitness: {best_fitness.functional_fitness:.2f}\n"
+            f"  ⭐ Global fitness:     {best_fitness():.2f}\n"
+            f"  🔄 Compiled solutions:        {num_codes}\n"
+        )
+
     def _evaluate_fitness(
         self,
         test_cases: Optional[List[Tuple[Dict, Dict]]] = None,
@@ -1010,9 +1511,13 @@ class EvolNode:
         num_runs: int = 1,
         custom_metric_map: Optional[Dict[str, Callable]] = None,
         timeout: bool = True,
+        executed: Optional[Tuple[Dict, Dict]] = None,
+        scored: Optional[Tuple[Dict, Dict]] = None,
     ) -> Fitness:
         """
         TBD: Parallel evaluation of all test cases
+        - executed: (output_per_code_per_test, errors_per_code_per_test) already obtained on the test inputs
+        - scored: (score_per_code_per_test, evaluate_errors_per_code_per_test) already obtained for executed
         """
 
         if len(codes) == 0:
@@ -1027,16 +1532,12 @@ class EvolNode:
             )  # sanity check against stochastic nature of prompt-based node
 
         test_inputs = [case[0] for case in test_cases]
-        if self.meta_prompt.mode == PromptMode.CODE:
-            output_per_code_per_test, errors_per_code_per_test = (
-                self.call_code_function_parallel(test_inputs, codes, timeout=timeout)
-            )
-        elif self.meta_prompt.mode == PromptMode.PROMPT:
-            output_per_code_per_test, errors_per_code_per_test = (
-                self.call_prompt_function_parallel(test_inputs, codes, max_tries)
-            )
+        if executed is not None:
+            output_per_code_per_test, errors_per_code_per_test = executed
         else:
-            raise ValueError(f"Unknown mode: {self.meta_prompt.mode}")
+            output_per_code_per_test, errors_per_code_per_test = self._execute(
+                test_inputs, codes, max_tries, timeout
+            )
 
         # Print info about outputs and errors per code
         for code_index in output_per_code_per_test:
@@ -1049,18 +1550,18 @@ class EvolNode:
                     print(f"Errors: {errors_per_code_per_test[code_index][test_index]}")
 
         # alignment checking
-        test_inputs = [case[0] for case in test_cases]
-        target_outputs = [case[1] for case in test_cases]
-        score_per_code_per_test, evaluate_errors_per_code_per_test = (
-            check_alignment_parallel(
-                output_per_code_per_test,
-                test_inputs,
-                target_outputs,
-                self.get_response,
-                batch_size=num_runs,
-                custom_metric_map=custom_metric_map,
+        if executed is not None and scored is not None:
+            score_per_code_per_test, evaluate_errors_per_code_per_test = scored
+        else:
+            score_per_code_per_test, evaluate_errors_per_code_per_test = (
+                self._check_alignment(
+                    codes,
+                    output_per_code_per_test,
+                    test_cases,
+                    num_runs,
+                    custom_metric_map,
+                )
             )
-        )
 
         errors_per_code = combine_errors(
             evaluate_errors_per_code_per_test, errors_per_code_per_test
@@ -1074,17 +1575,7 @@ class EvolNode:
             max_tries,
         )
 
-        # Get best fitness
-        best_fitness = max(
-            fitness_per_code.values(), key=lambda x: x(), default=Fitness(0.0, 0.0)
-        )
-        global_summary = (
-            f"🏆 Best Code Performance Summary 🏆\n"
-            f"  ⚡ Structural fitness: {best_fitness.structural_fitness:.2f}\n"
-            f"  🎯 Functional fitness: {best_fitness.functional_fitness:.2f}\n"
-            f"  ⭐ Global fitness:     {best_fitness():.2f}\n"
-            f"  🔄 Compiled solutions:        {len(codes)}\n"
-        )
+        global_summary = self._fitness_summary(fitness_per_code, len(codes))
 
         return (
             fitness_per_code,
@@ -1092,6 +1583,127 @@ class EvolNode:
             global_summary,
         )  # TBD: return error messages ...
 
+    def _race_fitness(
+        self,
+        test_cases: Optional[List[Tuple[Dict, Dict]]] = None,
+        codes: Optional[List[str]] = [],
+        max_tries: int = 3,
+        num_runs: int = 1,
+        custom_metric_map: Optional[Dict[str, Callable]] = None,
+        timeout: bool = True,
+        executed: Optional[Tuple[Dict, Dict]] = None,
+        scored: Optional[Tuple[Dict, Dict]] = None,
+        min_cases: int = RACING_MIN_CASES,
+        eta: int = RACING_ETA,
+    ):
+        """
+        Racing evaluation: candidates race on growing test-case rungs
+        - Rung sizes: min_cases, min_cases * eta, ... up to all test cases
+        - After each rung, drop candidates whose fitness upper bound (unseen cells perfect)
+          is below the best lower bound (unseen cells failed): they can never win
+        - Every candidate that can still reach the leader advances, so a late winner is never dropped
+        - Dropped candidates keep their lower-bound fitness marked partial, survivors are fully evaluated
+        - executed: execution results of all codes on the first rung's test inputs
+        - scored: alignment scores of `executed`, if already checked
+        """
+        if len(codes) == 0:
+            codes = [self.code]
+
+        if test_cases is None:
+            test_cases = self.test_cases
+
+        if self.meta_prompt.mode == PromptMode.PROMPT:
+            num_runs = min(2, num_runs)
+
+        total = len(test_cases)
+        test_inputs = [case[0] for case in test_cases]
+        output_per_code_per_test = defaultdict(lambda: defaultdict(dict))
+        errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
+        score_per_code_per_test = defaultdict(lambda: defaultdict(float))
+        evaluate_errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
+
+        alive = list(range(len(codes)))
+        start, stop, rung = 0, min(total, max(1, min_cases)), 0
+        cells = 0
+        while alive and start < total:
+            rung_cases = test_cases[start:stop]
+            rung_codes = [codes[i] for i in alive]
+            if rung == 0 and executed is not None:
+                rung_outputs, rung_errors = executed
+            else:
+                rung_outputs, rung_errors = self._execute(
+                    [case[0] for case in rung_cases], rung_codes, max_tries, timeout
+                )
+            if rung == 0 and executed is not None and scored is not None:
+                rung_scores, rung_evaluate_errors = scored
+            else:
+                rung_scores, rung_evaluate_errors = self._check_alignment(
+                    rung_codes, rung_outputs, rung_cases, num_runs, custom_metric_map
+                )
+            cells += len(alive) * len(rung_cases)
+
+            # back to global (code, test) indices
+            for j, code_index in enumerate(alive):
+                for t in range(len(rung_cases)):
+                    test_index = start + t
+                    if t in rung_outputs.get(j, {}):
+                        output_per_code_per_test[code_index][test_index] = rung_outputs[
+                            j
+                        ][t]
+                    if t in rung_scores.get(j, {}):
+                        score_per_code_per_test[code_index][test_index] = rung_scores[
+                            j
+                        ][t]
+                    errors_per_code_per_test[code_index][test_index].extend(
+                        rung_errors.get(j, {}).get(t, [])
+                    )
+                    evaluate_errors_per_code_per_test[code_index][test_index].extend(
+                        rung_evaluate_errors.get(j, {}).get(t, [])
+                    )
+
+            start, stop, rung = stop, min(total, stop * eta), rung + 1
+            if start >= total:
+                break
+
+            lower = self.summarize_fitness(
+                codes,
+                score_per_code_per_test,
+                output_per_code_per_test,
+                test_inputs,
+                max_tries,
+            )
+            slack = (total - start) / total  # fitness still available on unseen cells
+            best_lower = max(lower[i]() for i in alive)
+            survivors = [i for i in alive if lower[i]() + slack >= best_lower]
+            for i in alive:
+                if i not in survivors:
+                    errors_per_code_per_test[i][start].append(
+                        f"Evaluation stopped early after {start}/{total} test cases: "
+                        f"fitness so far {lower[i]() / (1 - slack):.2f} can no longer reach the best candidate"
+                    )
+            print(
+                f"     :: Racing rung {rung}: {len(survivors)}/{len(alive)} candidates "
+                f"advance to test cases {start}-{stop - 1}"
+            )
+            alive = survivors
+
+        errors_per_code = combine_errors(
+            evaluate_errors_per_code_per_test, errors_per_code_per_test
+        )
+        fitness_per_code = self.summarize_fitness(
+            codes,
+            score_per_code_per_test,
+            output_per_code_per_test,
+            test_inputs,
+            max_tries,
+        )
+        for i in range(len(codes)):
+            fitness_per_code[i].partial = i not in alive
+        global_summary = self._fitness_summary(fitness_per_code, len(codes)) + (
+            f"  🏁 Evaluated cells:           {cells}/{len(codes) * total}\n"
+        )
+        return fitness_per_code, errors_per_code, global_summary
+
     def _evaluate_fitness_sequential(
         self,
         test_cases: Optional[List[Tuple[Dict, Dict]]] = None,
@@ -1225,9 +1837,11 @@ class EvolNode:
         codes: Optional[List[str]] = None,
         max_tries: int = 3,
         timeout: bool = True,
+        vectorised: bool = False,
     ):
         """
         Should be used in Batch Evaluation
+        - vectorised: batched calls for code nodes over large input sets
         """
 
         # Input name rectification
@@ -1239,7 +1853,9 @@ class EvolNode:
         # Batch inference
         if self.meta_prompt.mode == PromptMode.CODE:
             output_per_code_per_test, errors_per_code_per_test = (
-                self.call_code_function_parallel(inputs, codes, timeout=timeout)
+                self.call_code_function_parallel(
+                    inputs, codes, timeout=timeout, vectorised=vectorised
+                )
             )
         elif self.meta_prompt.mode == PromptMode.PROMPT:
             output_per_code_per_test, errors_per_code_per_test = (
@@ -1304,6 +1920,12 @@ class EvolNode:
                 for test_case in self.test_cases
             ],
             "fitness": self.fitness,
+            "efficiency": self.efficiency,
+            "telemetry": (
+                self.telemetry[self.code].to_dict()
+                if self.code in self.telemetry
+                else {}
+            ),
         }
         node_path = os.path.join(library_dir, f"{self.meta_prompt.func_name}_node.json")
         os.makedirs(os.path.dirname(node_path), exist_ok=True)
@@ -1335,6 +1957,7 @@ class EvolNode:
             test_cases=test_cases,
             get_response=get_response,
             fitness=node_data["fitness"],
+            efficiency=node_data.get("efficiency", 0.0),
         )
         return node
 
@@ -1397,6 +2020,8 @@ class QueryEngine:
         ignore_self: bool = False,
         self_func_name: str = None,
     ):
+        from sentence_transformers import SentenceTransformer
+
         self.library_dir = library_dir
         self.sentence_transformer = SentenceTransformer("all-MiniLM-L6-v2")
         self.ignore_self = ignore_self
@@ -1420,6 +2045,8 @@ class QueryEngine:
         """
         Query node json from library path and return top-k nodes
         """
+        from sklearn.metrics.pairwise import cosine_similarity
+
         # Encode the task query
         query_embedding = self.sentence_transformer.encode(task)
 
@@ -1479,6 +2106,7 @@ class PlanNode:
         else:
             return responses
 
+    @tagged("plan")
     def _evolve_plan_dict(
         self,
         feedback: str = "",
@@ -1520,6 +2148,7 @@ class PlanNode:
 
         return plan_dict, err_msg
 
+    @tagged("plan")
     def evolve_plan_dict_sequential(
         self, feedback: str = "", method: str = "i1"
     ):  # Deprecated
@@ -1548,6 +2177,7 @@ class PlanNode:
         plan_dict = min(self.plan_dicts, key=lambda x: len(x.get("nodes", [])))
         self.plan_dict = plan_dict
 
+    @tagged("plan")
     def evolve_plan_dict(
         self,
         feedback: str = "",
@@ -1608,6 +2238,7 @@ class PlanNode:
 
         return plan_dicts, err_msg
 
+    @tagged("test-case")
     def spawn_test_cases_majority(self, main_test_cases: list) -> tuple[bool, str]:
         def convert_unhash_to_hash(data):
             if isinstance(data, list):
@@ -0,0 +1,206 @@
+import heapq
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from .meta_prompt import MetaPrompt
+from .population import Evolution
+from .population_store import fitness_rank
+from .sandbox import SandboxPool
+
+# Island-model evolution: several sub-populations evolving side by side
+# - Each island is an Evolution (own EvolNode, population and parent-selection rng) on its own thread
+# - Islands share the async LLM client and the sandbox pool, so one island's candidate
+#   evaluation overlaps another island's LLM generation instead of leaving both idle
+# - Operators are pipelined: island i starts its operator cycle at offset i, so islands sit in
+#   different phases (generation-heavy crossover vs mutation) at any moment
+# - Asynchronous ring migration: every `migration_interval` epochs an island sends copies of its
+#   top `migration_size` individuals to the next island's inbox; inboxes are drained before each epoch
+# - Stops as soon as any island reaches `target_fitness`
+# - LLM usage is tracked process-wide, so per-island usage_history mixes concurrent islands
+
+DEFAULT_OPERATORS = ("e1", "e2", "m1", "m2")
+
+
+def top_individuals(pop: Iterable[dict], k: int) -> List[dict]:
+    """
+    Top-k individuals by (fitness, efficiency); unevaluated ones rank last
+    """
+    return heapq.nlargest(
+        k, (indiv for indiv in pop if indiv["code"] is not None), key=fitness_rank
+    )
+
+
+class IslandModel:
+    """
+    Island-model parallel evolution over `num_islands` Evolution instances
+    - evolve(num_epochs): each island applies every operator once per epoch, islands run concurrently
+    - history: (seconds since start, island, epoch, best fitness on the island) after every operator
+    """
+
+    def __init__(
+        self,
+        num_islands: int,
+        pop_size: int,
+        meta_prompt: MetaPrompt,
+        get_response: Callable,
+        test_cases: Optional[list] = None,
+        custom_metric_map: Optional[Dict[str, Callable]] = None,
+        max_attempts: int = 3,
+        num_eval_runs: int = 1,
+        num_parents: int = 2,
+        operators: Sequence[str] = DEFAULT_OPERATORS,
+        migration_interval: int = 1,
+        migration_size: int = 1,
+        query_node: bool = True,
+        seed: int = 0,
+        selection: str = "tournament",
+        sandbox: Union[SandboxPool, bool] = False,
+    ):
+        self.operators = list(operators)
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+        self.islands = [
+            Evolution(
+                pop_size,
+                meta_prompt,
+                get_response,
+                test_cases=test_cases,
+                custom_metric_map=custom_metric_map,
+                max_attempts=max_attempts,
+                num_eval_runs=num_eval_runs,
+                num_parents=num_parents,
+                query_node=query_node,
+                seed=seed + index,
+                selection=selection,
+                sandbox=sandbox,
+            )
+            for index in range(num_islands)
+        ]
+        self.inboxes = [queue.Queue() for _ in self.islands]
+        self.history = []  # (elapsed, island, epoch, best fitness)
+        self.migrations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def population(self) -> List[dict]:
+        return [indiv for island in self.islands for indiv in island.population]
+
+    @property
+    def best(self) -> Optional[dict]:
+        best = top_individuals(self.population, 1)
+        return best[0] if best else None
+
+    @property
+    def best_fitness(self) -> float:
+        best = self.best
+        return best["fitness"] if best and best["fitness"] is not None else 0.0
+
+    def island_operators(self, index: int) -> List[str]:
+        offset = index % len(self.operators)
+        return self.operators[offset:] + self.operators[:offset]
+
+    def _receive(self, index: int) -> int:
+        island, received = self.islands[index], 0
+        while True:
+            try:
+                indiv = self.inboxes[index].get_nowait()
+            except queue.Empty:
+                return received
+            received += bool(island.population.append(indiv))
+
+    def _emigrate(self, index: int) -> None:
+        target = (index + 1) % len(self.islands)
+        for indiv in top_individuals(
+            self.islands[index].population, self.migration_size
+        ):
+            self.inboxes[target].put(dict(indiv))
+        with self._lock:
+            self.migrations += 1
+
+    def _run_island(
+        self,
+        index: int,
+        num_epochs: int,
+        target_fitness: Optional[float],
+        feedback: str,
+        start_time: float,
+        stop: threading.Event,
+    ) -> None:
+        island = self.islands[index]
+        try:
+            for epoch in range(num_epochs):
+                self._receive(index)
+                for operator in self.island_operators(index):
+                    if stop.is_set():
+                        return
+                    island.get_offspring(operator, feedback=feedback)
+                    best = top_individuals(island.population, 1)
+                    fitness = best[0]["fitness"] if best else None
+                    with self._lock:
+                        self.history.append(
+                            (time.perf_counter() - start_time, index, epoch, fitness)
+                        )
+                    if (
+                        target_fitness is not None
+                        and fitness is not None
+                        and fitness >= target_fitness
+                    ):
+                        stop.set()
+                        return
+                if len(self.islands) > 1 and (epoch + 1) % self.migration_interval == 0:
+                    self._emigrate(index)
+        except BaseException:
+            stop.set()  # no point in the other islands carrying on
+            raise
+
+    def evolve(
+        self,
+        num_epochs: int,
+        target_fitness: Optional[float] = None,
+        feedback: str = "",
+    ) -> Optional[dict]:
+        """
+        Run every island for up to `num_epochs` epochs, or until any island reaches `target_fitness`
+        - Returns the best individual across islands
+        """
+        self.history = []
+        start_time = time.perf_counter()
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(self.islands)) as executor:
+            futures = [
+                executor.submit(
+                    self._run_island,
+                    index,
+                    num_epochs,
+                    target_fitness,
+                    feedback,
+                    start_time,
+                    stop,
+                )
+                for index in range(len(self.islands))
+            ]
+            for future in futures:
+                future.result()
+        for index in range(len(self.islands)):  # land migrants still in flight
+            self._receive(index)
+        return self.best
+
+    def time_to_fitness(self, target_fitness: float) -> Optional[float]:
+        """
+        Seconds (since the last evolve call started) until an island first reached target_fitness
+        """
+        times = [
+            elapsed
+            for elapsed, _, _, fitness in self.history
+            if fitness is not None and fitness >= target_fitness
+        ]
+        return min(times) if times else None
+
+    def __repr__(self):
+        return (
+            f"IslandModel(islands={len(self.islands)}, population={len(self.population)}, "
+            f"best_fitness={self.best_fitness:.2f}, migrations={self.migrations})"
+        )
@@ -1,16 +1,44 @@
 import asyncio
 import os
+import queue
 import random
+import re
+import threading
 import time
 from os import getenv
-from typing import Callable, List, Optional, Union
-
-import aiohttp
-import anthropic
-import torch
-from openai import AsyncOpenAI, OpenAI
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import httpx
 from tqdm.asyncio import tqdm_asyncio
-from transformers import AutoTokenizer
+
+from .cache import hash_key
+from .sampling import (  # noqa: F401 (re-exported)
+    SampledPrompt,
+    expand_samples,
+    group_samples,
+    mark_samples,
+    sample_prompts,
+)
+from .scheduler import (
+    EndpointScheduler,
+    SchedulerStats,
+    estimate_tokens,
+    status_code,
+)
+from .usage import current_tag, record_call, with_tag
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 # os.environ["OPENAI_API_KEY"] = "YOUR OPENAI API KEY"
 # os.environ["GROQ_API_KEY"] = "YOUR GROQ API KEY"
@@ -22,8 +50,557 @@ from transformers import AutoTokenizer
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-oai_client = OpenAI()
-claude_client = anthropic.Anthropic()
+DEFAULT_SYSTEM_PROMPT = "You are a Turing award winner."
+
+
+#####################
+# Provider registry #
+#####################
+
+# Heavy SDKs (openai, anthropic, groq, torch, transformers, vllm) are imported on first use,
+# so importing this module needs neither API keys nor seconds of startup
+
+PROVIDERS: Dict[str, Callable] = {}
+_provider_instances: Dict[str, object] = {}
+_provider_lock = threading.RLock()
+
+
+def register_provider(name: str, factory: Callable) -> None:
+    """
+    Register a zero-argument client factory, called on the first `get_provider(name)`
+    """
+    with _provider_lock:
+        PROVIDERS[name] = factory
+        _provider_instances.pop(name, None)
+
+
+def get_provider(name: str):
+    """
+    Client registered under `name`, created once and shared afterwards
+    """
+    with _provider_lock:
+        if name not in _provider_instances:
+            if name not in PROVIDERS:
+                raise KeyError(
+                    f"Unknown provider {name!r}, registered: {sorted(PROVIDERS)}"
+                )
+            _provider_instances[name] = PROVIDERS[name]()
+        return _provider_instances[name]
+
+
+def _openai_client():
+    from openai import OpenAI
+
+    return OpenAI()
+
+
+def _anthropic_client():
+    import anthropic
+
+    return anthropic.Anthropic()
+
+
+def _groq_client():
+    import groq
+
+    return groq.Groq()
+
+
+register_provider("openai", _openai_client)
+register_provider("anthropic", _anthropic_client)
+register_provider("groq", _groq_client)
+
+# Module-level client names kept for existing `from methods.llm import oai_client` callers
+_LEGACY_CLIENTS = {
+    "oai_client": "openai",
+    "claude_client": "anthropic",
+    "groq_client": "groq",
+}
+
+
+def __getattr__(name: str):
+    if name in _LEGACY_CLIENTS:
+        return get_provider(_LEGACY_CLIENTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_SAMPLING_PARAM = re.compile(r"(?<![\w-])(n|best_of)(?![\w-])")
+
+
+def rejects_native_n(exc: Exception) -> bool:
+    """
+    Whether an API error names the `n` / `best_of` parameter, rather than e.g. the context length
+    """
+    text = f"{exc} {getattr(exc, 'body', None) or ''}"
+    return _SAMPLING_PARAM.search(text) is not None
+
+
+###########################
+# Shared async LLM client #
+###########################
+
+
+class AsyncLLMClient:
+    """
+    Long-lived async client layer shared by every batch LLM call
+    - One background event loop thread runs all requests
+    - One keep-alive HTTP connection pool per (base_url, api_key)
+    - One EndpointScheduler per base_url (adaptive concurrency, RPM / TPM limits, retries)
+    - Sync callers submit coroutines through `run`, so no asyncio.run / nest_asyncio per batch
+    - Identical in-flight requests share one upstream call (single-flight), except SampledPrompt
+    - Sampled duplicates go out as one request with native `n`, replicated where `n` is unsupported
+    """
+
+    MAX_NATIVE_N = 128  # OpenAI caps `n` at 128
+
+    def __init__(
+        self,
+        max_connections: int = 512,
+        max_keepalive_connections: int = 128,
+        keepalive_expiry: float = 120.0,
+        timeout: float = 600.0,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self._clients: Dict[Tuple[Optional[str], Optional[str]], "AsyncOpenAI"] = {}
+        self._http_clients: Dict[Optional[str], httpx.AsyncClient] = {}
+        self._schedulers: Dict[Optional[str], EndpointScheduler] = {}
+        self._scheduler_kwargs: Dict[Optional[str], dict] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self._no_native_n: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="llm-client-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro):
+        """
+        Run coroutine on the background loop and block until it finishes
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncLLMClient.run called from its own event loop")
+        return asyncio.run_coroutine_threadsafe(
+            with_tag(coro, current_tag()), loop
+        ).result()
+
+    def get_client(
+        self, base_url: Optional[str] = None, api_key: Optional[str] = None
+    ) -> "AsyncOpenAI":
+        """
+        Pooled AsyncOpenAI client, connections are kept alive across batches
+        """
+        key = (base_url, api_key)
+        with self._lock:
+            if key not in self._clients:
+                from openai import AsyncOpenAI
+
+                self._clients[key] = AsyncOpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    max_retries=0,  # retries are handled by the endpoint scheduler
+                    http_client=httpx.AsyncClient(
+                        limits=self.limits, timeout=self.timeout
+                    ),
+                )
+            return self._clients[key]
+
+    def get_http_client(self, base_url: Optional[str] = None) -> httpx.AsyncClient:
+        """
+        Pooled raw HTTP client for non-OpenAI servers (e.g. tuning/vllm_serve.py `/generate`)
+        """
+        with self._lock:
+            if base_url not in self._http_clients:
+                self._http_clients[base_url] = httpx.AsyncClient(
+                    base_url=base_url or "", limits=self.limits, timeout=self.timeout
+                )
+            return self._http_clients[base_url]
+
+    def configure_endpoint(self, base_url: Optional[str] = None, **scheduler_kwargs):
+        """
+        Set scheduler limits for an endpoint, e.g. rpm=500, tpm=200_000, max_concurrency=64
+        """
+        with self._lock:
+            self._scheduler_kwargs[base_url] = scheduler_kwargs
+            self._schedulers.pop(base_url, None)
+
+    def endpoint_config(self, base_url: Optional[str] = None) -> dict:
+        """
+        Scheduler limits set for an endpoint by configure_endpoint
+        """
+        with self._lock:
+            return dict(self._scheduler_kwargs.get(base_url, {}))
+
+    def get_scheduler(self, base_url: Optional[str] = None) -> EndpointScheduler:
+        with self._lock:
+            if base_url not in self._schedulers:
+                self._schedulers[base_url] = EndpointScheduler(
+                    **self._scheduler_kwargs.get(base_url, {})
+                )
+            return self._schedulers[base_url]
+
+    async def acomplete(
+        self,
+        prompt: str,
+        model: str,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        **params,
+    ) -> str:
+        request = lambda: self._request(
+            prompt, model, base_url, api_key, system_prompt, **params
+        )
+        if isinstance(prompt, SampledPrompt):
+            return (await request())[0]
+
+        key = hash_key(model, base_url, api_key, system_prompt, prompt, params)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(request())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shielded: one waiter cancelling must not cancel the shared call
+        return (await asyncio.shield(future))[0]
+
+    async def acomplete_n(
+        self,
+        prompt: str,
+        model: str,
+        n: int,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        **params,
+    ) -> List[str]:
+        """
+        `n` samples of one prompt: a single upload and prefill with native `n`,
+        falling back to `n` replicated requests on endpoints without `n` support
+        """
+        if n == 1:
+            return [
+                await self.acomplete(
+                    prompt, model, base_url, api_key, system_prompt, **params
+                )
+            ]
+
+        responses = []
+        while len(responses) < n and base_url not in self._no_native_n:
+            batch_n = min(n - len(responses), self.MAX_NATIVE_N)
+            try:
+                choices = await self._request(
+                    prompt, model, base_url, api_key, system_prompt, n=batch_n, **params
+                )
+            except Exception as e:
+                if status_code(e) not in (400, 422):
+                    raise
+                if not rejects_native_n(e):
+                    # e.g. context length or an invalid prompt: `n` is only to blame
+                    # if the same request goes through with n=1, otherwise this raises
+                    responses.extend(
+                        await self._request(
+                            prompt, model, base_url, api_key, system_prompt, **params
+                        )
+                    )
+                choices = []
+            if len(choices) < batch_n:  # rejected or silently ignored `n`
+                print(
+                    f" :: {base_url or 'OpenAI'} does not support n={batch_n}, replicating prompts instead"
+                )
+                self._no_native_n.add(base_url)
+            responses.extend(choices)
+
+        replicated = await asyncio.gather(
+            *[
+                self._request(prompt, model, base_url, api_key, system_prompt, **params)
+                for _ in range(n - len(responses))
+            ]
+        )
+        return responses + [choices[0] for choices in replicated]
+
+    async def _request(
+        self,
+        prompt: str,
+        model: str,
+        base_url: Optional[str],
+        api_key: Optional[str],
+        system_prompt: str,
+        n: int = 1,
+        **params,
+    ) -> List[str]:
+        client = self.get_client(base_url, api_key)
+        messages = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            messages = [{"role": "system", "content": system_prompt}] + messages
+        if n > 1:
+            params["n"] = n
+        tokens = (
+            estimate_tokens(system_prompt + prompt) + params.get("max_tokens", 0) * n
+        )
+        trace = {}
+        start_time = time.monotonic()
+        try:
+            response = await self.get_scheduler(base_url).submit(
+                lambda: client.chat.completions.create(
+                    model=model, messages=messages, **params
+                ),
+                tokens=tokens,
+                trace=trace,
+            )
+        except Exception:
+            elapsed = time.monotonic() - start_time
+            record_call(
+                model, system_prompt + prompt, [], elapsed, trace=trace, failed=True
+            )
+            raise
+        completions = [choice.message.content for choice in response.choices]
+        record_call(
+            model,
+            system_prompt + prompt,
+            completions,
+            time.monotonic() - start_time,
+            usage=getattr(response, "usage", None),
+            trace=trace,
+        )
+        return completions
+
+    async def _safe_complete_n(
+        self, prompt: str, model: str, n: int, **kwargs
+    ) -> List[str]:
+        try:
+            return await self.acomplete_n(prompt, model, n, **kwargs)
+        except Exception as e:
+            print(f"Error in completion: {str(e)}")
+            return [""] * n
+
+    async def abatch(
+        self,
+        prompts: List[str],
+        model: str,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        desc: str = "Processing LLM queries",
+        **params,
+    ) -> List[str]:
+        async def get_completions(prompt: str, n: int) -> List[str]:
+            return await self._safe_complete_n(
+                prompt,
+                model,
+                n,
+                base_url=base_url,
+                api_key=api_key,
+                system_prompt=system_prompt,
+                **params,
+            )
+
+        scheduler = self.get_scheduler(base_url)
+        stats_before = scheduler.stats.snapshot()
+        coalesced_before = self.coalesced
+        start_time = time.time()
+        groups = group_samples(mark_samples(prompts))
+        completions = await tqdm_asyncio.gather(
+            *[get_completions(prompt, len(indices)) for prompt, indices in groups],
+            desc=desc,
+        )
+        responses = [""] * len(prompts)
+        for (_, indices), group_responses in zip(groups, completions):
+            for i, response in zip(indices, group_responses):
+                responses[i] = response
+        elapsed_time = time.time() - start_time
+        print(
+            f" :: Total time elapsed: {elapsed_time:.2f}s, {scheduler.stats.since(stats_before)}, "
+            f"{self.coalesced - coalesced_before} coalesced, concurrency {scheduler.concurrency}"
+        )
+        return responses
+
+    async def astream(
+        self,
+        prompts: List[str],
+        model: str,
+        desc: str = "Processing LLM queries",
+        **kwargs,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yield (index, response) in completion order instead of waiting for the slowest prompt
+        - Samples of one prompt arrive together, as they share a single `n` request
+        """
+
+        async def indexed(indices: List[int], prompt: str) -> List[Tuple[int, str]]:
+            responses = await self._safe_complete_n(
+                prompt, model, len(indices), **kwargs
+            )
+            return list(zip(indices, responses))
+
+        tasks = [
+            asyncio.ensure_future(indexed(indices, prompt))
+            for prompt, indices in group_samples(mark_samples(prompts))
+        ]
+        try:
+            for next_done in tqdm_asyncio.as_completed(tasks, desc=desc):
+                for item in await next_done:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self, base_url: Optional[str] = None) -> SchedulerStats:
+        return self.get_scheduler(base_url).stats
+
+    def batch(self, prompts: List[str], model: str, **kwargs) -> List[str]:
+        return self.run(self.abatch(prompts, model, **kwargs))
+
+    def iterate(self, aiterable) -> Iterator:
+        """
+        Sync iterator over an async iterable, items are handed over from the loop thread as they land
+        """
+        done = object()
+        results = queue.Queue()
+        tag = current_tag()
+
+        async def pump():
+            try:
+                async for item in aiterable:
+                    results.put(item)
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(with_tag(pump(), tag), self.loop)
+        try:
+            while (item := results.get()) is not done:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def stream(
+        self, prompts: List[str], model: str, **kwargs
+    ) -> Iterator[Tuple[int, str]]:
+        return self.iterate(self.astream(prompts, model, **kwargs))
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.close()
+        for http_client in self._http_clients.values():
+            await http_client.aclose()
+        self._clients, self._http_clients = {}, {}
+
+    def close(self):
+        if self._loop is not None and self._loop.is_running():
+            self.run(self.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+
+_async_client: Optional[AsyncLLMClient] = None
+
+
+def get_async_client() -> AsyncLLMClient:
+    """
+    Process-wide AsyncLLMClient, created on first use
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncLLMClient()
+    return _async_client
+
+
+def get_async_llm_func(
+    model_name: str,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    **params,
+) -> Callable:
+    """
+    Sync get_response(prompts, desc) facade over the shared async client
+    - Works as `get_response` for EvolNode, PlanNode and Evolution
+    - Single prompt in, single response out; list in, list out
+    - `(prompt, n)` (alone or as list entries) asks for `n` samples via the native `n` parameter
+    - `get_response.stream(prompts, desc)` yields (index, response) as each completes
+    """
+
+    def get_response(
+        prompt: Union[str, Tuple[str, int], list],
+        desc: str = "Processing LLM queries",
+        system_prompt: str = system_prompt,
+    ) -> Union[str, List[str]]:
+        if isinstance(prompt, str):
+            prompts = [prompt]
+        else:
+            prompts = expand_samples([prompt] if isinstance(prompt, tuple) else prompt)
+        try:
+            responses = get_async_client().batch(
+                prompts,
+                model_name,
+                base_url=base_url,
+                api_key=api_key,
+                system_prompt=system_prompt,
+                desc=desc,
+                **params,
+            )
+        except Exception as e:
+            print(f"Error in endpoint response: {str(e)}")
+            responses = []
+        if isinstance(prompt, str):
+            return responses[0] if responses else ""
+        return responses
+
+    def stream(
+        prompts: List[str],
+        desc: str = "Processing LLM queries",
+        system_prompt: str = system_prompt,
+    ) -> Iterator[Tuple[int, str]]:
+        yield from get_async_client().stream(
+            expand_samples(prompts),
+            model_name,
+            base_url=base_url,
+            api_key=api_key,
+            system_prompt=system_prompt,
+            desc=desc,
+            **params,
+        )
+
+    get_response.stream = stream
+    get_response.model = (
+        f"{base_url or 'openai'}:{model_name}"  # cache / memo key identity
+    )
+    return get_response
+
+
+def iter_responses(
+    get_response: Callable, prompts: List[str], desc: str = ""
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (index, response) pairs, as each completes when `get_response` can stream
+    and otherwise once the whole batch is back
+    """
+    stream = getattr(get_response, "stream", None)
+    if stream is not None:
+        yield from stream(prompts, desc)
+    else:
+        yield from enumerate(get_response(prompts, desc))
 
 
 class OpenRouterModel:
@@ -40,14 +617,15 @@ class OpenRouterModel:
     MAX_TOKENS = 400
 
     def __init__(self):
+        from openai import OpenAI
+
         self.client = OpenAI(
             base_url=self.BASEURL,
             api_key=getenv(self.KEY_ENV_VAR),
         )
 
-        self.async_client = AsyncOpenAI(
-            base_url=self.BASEURL,
-            api_key=getenv(self.KEY_ENV_VAR),
+        self.async_client = get_async_client().get_client(
+            self.BASEURL, getenv(self.KEY_ENV_VAR)
         )
 
     def get_completion(
@@ -107,27 +685,23 @@ def get_helper_response(prompt, rand=True):
 async def run_multiple_model_inference(prompt):
     try:
         helper_model = OpenRouterModel()
+        start_time = time.time()
 
-        async with aiohttp.ClientSession() as session:
-            start_time = time.time()
-
-            from tqdm.asyncio import tqdm_asyncio
-
-            # Create tasks for parallel execution
-            tasks = [
-                helper_model.get_async_completion(prompt, idx)
-                for idx in range(len(helper_model.MODELS))
-            ]
-            # Run all tasks concurrently with progress bar
-            responses = await tqdm_asyncio.gather(
-                *tasks, desc="Getting outputs from multiple LLMs"
-            )
+        # Create tasks for parallel execution
+        tasks = [
+            helper_model.get_async_completion(prompt, idx)
+            for idx in range(len(helper_model.MODELS))
+        ]
+        # Run all tasks concurrently with progress bar
+        responses = await tqdm_asyncio.gather(
+            *tasks, desc="Getting outputs from multiple LLMs"
+        )
 
-            elapsed_time = time.time() - start_time
-            error_count = responses.count("")
-            print(f" :: Total time elapsed: {elapsed_time:.2f}s, {error_count} errors")
+        elapsed_time = time.time() - start_time
+        error_count = responses.count("")
+        print(f" :: Total time elapsed: {elapsed_time:.2f}s, {error_count} errors")
 
-            return responses
+        return responses
     except Exception as e:
         print(f"Error in multiple LLMs inference: {str(e)}")
         return []
@@ -135,10 +709,7 @@ async def run_multiple_model_inference(prompt):
 
 def get_multiple_response(prompt: list) -> list:
     try:
-        import nest_asyncio
-
-        nest_asyncio.apply()
-        return asyncio.run(run_multiple_model_inference(prompt[0]))
+        return get_async_client().run(run_multiple_model_inference(prompt[0]))
     except Exception as e:
         print(f"Error in endpoint response: {str(e)}")
         return []
@@ -152,11 +723,20 @@ def get_openai_response(input: Union[str, list], model_name="gpt-4o"):
     else:
         raise ValueError(f"Invalid input type: {type(input)}")
 
-    response = oai_client.chat.completions.create(
+    start_time = time.monotonic()
+    response = get_provider("openai").chat.completions.create(
         model=model_name,
         messages=msg,
     )
-    return response.choices[0].message.content
+    content = response.choices[0].message.content
+    record_call(
+        model_name,
+        "".join(str(m["content"]) for m in msg),
+        [content],
+        time.monotonic() - start_time,
+        usage=response.usage,
+    )
+    return content
 
 
 def get_claude_response(
@@ -188,7 +768,8 @@ def get_claude_response(
         text_content = query
         img_content = ""
 
-    message = claude_client.messages.create(
+    start_time = time.monotonic()
+    message = get_provider("anthropic").messages.create(
         model="claude-3-5-sonnet-latest",
         max_tokens=4096,
         messages=[
@@ -199,131 +780,232 @@ def get_claude_response(
         ],
         system=system_prompt,
     )
+    record_call(
+        "claude-3-5-sonnet-latest",
+        system_prompt + str(query),
+        [message.content[0].text],
+        time.monotonic() - start_time,
+        usage=message.usage,
+    )
     return message.content[0].text
 
 
-try:
-    from vllm import LLM, SamplingParams
-    from vllm.sampling_params import GuidedDecodingParams
-
-    class VLLM:
-        def __init__(
-            self,
-            name: str,
-            # gpu_ids: List[int] = [0, 1], # Assuming we have 2 GPUs here
-            download_dir: Optional[str] = None,
-            dtype: str = "auto",
-            gpu_memory_utilization: float = 0.85,
-            max_model_len: int = 4096,
-            merge: bool = False,
-            max_tokens: int = 2048,
-            **kwargs,
-        ) -> None:
-            self.name: str = name
-            if merge:
-                os.environ["VLLM_ATTENTION_BACKEND"] = (
-                    "FLASH_ATTN"  # Use this for merged model
-                )
-            else:
-                # os.environ["VLLM_ATTENTION_BACKEND"] = "FLASHINFER" # Use this for baseline model | Gemma2 require this backend for inference
-                os.environ["VLLM_ATTENTION_BACKEND"] = (
-                    "FLASH_ATTN"  # Default to using llama3.1 70B (quantized version, of course)
-                )
+class ChatTemplate:
+    """
+    Chat template rendered once instead of once per prompt
+    - The template is rendered around a placeholder and prompts are spliced in between
+    - Templates that rewrite the user turn (checked on probes) fall back to memoised per-prompt rendering
+    - Prompts are expected stripped (as VLLM passes them), templates usually trim the turn content
+    """
 
-            available_gpus = list(range(torch.cuda.device_count()))
-            os.environ["CUDA_VISIBLE_DEVICES"] = ",".join(map(str, available_gpus))
+    PLACEHOLDER = "<<<EOH_PROMPT>>>"
 
-            # if len(available_gpus) > 1:
-            #     import multiprocessing
-            #     multiprocessing.set_start_method('spawn', force=True)
+    def __init__(
+        self, tokenizer, completion: str = "####Dummy-Answer", max_cached: int = 4096
+    ):
+        self.tokenizer = tokenizer
+        self.completion = completion
+        self.max_cached = max_cached
+        self._cache: Dict[str, str] = {}
+        self.prefix, self.suffix = None, None
+        head, found, tail = self.render(self.PLACEHOLDER).partition(self.PLACEHOLDER)
+        probes = ["probe", "Probe with\nlines and {braces}"]
+        if found and all(head + p + tail == self.render(p) for p in probes):
+            self.prefix, self.suffix = head, tail
+
+    def render(self, prompt: str) -> str:
+        messages = [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": self.completion},
+        ]
+        format_prompt = self.tokenizer.apply_chat_template(messages, tokenize=False)
+        return format_prompt.split(self.completion)[0]
 
-            self.model: LLM = LLM(
-                model=self.name,
-                tensor_parallel_size=len(available_gpus),
-                dtype=dtype,
-                gpu_memory_utilization=gpu_memory_utilization,
-                download_dir=download_dir,
-                max_model_len=max_model_len,
-            )
+    def __call__(self, prompt: str) -> str:
+        if self.prefix is not None:
+            return self.prefix + prompt + self.suffix
+        if prompt not in self._cache:
+            if len(self._cache) >= self.max_cached:
+                self._cache.clear()
+            self._cache[prompt] = self.render(prompt)
+        return self._cache[prompt]
 
-            self.max_tokens = max_tokens
-            self.params = SamplingParams(**kwargs)
-            self.params.max_tokens = self.max_tokens
-
-            self.tokenizer = AutoTokenizer.from_pretrained(self.name)
-
-        def completions(
-            self,
-            prompts: List[str],
-            grammar: Optional[str] = None,
-            use_tqdm: bool = True,
-            **kwargs: Union[int, float, str],
-        ) -> List[str]:
-            formatted_prompts = [
-                self.format_query_prompt(prompt.strip()) for prompt in prompts
-            ]
 
-            if grammar is not None: 
-                guided_decoding_params = GuidedDecodingParams(grammar = grammar)
-                sampling_params = SamplingParams(guided_decoding=guided_decoding_params, **kwargs) # re-initialize sampling params to use guided decoding (non-optimal)
-            else: 
-                sampling_params = SamplingParams(**kwargs)
+def prefix_order(prompts: List[str]) -> List[int]:
+    """
+    Indices of `prompts` in lexicographic order, which places prompts sharing a prefix
+    (task description, node descriptions, output format) next to each other so their
+    KV blocks are reused by vLLM's prefix cache before being evicted
+    """
+    return sorted(range(len(prompts)), key=prompts.__getitem__)
 
-            sampling_params.max_tokens = self.max_tokens
 
-            outputs = self.model.generate(
-                prompts = formatted_prompts, 
-                sampling_params = sampling_params, 
-                use_tqdm=use_tqdm
+class VLLM:
+    """
+    Offline vLLM engine; vllm / torch / transformers are imported when the engine is built
+    - Without vllm (e.g. Mac instance) it falls back to OpenAI completions
+    - Automatic prefix caching is on, prompts are submitted in prefix order
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        # gpu_ids: List[int] = [0, 1], # Assuming we have 2 GPUs here
+        download_dir: Optional[str] = None,
+        dtype: str = "auto",
+        gpu_memory_utilization: float = 0.85,
+        max_model_len: int = 4096,
+        merge: bool = False,
+        max_tokens: int = 2048,
+        enable_prefix_caching: bool = True,
+        **kwargs,
+    ) -> None:
+        self.name: str = name
+        self.model = None
+        try:
+            import torch
+            from transformers import AutoTokenizer
+            from vllm import LLM, SamplingParams
+        except ImportError:
+            print("🥤 vLLM not available - running in fallback mode without GPU/CUDA")
+            return
+
+        if merge:
+            os.environ["VLLM_ATTENTION_BACKEND"] = (
+                "FLASH_ATTN"  # Use this for merged model
             )
-            outputs = [output.outputs[0].text for output in outputs]
-            return outputs
-
-        def generate(
-            self,
-            prompts: List[str],
-            use_tqdm: bool = True,
-            **kwargs: Union[int, float, str],
-        ) -> List[str]:
-            formatted_prompts = [
-                self.format_query_prompt(prompt.strip()) for prompt in prompts
-            ]
-            return self.model.generate(
-                formatted_prompts, self.params, use_tqdm=use_tqdm
+        else:
+            # os.environ["VLLM_ATTENTION_BACKEND"] = "FLASHINFER" # Use this for baseline model | Gemma2 require this backend for inference
+            os.environ["VLLM_ATTENTION_BACKEND"] = (
+                "FLASH_ATTN"  # Default to using llama3.1 70B (quantized version, of course)
             )
 
-        def format_query_prompt(
-            self, prompt: str, completion: str = "####Dummy-Answer"
-        ) -> str:
-            messages = [
-                {"role": "user", "content": prompt},
-                {"role": "assistant", "content": completion},
-            ]
-            format_prompt = self.tokenizer.apply_chat_template(messages, tokenize=False)
-            query_prompt = format_prompt.split(completion)[0]
-            return query_prompt
+        available_gpus = list(range(torch.cuda.device_count()))
+        os.environ["CUDA_VISIBLE_DEVICES"] = ",".join(map(str, available_gpus))
+
+        # if len(available_gpus) > 1:
+        #     import multiprocessing
+        #     multiprocessing.set_start_method('spawn', force=True)
+
+        self.model = LLM(
+            model=self.name,
+            tensor_parallel_size=len(available_gpus),
+            dtype=dtype,
+            gpu_memory_utilization=gpu_memory_utilization,
+            download_dir=download_dir,
+            max_model_len=max_model_len,
+            enable_prefix_caching=enable_prefix_caching,
+        )
+        if enable_prefix_caching and not self.prefix_caching_enabled:
+            print("⚠️ vLLM prefix caching requested but not active on this engine")
 
-except ImportError:
+        self.max_tokens = max_tokens
+        self.params = SamplingParams(**kwargs)
+        self.params.max_tokens = self.max_tokens
 
-    class VLLM:
-        def __init__(self, *args, **kwargs):
-            pass
+        self.tokenizer = AutoTokenizer.from_pretrained(self.name)
+        self.chat_template = ChatTemplate(self.tokenizer)
 
-        def completions(self, *args, **kwargs):
-            return get_openai_response(*args, **kwargs)
+    @property
+    def prefix_caching_enabled(self) -> bool:
+        cache_config = getattr(
+            getattr(self.model, "llm_engine", None), "cache_config", None
+        )
+        return bool(getattr(cache_config, "enable_prefix_caching", False))
+
+    def completions(
+        self,
+        prompts: List[str],
+        grammar: Optional[str] = None,
+        use_tqdm: bool = True,
+        **kwargs: Union[int, float, str],
+    ) -> List[str]:
+        if self.model is None:
+            return get_openai_response(prompts, **kwargs)
+
+        from vllm import SamplingParams
+        from vllm.sampling_params import GuidedDecodingParams
+
+        # repeated prompts are generated once with SamplingParams.n, sharing one prefill
+        groups = group_samples(mark_samples(prompts))
+        formatted_prompts = [
+            self.format_query_prompt(prompt.strip()) for prompt, _ in groups
+        ]
+        order = prefix_order(formatted_prompts)
+        groups = [groups[i] for i in order]
+        formatted_prompts = [formatted_prompts[i] for i in order]
+
+        sampling_params_by_n = {}
+        for n in {len(indices) for _, indices in groups}:
+            if grammar is not None:
+                guided_decoding_params = GuidedDecodingParams(grammar=grammar)
+                sampling_params = SamplingParams(
+                    n=n, guided_decoding=guided_decoding_params, **kwargs
+                )  # re-initialize sampling params to use guided decoding (non-optimal)
+            else:
+                sampling_params = SamplingParams(n=n, **kwargs)
+            sampling_params.max_tokens = self.max_tokens
+            sampling_params_by_n[n] = sampling_params
+
+        outputs = self.model.generate(
+            prompts=formatted_prompts,
+            sampling_params=[sampling_params_by_n[len(i)] for _, i in groups],
+            use_tqdm=use_tqdm,
+        )
+        responses = [""] * len(prompts)
+        for (_, indices), output in zip(groups, outputs):
+            for i, completion in zip(indices, output.outputs):
+                responses[i] = completion.text
+        return responses
+
+    def generate(
+        self,
+        prompts: List[str],
+        use_tqdm: bool = True,
+        **kwargs: Union[int, float, str],
+    ) -> List[str]:
+        formatted_prompts = [
+            self.format_query_prompt(prompt.strip()) for prompt in prompts
+        ]
+        order = prefix_order(formatted_prompts)
+        outputs = self.model.generate(
+            [formatted_prompts[i] for i in order], self.params, use_tqdm=use_tqdm
+        )
+        ordered_outputs = [None] * len(prompts)
+        for i, output in zip(order, outputs):
+            ordered_outputs[i] = output
+        return ordered_outputs
+
+    def format_query_prompt(
+        self, prompt: str, completion: str = "####Dummy-Answer"
+    ) -> str:
+        if completion == self.chat_template.completion:
+            return self.chat_template(prompt)
+        messages = [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": completion},
+        ]
+        format_prompt = self.tokenizer.apply_chat_template(messages, tokenize=False)
+        query_prompt = format_prompt.split(completion)[0]
+        return query_prompt
 
-    # Just write a dummy VLLM class for Mac instance here
-    print("🥤 vLLM not available - running in fallback mode without GPU/CUDA")
 
 def fold_vllm_response_func(name: str = "") -> Callable:
     model = VLLM(name="meta-llama/Llama-3.1-8B-Instruct" if not name else name)
     get_vllm_response = lambda query, desc: model.completions([query])[0]
+    get_vllm_response.model = f"vllm:{model.name}"
     return get_vllm_response
 
 
 def get_batch_vllm_func(name: str = "", max_tokens: int = 2048) -> Callable:
-    model = VLLM(name="meta-llama/Llama-3.1-8B-Instruct" if not name else name, max_tokens=max_tokens)
-    get_vllm_response = lambda query, grammar=None, desc="": model.completions(query, grammar) # default to no grammar constraint
+    model = VLLM(
+        name="meta-llama/Llama-3.1-8B-Instruct" if not name else name,
+        max_tokens=max_tokens,
+    )
+    get_vllm_response = lambda query, grammar=None, desc="": model.completions(
+        query, grammar
+    )  # default to no grammar constraint
+    get_vllm_response.model = f"vllm:{model.name}"
     return get_vllm_response
 
 
@@ -338,72 +1020,24 @@ def get_async_vllm_endpoint(
     desc: str = "Processing LLM queries",
     model_name: str = "meta-llama/Llama-3.1-8B-Instruct",
 ) -> Callable:
-    async def get_completion(
-        client,
-        session,
-        query: str,
-        system_prompt: str = "You are a Turing award winner.",
-    ):
-        try:
-            response = await client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query},
-                ],
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Error in completion: {str(e)}")
-            return ""
-
-    async def run_parallel_inference(
-        query_list: list, system_prompt: str = "You are a Turing award winner."
-    ):
-        try:
-            client = AsyncOpenAI(
-                # base_url=f"https://api.runpod.ai/v2/{endpoint_id}",  # Even simpler endpoint
-                base_url=f"https://api.runpod.ai/v2/{endpoint_id}/openai/v1",
-                api_key=runpod_api_key,
-            )
-
-            async with aiohttp.ClientSession() as session:
-                start_time = time.time()
-
-                from tqdm.asyncio import tqdm_asyncio
-
-                # Create tasks for parallel execution
-                tasks = [
-                    get_completion(client, session, query, system_prompt)
-                    for query in query_list
-                ]
-                # Run all tasks concurrently with progress bar
-                responses = await tqdm_asyncio.gather(*tasks, desc=desc)
-
-                elapsed_time = time.time() - start_time
-                error_count = responses.count("")
-                print(
-                    f" :: Total time elapsed: {elapsed_time:.2f}s, {error_count} errors"
-                )
-
-                return responses
-        except Exception as e:
-            print(f"Error in parallel inference: {str(e)}")
-            return []
-
-    import nest_asyncio
-
-    nest_asyncio.apply()
+    """
+    RunPod serverless vLLM endpoint (OpenAI-compatible), served through the shared async client
+    """
+    get_response = get_async_llm_func(
+        model_name,
+        base_url=f"https://api.runpod.ai/v2/{endpoint_id}/openai/v1",
+        api_key=runpod_api_key,
+    )
 
     def get_vllm_endpoint_response(
-        prompt: str | list, system_prompt: str = "You are a Turing award winner."
+        prompt: str | list,
+        desc: str = desc,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
     ) -> list:
-        try:
-            return asyncio.run(run_parallel_inference(prompt, system_prompt))
-        except Exception as e:
-            print(f"Error in endpoint response: {str(e)}")
-            return []
+        return get_response(prompt, desc=desc, system_prompt=system_prompt)
 
+    get_vllm_endpoint_response.stream = get_response.stream
+    get_vllm_endpoint_response.model = get_response.model
     return get_vllm_endpoint_response
 
 
@@ -411,121 +1045,25 @@ def get_async_vllm_endpoint_(
     endpoint_id: str, runpod_api_key: str, batch_size_limit: int = 500
 ) -> Callable:
     """
-    Process queries in batches for endpoint inference to avoid overwhelming the server
+    Process queries with at most `batch_size_limit` requests in flight to avoid overwhelming the server
+    - Concurrency adapts below the cap on throttling; failed requests are retried instead of returning ""
     """
+    base_url = f"https://api.runpod.ai/v2/{endpoint_id}/openai/v1"
+    get_async_client().configure_endpoint(
+        base_url,
+        max_concurrency=batch_size_limit,
+        initial_concurrency=min(64, batch_size_limit),
+        request_timeout=30,
+    )
+    return get_async_vllm_endpoint(endpoint_id, runpod_api_key)
 
-    async def get_completion(
-        client,
-        session,
-        query: str,
-        system_prompt: str = "You are a Turing award winner.",
-    ):
-        try:
-            response = await client.chat.completions.create(
-                model="meta-llama/Llama-3.1-8B-Instruct",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query},
-                ],
-            )
-            return response.choices[0].message.content
-        except Exception:
-            # print(f"Error in completion: {str(e)}")
-            return ""
-
-    async def process_batch(client, session, batch_queries: list, system_prompt: str):
-        # Add timeout for each completion request
-        async def get_completion_with_timeout(query):
-            try:
-                # Set 30-second timeout for each individual request
-                async with asyncio.timeout(30):
-                    return await get_completion(client, session, query, system_prompt)
-            except asyncio.TimeoutError:
-                # print(f"Request timed out")
-                return ""
-            except Exception:
-                # print(f"Error in completion: {str(e)}")
-                return ""
-
-        tasks = [get_completion_with_timeout(query) for query in batch_queries]
-        return await tqdm_asyncio.gather(
-            *tasks, desc=f"Processing batch of {len(batch_queries)} queries"
-        )
-
-    async def run_parallel_inference(
-        query_list: list, system_prompt: str = "You are a Turing award winner."
-    ):
-        try:
-            client = AsyncOpenAI(
-                base_url=f"https://api.runpod.ai/v2/{endpoint_id}/openai/v1",
-                api_key=runpod_api_key,
-            )
-
-            async with aiohttp.ClientSession() as session:
-                start_time = time.time()
-                all_responses = []
-
-                # Process queries in batches with overall timeout
-                for i in range(0, len(query_list), batch_size_limit):
-                    try:
-                        # Set 5-minute timeout for each batch
-                        async with asyncio.timeout(300):
-                            batch = query_list[i : i + batch_size_limit]
-                            batch_responses = await process_batch(
-                                client, session, batch, system_prompt
-                            )
-                            all_responses.extend(batch_responses)
-                    except asyncio.TimeoutError:
-                        print(
-                            f"Batch {i//batch_size_limit + 1} timed out, moving to next batch"
-                        )
-                        # Fill in empty responses for the failed batch
-                        all_responses.extend([""] * len(batch))
-                        continue
-
-                elapsed_time = time.time() - start_time
-                error_count = all_responses.count("")
-                print(
-                    f" :: Total time elapsed: {elapsed_time:.2f}s, {error_count} errors"
-                )
-
-                return all_responses
-        except Exception as e:
-            print(f"Error in parallel inference: {str(e)}")
-            return []
-
-    import nest_asyncio
-
-    nest_asyncio.apply()
-
-    def get_vllm_endpoint_response(
-        prompt: list, system_prompt: str = "You are a Turing award winner."
-    ) -> list:
-        try:
-            return asyncio.run(run_parallel_inference(prompt, system_prompt))
-        except Exception as e:
-            print(f"Error in endpoint response: {str(e)}")
-            return []
-
-    return get_vllm_endpoint_response
-
-
-try:
-    import groq
-
-    groq_client = groq.Groq()
-
-    def get_groq_response(prompt: str):
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content
-
-except:
-    pass
 
-import requests
+def get_groq_response(prompt: str):
+    response = get_provider("groq").chat.completions.create(
+        model="llama-3.1-8b-instant",
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return response.choices[0].message.content
 
 
 # Own served instance (vLLM)
@@ -536,6 +1074,8 @@ def get_vllm_endpoint_func(
 ):
     BASE_URL = f"https://{POD_ID}-{INTERNAL_PORT}.proxy.runpod.net"  # replace "localhost" with this
 
+    import requests
+
     def get_endpoint_response(prompts: list[str], system=""):
         if type(prompts) is str:
             prompts = [prompts]
@@ -555,4 +1095,5 @@ def get_vllm_endpoint_func(
     get_endpoint_response(warmup_prompt)
     print(":: Server initialized successfully!")
 
-    return get_endpoint_response
\ No newline at end of file
+    get_endpoint_response.model = f"{BASE_URL}:{model_name}"
+    return get_endpoint_response
@@ -0,0 +1,102 @@
+import pickle
+import threading
+from typing import Any, Dict, List, Optional
+
+from .cache import DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES, SQLiteLRUStore, hash_key
+
+# Memoised evaluation cells, so byte-identical candidates are never re-scored
+# - Execution cell: (code, test input, node signature) -> CallResult / (output dict, errors)
+# - Score cell: (code, test case, metric config) -> (alignment score, alignment errors)
+# - Values are pickled into a SQLiteLRUStore: in memory by default, on disk (`path`) to persist across runs
+# - Timed-out runs and failed LLM judgements are never memoised: they say nothing about the code
+
+
+class EvaluationMemo:
+    """
+    Memo of (code, test case) evaluation cells
+    - Keys hash the code text, so any edit to a candidate is a miss
+    - Unpicklable values (e.g. instances of classes defined by the candidate) are skipped
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.store = SQLiteLRUStore(path, max_entries, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def execution_key(code: str, test_input: Any, signature: Any) -> str:
+        return hash_key("execution", code, test_input, signature)
+
+    @staticmethod
+    def score_key(code: str, test_input: Any, target_output: Any, config: Any) -> str:
+        return hash_key("score", code, test_input, target_output, config)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        for key, value in self.store.get_many(keys).items():
+            try:
+                found[key] = pickle.loads(value)
+            except Exception:  # written by an incompatible version
+                continue
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: Any) -> bool:
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+        self.store.set(key, payload)
+        return True
+
+    def clear(self) -> None:
+        self.store.clear()
+        with self._lock:
+            self.hits, self.misses = 0, 0
+
+    def close(self) -> None:
+        self.store.close()
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.store),
+            "bytes": self.store.size_bytes,
+        }
+
+    def __repr__(self):
+        stats = self.stats
+        return (
+            f"EvaluationMemo(path={self.store.path!r}, entries={stats['entries']}, "
+            f"hit_rate={stats['hit_rate']:.1%})"
+        )
+
+
+_evaluation_memo: Optional[EvaluationMemo] = None
+_evaluation_memo_lock = threading.Lock()
+
+
+def get_evaluation_memo() -> EvaluationMemo:
+    """
+    Process-wide in-memory EvaluationMemo, created on first use
+    """
+    global _evaluation_memo
+    with _evaluation_memo_lock:
+        if _evaluation_memo is None:
+            _evaluation_memo = EvaluationMemo()
+        return _evaluation_memo
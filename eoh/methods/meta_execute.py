@@ -1,56 +1,705 @@
 import ast
-import concurrent.futures
+import cProfile
+import ctypes
+import functools
 import importlib.util
 import inspect
-import re
-import signal
+import heapq
+import io
+import itertools
+import os
+import pstats
+import random
 import sys
+import threading
+import time
+import tracemalloc
 import types
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from multiprocessing import Pool
-from typing import Any, Dict, List, Union, get_args, get_origin, get_type_hints
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
 
 import astor
 from tqdm import tqdm
 
+from .llm import iter_responses
 from .meta_prompt import extract_json_from_text
+from .references import get_reference_index, reference_index
 
+UnionType = getattr(types, "UnionType", None)  # `int | str`, Python 3.10+
 
-def check_type(value, expected_type):
+
+# Compiled type checkers for node I/O validation
+# - Each annotation is compiled once (LRU by annotation) into a closure specialised for its shape
+# - Containers of plain classes are checked one distinct element type at a time (set(map(type, ...)))
+# - Sampling modes bound the cost on huge containers: "full" checks every element, "ends" the first
+#   and last k, "random" a random 2k; containers of at most 2k elements are always checked in full
+# - The mode is read at check time, so compiled checkers stay valid when it changes; sandbox workers
+#   are forked, so set it before the pool starts
+TYPE_CHECK_MODES = ("full", "ends", "random")
+TYPE_CHECK_SAMPLE_SIZE = 32
+TYPE_CHECKER_CACHE_SIZE = 1024
+
+_type_check_mode = ("full", TYPE_CHECK_SAMPLE_SIZE)
+_type_check_rng = random.Random(0)
+
+
+def set_type_check_mode(mode: str = "full", sample_size: int = TYPE_CHECK_SAMPLE_SIZE):
+    global _type_check_mode
+    if mode not in TYPE_CHECK_MODES:
+        raise ValueError(
+            f"Unknown type check mode {mode!r}, expected one of {TYPE_CHECK_MODES}"
+        )
+    _type_check_mode = (mode, max(1, int(sample_size)))
+
+
+def _sample(values):
+    """
+    The elements of a list / tuple / set / frozenset / dict view to check under the current mode
+    """
+    mode, k = _type_check_mode
+    if mode == "full" or len(values) <= 2 * k:
+        return values
+    if mode == "ends":
+        if isinstance(values, (list, tuple)):
+            return itertools.chain(values[:k], values[-k:])
+        if isinstance(values, (set, frozenset)):  # unordered: any 2k elements
+            return itertools.islice(values, 2 * k)
+        return itertools.chain(
+            itertools.islice(values, k), itertools.islice(reversed(values), k)
+        )
+    if isinstance(values, (list, tuple)):
+        return [values[i] for i in _type_check_rng.sample(range(len(values)), 2 * k)]
+    return _type_check_rng.sample(list(values), 2 * k)
+
+
+def _is_plain_class(tp) -> bool:
+    return isinstance(tp, type) and get_origin(tp) is None
+
+
+def _always(value) -> bool:
+    return True
+
+
+def _elements_checker(tp) -> Callable[[Iterable], bool]:
+    """
+    Check all (sampled) elements of a container against 'tp'
+    """
+    if tp is Any:
+        return lambda values: True
+    if _is_plain_class(tp):
+        return lambda values: all(
+            issubclass(value_type, tp) for value_type in set(map(type, _sample(values)))
+        )
+    check = compile_type_checker(tp)
+    return lambda values: all(map(check, _sample(values)))
+
+
+def _compile_type_checker(expected_type) -> Callable[[Any], bool]:
     if expected_type is Any:
-        return True
+        return _always
 
     origin = get_origin(expected_type)
     if origin is None:
-        # For non-generic types
-        return isinstance(value, expected_type)
-    else:
-        # For generic types
+        # For non-generic types (isinstance raises for non-classes, as it always did)
+        return lambda value: isinstance(value, expected_type)
+
+    args = get_args(expected_type)
+    if origin is Union or (UnionType is not None and origin is UnionType):
+        if all(_is_plain_class(arg) for arg in args):
+            return lambda value: isinstance(value, args)
+        options = [compile_type_checker(arg) for arg in args]
+        return lambda value: any(check(value) for check in options)
+    if origin is Literal:
+        return lambda value: any(
+            value == arg and type(value) is type(arg) for arg in args
+        )
+
+    # For generic types
+    if not args:
+        return lambda value: isinstance(value, origin)
+    if origin is tuple and not (len(args) == 2 and args[1] is Ellipsis):
+        if args == ((),):  # Tuple[()]
+            return lambda value: isinstance(value, tuple) and not value
+        positions = [compile_type_checker(arg) for arg in args]
+        return lambda value: (
+            isinstance(value, tuple)
+            and len(value) == len(positions)
+            and all(check(item) for check, item in zip(positions, value))
+        )
+
+    items = _elements_checker(args[0])
+    values_ = _elements_checker(args[1]) if len(args) > 1 else None
+
+    def check(value) -> bool:
         if not isinstance(value, origin):
             return False
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return items(value)
+        if isinstance(value, dict):
+            return items(value.keys()) and (values_ is None or values_(value.values()))
+        # For other types of generics, you might need to add more specific checks
+        return True
 
-        args = get_args(expected_type)
-        if not args:
-            return True  # No arguments to check
+    return check
+
+
+@functools.lru_cache(maxsize=TYPE_CHECKER_CACHE_SIZE)
+def _cached_type_checker(expected_type) -> Callable[[Any], bool]:
+    return _compile_type_checker(expected_type)
 
-        if isinstance(value, (list, tuple, set)):
-            return all(check_type(item, args[0]) for item in value)
-        elif isinstance(value, dict):
-            return all(check_type(k, args[0]) for k in value.keys()) and all(
-                check_type(v, args[1]) for v in value.values()
-            )
-        else:
-            # For other types of generics, you might need to add more specific checks
-            return True
+
+def compile_type_checker(expected_type) -> Callable[[Any], bool]:
+    """
+    Checker closure for 'expected_type', compiled once per annotation
+    """
+    try:
+        return _cached_type_checker(expected_type)
+    except TypeError:  # unhashable annotation
+        return _compile_type_checker(expected_type)
+
+
+def check_type(value, expected_type):
+    return compile_type_checker(expected_type)(value)
 
 
 class TimeoutError(Exception):
     pass
 
 
-def timeout_handler(signum, frame):
-    raise TimeoutError("Function execution timed out (> 3 seconds)")
+# Thread-safe timeouts
+# - A single watchdog thread keeps a heap of deadlines and raises TimeoutError asynchronously
+#   in the thread that entered the block (PyThreadState_SetAsyncExc), so no SIGALRM / main-thread restriction
+# - Sub-second resolution; the exception lands at the next bytecode, so a blocking C call is
+#   interrupted only once it returns (hard limits for runaway code live in the sandbox processes)
+DEFAULT_TIMEOUT = 3.0  # seconds
+
+
+def timeout_message(seconds: float) -> str:
+    return f"Function execution timed out (> {seconds:g} seconds)"
+
+
+def _set_async_exc(thread_id: int, exc_type: Optional[type]):
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id),
+        ctypes.py_object(exc_type) if exc_type is not None else None,
+    )
+
+
+class _Watchdog:
+    def __init__(self):
+        self._reset()
+        # a forked child has no watchdog thread (and maybe a held lock): start afresh
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._heap = []  # (deadline, seq, Timeout_)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, timer: "Timeout_"):
+        with self._cond:
+            heapq.heappush(self._heap, (timer.deadline, next(self._seq), timer))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="timeout-watchdog", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    timer = heapq.heappop(self._heap)[2]
+                    if timer.deadline > now:  # reset() since it was queued
+                        heapq.heappush(
+                            self._heap, (timer.deadline, next(self._seq), timer)
+                        )
+                    else:
+                        timer.expire()
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+
+_watchdog = _Watchdog()
+
+
+class Timeout_:
+    """
+    Raise TimeoutError in the calling thread once 'seconds' have elapsed inside the block
+    - Usable from any thread or event-loop callback; None / 0 disables the limit
+    - reset() restarts the clock cheaply, e.g. once per row of a batch
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.timed_out = False
+
+    def __enter__(self):
+        self.timed_out = False
+        if self.seconds:
+            self._thread_id = threading.get_ident()
+            self._lock = threading.Lock()
+            self._done = False
+            self.deadline = time.monotonic() + self.seconds
+            _watchdog.add(self)
+        return self
+
+    def reset(self):
+        self.deadline = time.monotonic() + self.seconds
+
+    def expire(self):
+        with self._lock:
+            if not self._done:
+                self.timed_out = True
+                _set_async_exc(self._thread_id, TimeoutError)
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.seconds:
+            return False
+        with self._lock:
+            self._done = True
+        if self.timed_out:
+            _set_async_exc(self._thread_id, None)  # drop it if not delivered yet
+            if exc_type is TimeoutError and not str(exc):
+                raise TimeoutError(timeout_message(self.seconds)) from None
+        return False
+
+
+@dataclass
+class CallResult:
+    """
+    Outcome of a call made under a timeout
+    - Unpacks as (value, error) like the call_func_* helpers
+    - crashed: the run itself failed (worker crash, MemoryError), not an answer of the candidate
+    - elapsed / cpu_time in seconds, peak_rss in bytes (resident high-water mark during the call, 0 if unknown)
+    - profile: tracemalloc / cProfile summary when profiling was requested
+    """
+
+    value: Any = None
+    error: str = ""
+    timed_out: bool = False
+    elapsed: float = field(default=0.0, compare=False)
+    cpu_time: float = field(default=0.0, compare=False)
+    peak_rss: int = field(default=0, compare=False)
+    profile: str = field(default="", compare=False)
+    crashed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    @property
+    def reproducible(self) -> bool:
+        """
+        Whether running again would give the same result: false for timeouts and crashes
+        """
+        return not (self.timed_out or self.crashed)
+
+    def __iter__(self):
+        return iter((self.value, self.error))
+
+
+# Execution telemetry
+# - Wall time, CPU time of the calling thread and peak RSS are always recorded (a few syscalls per call)
+# - Peak RSS is per call: the kernel's high-water mark (VmHWM) is reset through /proc/self/clear_refs
+#   before the call and read after it; 0 where /proc does not support this (non-Linux)
+# - profile="memory": tracemalloc peak and top allocation sites; profile="cpu": cProfile top functions
+# - Peak RSS and tracemalloc are process-wide: they are only meaningful when calls do not overlap
+#   (sandbox workers, or sequential in-process evaluation)
+PROFILE_MODES = (None, "memory", "cpu")
+PROFILE_TOP_K = 5
+EFFICIENCY_TIME_SCALE = 1e-3  # seconds: a call of this CPU time scores efficiency 0.5
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the resident high-water mark of this process to its current RSS, False where unsupported
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss() -> int:
+    """
+    Resident high-water mark of this process in bytes since the last reset_peak_rss, 0 where unavailable
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+class Profiler:
+    """
+    Record the resource usage of the block onto a CallResult
+    """
+
+    def __init__(self, result: CallResult, mode: Optional[str] = None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(
+                f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}"
+            )
+        self.result = result
+        self.mode = mode
+        self._profiler = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.mode == "memory":
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        elif self.mode == "cpu":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._rss = reset_peak_rss()
+        self._wall, self._cpu = time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.result.elapsed = time.perf_counter() - self._wall
+        self.result.cpu_time = time.thread_time() - self._cpu
+        self.result.peak_rss = peak_rss() if self._rss else 0
+        if self.mode == "memory":
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                ]
+            )  # allocations still alive after the call, outside this harness
+            sites = snapshot.statistics("lineno")[:PROFILE_TOP_K]
+            if self._started_tracing:
+                tracemalloc.stop()
+            self.result.profile = "\n".join(
+                [f"peak allocated: {peak / 1024:.1f} KiB"]
+                + [str(site) for site in sites]
+            )
+        elif self.mode == "cpu":
+            self._profiler.disable()
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_K)
+            self.result.profile = stream.getvalue().strip()
+        return False
+
+
+@dataclass
+class ExecutionTelemetry:
+    """
+    Resource usage of one candidate, accumulated over its calls
+    """
+
+    calls: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_rss: int = 0
+    profile: str = ""
+
+    def add(self, result: CallResult):
+        self.calls += 1
+        self.wall_time += result.elapsed
+        self.cpu_time += result.cpu_time
+        self.peak_rss = max(self.peak_rss, result.peak_rss)
+        self.profile = result.profile or self.profile
+
+    @property
+    def mean_cpu_time(self) -> float:
+        return self.cpu_time / self.calls if self.calls else 0.0
+
+    @property
+    def mean_wall_time(self) -> float:
+        return self.wall_time / self.calls if self.calls else 0.0
+
+    @property
+    def efficiency(self) -> Optional[float]:
+        """
+        In (0, 1], decreasing with the mean CPU time per call; None before any call
+        """
+        if not self.calls:
+            return None
+        return 1.0 / (1.0 + self.mean_cpu_time / EFFICIENCY_TIME_SCALE)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "mean_wall_time": self.mean_wall_time,
+            "mean_cpu_time": self.mean_cpu_time,
+            "peak_rss": self.peak_rss,
+            "profile": self.profile,
+        }
+
+
+def resolve_timeout(timeout: Union[bool, float, None]) -> Optional[float]:
+    """
+    True -> DEFAULT_TIMEOUT, False / None -> no limit, number -> seconds
+    """
+    if timeout is True:
+        return DEFAULT_TIMEOUT
+    return float(timeout) if timeout else None
+
+
+def call_with_timeout(
+    func: Callable,
+    *args,
+    timeout: Union[bool, float, None] = True,
+    profile: Optional[str] = None,
+    **kwargs,
+) -> CallResult:
+    """
+    Call func(*args, **kwargs) under a thread-safe timeout, never raising
+    - profile: None, "memory" or "cpu" (see Profiler)
+    """
+    result = CallResult()
+    with Profiler(result, profile):
+        try:
+            with Timeout_(resolve_timeout(timeout)):
+                result.value = func(*args, **kwargs)
+        except TimeoutError as e:
+            result.error, result.timed_out = str(e), True
+        except Exception as e:
+            result.error = str(e) or repr(e)
+            result.crashed = isinstance(e, MemoryError)
+    return result
+
+
+# Compile-once cache for generated functions
+# - Each distinct source is parsed and compiled to a code object once, not once per test input
+# - Stateless modules (see keeps_module_state) are also exec'd once per (source, function name),
+#   with signature, required parameters and type hints resolved at compile time
+# - Any other module is exec'd into fresh globals on every call, as before the cache: a candidate
+#   mutating its module state gets the same result whatever ran before it
+# - Bounded LRUs so long evolutions do not keep every candidate module alive
+FUNCTION_CACHE_SIZE = 1024
+_STATE_BUILTINS = {"globals", "vars", "setattr", "delattr", "exec", "eval"}
+
+
+def _is_constant(node: ast.AST) -> bool:
+    """
+    Immutable value: literals, tuples and operators over them, names bound elsewhere
+    """
+    return all(
+        isinstance(
+            n,
+            (
+                ast.Constant,
+                ast.Tuple,
+                ast.UnaryOp,
+                ast.BinOp,
+                ast.BoolOp,
+                ast.Compare,
+                ast.Name,
+                ast.expr_context,
+                ast.unaryop,
+                ast.operator,
+                ast.boolop,
+                ast.cmpop,
+            ),
+        )
+        for n in ast.walk(node)
+    )
+
+
+def _is_docstring(node: ast.stmt) -> bool:
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+
+
+def _is_plain_function(node: ast.stmt) -> bool:
+    """
+    Undecorated function without mutable defaults (a default list would persist between calls)
+    """
+    return (
+        isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+        and not node.decorator_list
+        and all(
+            _is_constant(default)
+            for default in node.args.defaults + node.args.kw_defaults
+            if default is not None
+        )
+    )
+
+
+def _is_constant_assignment(node: ast.stmt) -> bool:
+    if isinstance(node, ast.Assign):
+        return all(isinstance(t, ast.Name) for t in node.targets) and _is_constant(
+            node.value
+        )
+    if isinstance(node, ast.AnnAssign):
+        return isinstance(node.target, ast.Name) and (
+            node.value is None or _is_constant(node.value)
+        )
+    return False
+
+
+def _store_root(node: ast.expr) -> Optional[ast.expr]:
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        if isinstance(node, ast.Attribute) and node.attr == "__class__":
+            return None
+        node = node.value
+    return node
+
+
+def keeps_module_state(tree: ast.Module) -> bool:
+    """
+    Whether calls of functions from this module may leave state behind for later calls (conservative)
+    - Module level: only imports, plain functions, constant assignments and plain classes are stateless
+    - Functions: no global / nonlocal, no stores into attributes or items of module-level names,
+      classes or call results, no globals() / vars() / setattr() / delattr() / exec() / eval()
+    """
+    module_names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            module_names.update(
+                (alias.asname or alias.name).split(".")[0] for alias in node.names
+            )
+        elif _is_plain_function(node):
+            module_names.add(node.name)
+        elif isinstance(node, ast.ClassDef):
+            if node.decorator_list or node.keywords:
+                return True
+            for item in node.body:
+                if not (
+                    _is_plain_function(item)
+                    or _is_constant_assignment(item)
+                    or _is_docstring(item)
+                    or isinstance(item, ast.Pass)
+                ):
+                    return True
+            module_names.add(node.name)
+        elif _is_constant_assignment(node):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            module_names.update(target.id for target in targets)
+        elif not _is_docstring(node):
+            return True
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            return True
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in _STATE_BUILTINS
+        ):
+            return True
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and isinstance(
+            node.ctx, (ast.Store, ast.Del)
+        ):
+            root = _store_root(node)
+            if not isinstance(root, ast.Name) or root.id in module_names:
+                return True
+    return False
+
+
+@dataclass(frozen=True)
+class CompiledFunction:
+    func: Callable
+    param_types: Dict[str, Any]
+    return_type: Any
+    required_params: FrozenSet[str]
+    param_checkers: Dict[str, Callable[[Any], bool]]
+    return_checker: Callable[[Any], bool]
+    stateless: bool = True
+
+    @classmethod
+    def from_function(
+        cls, func: Callable, stateless: bool = True
+    ) -> "CompiledFunction":
+        type_hints = get_type_hints(func)
+        return_type = type_hints.pop("return", Any)
+        required_params = frozenset(
+            name
+            for name, param in inspect.signature(func).parameters.items()
+            if param.default == inspect.Parameter.empty
+            and param.kind != inspect.Parameter.VAR_KEYWORD
+        )
+        param_checkers = {
+            name: compile_type_checker(expected_type)
+            for name, expected_type in type_hints.items()
+        }
+        return cls(
+            func,
+            type_hints,
+            return_type,
+            required_params,
+            param_checkers,
+            compile_type_checker(return_type),
+            stateless,
+        )
+
+
+@functools.lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _compile_source(code: str) -> Tuple[types.CodeType, bool]:
+    """
+    (code object, stateless) of a source, parsed and compiled once
+    """
+    tree = ast.parse(code, "<generated>")
+    return compile(tree, "<generated>", "exec"), not keeps_module_state(tree)
+
+
+def _load_function(
+    code_object: types.CodeType, func_name: str, stateless: bool
+) -> CompiledFunction:
+    mod = types.ModuleType("dynamic_module")
+    exec(code_object, mod.__dict__)
+    if func_name not in mod.__dict__:
+        raise ValueError(f"Function '{func_name}' not found in generated code")
+    return CompiledFunction.from_function(mod.__dict__[func_name], stateless)
+
+
+@functools.lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _load_stateless_function(code: str, func_name: str) -> CompiledFunction:
+    return _load_function(_compile_source(code)[0], func_name, True)
+
+
+def compile_function(code: str, func_name: str) -> CompiledFunction:
+    """
+    'func_name' from 'code' with precomputed metadata, exec'd into a fresh module
+    - Stateless modules are exec'd once and shared; others get a fresh module on every call
+    - Failures are not cached: the same error is raised again on the next call
+    """
+    code_object, stateless = _compile_source(code)
+    if stateless:
+        return _load_stateless_function(code, func_name)
+    return _load_function(code_object, func_name, False)
+
+
+def load_function_from_file(file_path: str, func_name: str) -> CompiledFunction:
+    module_name = f"dynamic_module_{hash(file_path)}"
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = mod
+    spec.loader.exec_module(mod)
+    if func_name not in mod.__dict__:
+        raise ValueError(f"Function '{func_name}' not found in generated code")
+    return CompiledFunction.from_function(mod.__dict__[func_name])
 
 
 def _call_func_code(
@@ -58,96 +707,268 @@ def _call_func_code(
     code: str,
     func_name: str,
     file_path: str = None,
-    timeout: bool = True,
+    timeout: Union[bool, float] = True,
 ) -> Any:
     """
     Dynamic calling function defined in 'code' snippet with 3-second timeout
+    - timeout: True for DEFAULT_TIMEOUT, a number of seconds, or False for none
     """
-    # Set up the timeout handler
-    if timeout:
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(3)  # Set timeout to 3 seconds
-
-    try:
+    with Timeout_(resolve_timeout(timeout)):
         if file_path:
             # Load code from external file
-            module_name = f"dynamic_module_{hash(file_path)}"
-            spec = importlib.util.spec_from_file_location(module_name, file_path)
-            mod = importlib.util.module_from_spec(spec)
-            sys.modules[module_name] = mod
-            spec.loader.exec_module(mod)
-        else:
-            # Use the existing code string approach
-            mod = types.ModuleType("dynamic_module")
-            exec(code, mod.__dict__)
-
-        # Get the function from the module
-        if func_name not in mod.__dict__:
-            raise ValueError(f"Function '{func_name}' not found in generated code")
-
-        func = mod.__dict__[func_name]
-
-        # Check input types
-        type_hints = get_type_hints(func)
-        if "return" in type_hints:
-            expected_return_type = type_hints["return"]
-            del type_hints["return"]
+            compiled = load_function_from_file(file_path, func_name)
         else:
-            expected_return_type = Any
+            # Use the existing code string approach (compiled once per distinct source)
+            compiled = compile_function(code, func_name)
 
         # Check if all required parameters are provided
-        sig = inspect.signature(func)
-        required_params = {
-            name: param
-            for name, param in sig.parameters.items()
-            if param.default == inspect.Parameter.empty
-            and param.kind != inspect.Parameter.VAR_KEYWORD
-        }
-        if not all(name in input_data for name in required_params):
-            missing = set(required_params) - set(input_data)
+        if not compiled.required_params.issubset(input_data):
+            missing = compiled.required_params - set(input_data)
             raise ValueError(f"Missing required input parameters: {', '.join(missing)}")
 
         # Check input types
-        for param_name, expected_type in type_hints.items():
+        for param_name, check in compiled.param_checkers.items():
             if param_name in input_data:
                 actual_value = input_data[param_name]
-                if not check_type(actual_value, expected_type) and expected_type != Any:
+                if not check(actual_value):
+                    expected_type = compiled.param_types[param_name]
                     raise TypeError(
                         f"Input data type mismatch for parameter '{param_name}'. Expected {expected_type}, got {type(actual_value)}"
                     )
 
         # Call the function with the input data
-        result = func(**input_data)
+        result = compiled.func(**input_data)
 
         # Check output type
-        if expected_return_type != Any and not check_type(result, expected_return_type):
+        expected_return_type = compiled.return_type
+        if not compiled.return_checker(result):
             raise TypeError(
                 f"Output data type mismatch. Expected {expected_return_type}, got {type(result)}"
             )
 
-        # Disable the alarm
-        signal.alarm(0)
         return result
 
-    finally:
-        # Ensure the alarm is disabled even if an error occurs
-        signal.alarm(0)
-
 
 def call_func_code(
     input_data: Dict[str, Any],
     code: str,
     func_name: str,
     file_path: str = None,
-    timeout: bool = True,
-) -> Any:
+    timeout: Union[bool, float] = True,
+    profile: Optional[str] = None,
+) -> CallResult:
     """
     With Error Message Output
     """
+    return call_with_timeout(
+        _call_func_code,
+        input_data,
+        code,
+        func_name,
+        file_path,
+        False,
+        timeout=timeout,
+        profile=profile,
+    )
+
+
+def check_column(values: List[Any], expected_type) -> List[bool]:
+    """
+    check_type over a column of values
+    - Plain classes are checked once per distinct value type instead of once per value
+    """
+    if expected_type is Any:
+        return [True] * len(values)
+    if _is_plain_class(expected_type):
+        verdicts = {}
+        for value_type in set(map(type, values)):
+            verdicts[value_type] = issubclass(value_type, expected_type)
+        return [verdicts[type(value)] for value in values]
+    return list(map(compile_type_checker(expected_type), values))
+
+
+@dataclass
+class BatchResult:
+    """
+    Columnar outcome of one function over many inputs
+    - values: outputs, as a NumPy array when every call returned a number
+    - errors: "" where the call succeeded
+    - crashed: rows whose run failed (worker crash, MemoryError), None when there are none
+    """
+
+    values: Any
+    errors: List[str]
+    timed_out: List[bool]
+    elapsed: float = field(default=0.0, compare=False)
+    cpu_time: float = field(default=0.0, compare=False)
+    peak_rss: int = field(default=0, compare=False)
+    crashed: Optional[List[bool]] = None
+
+    def __len__(self):
+        return len(self.errors)
+
+    @property
+    def ok(self) -> List[bool]:
+        return [not error for error in self.errors]
+
+    @classmethod
+    def concat(cls, results: List["BatchResult"]) -> "BatchResult":
+        values, errors, timed_out, crashed = [], [], [], []
+        for result in results:
+            values.extend(
+                result.values.tolist()
+                if hasattr(result.values, "tolist")
+                else result.values
+            )
+            errors.extend(result.errors)
+            timed_out.extend(result.timed_out)
+            crashed.extend(result.crashed or [False] * len(result))
+        return cls(
+            _as_column(values, errors),
+            errors,
+            timed_out,
+            sum(result.elapsed for result in results),
+            sum(result.cpu_time for result in results),
+            max((result.peak_rss for result in results), default=0),
+            crashed if any(crashed) else None,
+        )
+
+    def rows(self) -> List[CallResult]:
+        """
+        Per-row CallResults, with the batch's wall / CPU time spread evenly over its rows
+        """
+        values = self.values.tolist() if hasattr(self.values, "tolist") else self.values
+        n = max(1, len(self))
+        elapsed, cpu_time = self.elapsed / n, self.cpu_time / n
+        crashed = self.crashed or [False] * len(self)
+        return [
+            CallResult(
+                value,
+                error,
+                timed_out,
+                elapsed,
+                cpu_time,
+                self.peak_rss,
+                crashed=row_crashed,
+            )
+            for value, error, timed_out, row_crashed in zip(
+                values, self.errors, self.timed_out, crashed
+            )
+        ]
+
+
+def _as_column(values: List[Any], errors: List[str]):
+    if values and not any(errors):
+        if set(map(type, values)) <= {int, float, bool}:
+            import numpy as np
+
+            return np.asarray(values)
+    return values
+
+
+def _call_fresh(code: str, func_name: str, /, **input_data) -> Any:
+    compiled = compile_function(code, func_name)
+    result = compiled.func(**input_data)
+    if not compiled.return_checker(result):
+        raise TypeError(
+            f"Output data type mismatch. Expected {compiled.return_type}, got {type(result)}"
+        )
+    return result
+
+
+def call_func_code_batch(
+    input_datas: List[Dict[str, Any]],
+    code: str,
+    func_name: str,
+    timeout: Union[bool, float] = True,
+) -> BatchResult:
+    """
+    Call 'func_name' from 'code' on every input in one go
+    - Compiled once, required parameters and input / output types checked per column
+    - The timeout applies to each call: one watchdog timer is reset per row
+    """
+    start_time, start_cpu = time.perf_counter(), time.thread_time()
+    track_rss = reset_peak_rss()
+    n = len(input_datas)
+    values, errors, timed_out = [None] * n, [""] * n, [False] * n
+    crashed = [False] * n
+    seconds = resolve_timeout(timeout)
+
     try:
-        return _call_func_code(input_data, code, func_name, file_path, timeout), ""
+        with Timeout_(seconds):
+            compiled = compile_function(code, func_name)
     except Exception as e:
-        return None, str(e)
+        return BatchResult(
+            values,
+            [str(e)] * n,
+            [isinstance(e, TimeoutError)] * n,
+            time.perf_counter() - start_time,
+            time.thread_time() - start_cpu,
+            peak_rss() if track_rss else 0,
+        )
+
+    # Required parameters and input types, column by column
+    required_params = compiled.required_params
+    for i, input_data in enumerate(input_datas):
+        if not input_data.keys() >= required_params:
+            missing = required_params - set(input_data)
+            errors[i] = f"Missing required input parameters: {', '.join(missing)}"
+    for param_name, expected_type in compiled.param_types.items():
+        rows = [i for i in range(n) if not errors[i] and param_name in input_datas[i]]
+        column = [input_datas[i][param_name] for i in rows]
+        for i, passed in zip(rows, check_column(column, expected_type)):
+            if not passed and expected_type != Any:
+                errors[i] = (
+                    f"Input data type mismatch for parameter '{param_name}'. Expected {expected_type}, got {type(input_datas[i][param_name])}"
+                )
+
+    # Calls, under one timer reset per row
+    func, monotonic = compiled.func, time.monotonic
+    if not compiled.stateless:  # a fresh module per row, its output checked on its own types
+        func = functools.partial(_call_fresh, code, func_name)
+    pending = [i for i in range(n) if not errors[i]]
+    k = 0
+    while k < len(pending):
+        try:
+            with Timeout_(seconds) as timer:
+                while k < len(pending):
+                    i = pending[k]
+                    if seconds:
+                        timer.deadline = monotonic() + seconds  # timer.reset()
+                    try:
+                        values[i] = func(**input_datas[i])
+                    except TimeoutError:
+                        raise
+                    except Exception as e:
+                        errors[i] = str(e) or repr(e)
+                        crashed[i] = isinstance(e, MemoryError)
+                    k += 1
+        except TimeoutError as e:
+            i = pending[k]
+            values[i], errors[i], timed_out[i] = None, str(e), True
+            k += 1
+
+    # Output type, as a column
+    expected_return_type = compiled.return_type
+    if expected_return_type != Any and compiled.stateless:
+        rows = [i for i in range(n) if not errors[i]]
+        column = [values[i] for i in rows]
+        for i, passed in zip(rows, check_column(column, expected_return_type)):
+            if not passed:
+                errors[i] = (
+                    f"Output data type mismatch. Expected {expected_return_type}, got {type(values[i])}"
+                )
+                values[i] = None
+
+    return BatchResult(
+        _as_column(values, errors),
+        errors,
+        timed_out,
+        time.perf_counter() - start_time,
+        time.thread_time() - start_cpu,
+        peak_rss() if track_rss else 0,
+        crashed if any(crashed) else None,
+    )
 
 
 def _call_func_prompts(
@@ -157,14 +978,10 @@ def _call_func_prompts(
     Like _call_func_prompt, but with batch inference (get_response on batch of prompts, repeat multiple times = max_tries)
     """
     prompts = []
-    mod = types.ModuleType("dynamic_module")
 
     try:
-        with Timeout_(3):  # 3-second timeout
-            exec(code, mod.__dict__)
-            func_name = "generate_prompt"
-            assert func_name in mod.__dict__, f"Function {func_name} not found in code"
-            prompt_func = mod.__dict__[func_name]
+        with Timeout_(DEFAULT_TIMEOUT):
+            prompt_func = compile_function(code, "generate_prompt").func
             # Generate the same prompt multiple times for max_tries attempts
             prompts = [prompt_func(**input_data) for _ in range(max_tries)]
     except Exception as e:
@@ -203,41 +1020,20 @@ def _call_func_prompt(input_data: Dict[str, Any], code: str, get_response: calla
     Prompt EvolNode forward propagation
     - Compile prompt with LLM and return the response
     """
-    # Set up the timeout handler
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(3)  # Set timeout to 3 seconds
-
-    try:
-        mod = types.ModuleType("dynamic_module")
-        exec(code, mod.__dict__)
-        func_name = "generate_prompt"
-        prompt_func = mod.__dict__[func_name]
+    # The timeout bounds the node's prompt function, not the LLM call
+    with Timeout_(DEFAULT_TIMEOUT):
+        prompt_func = compile_function(code, "generate_prompt").func
         prompt = prompt_func(**input_data)
-        # print(prompt)
-        response = get_response(prompt)
-        # print(response)
-
-        try:
-            output_dict = extract_json_from_text(response)
-            # Disable the alarm
-            signal.alarm(0)
-            return output_dict
-
-        except Exception as e:
-            raise ValueError(f"Failed to parse LLM response: {e}")
-
-    finally:
-        # Ensure the alarm is disabled even if an error occurs
-        signal.alarm(0)
-
-
-def timeout_handler(signum, frame):
-    raise TimeoutError("Function call timed out")
+    # print(prompt)
+    response = get_response(prompt)
+    # print(response)
 
+    try:
+        output_dict = extract_json_from_text(response)
+        return output_dict
 
-def worker_init():
-    # Initialize signal handler for each worker process
-    signal.signal(signal.SIGALRM, timeout_handler)
+    except Exception as e:
+        raise ValueError(f"Failed to parse LLM response: {e}")
 
 
 def _call_func_prompt_new(
@@ -246,15 +1042,10 @@ def _call_func_prompt_new(
     """
     Original prompt function with error handling wrapper
     """
-    # Set up the timeout handler (now handled per-process)
-    signal.alarm(3)  # Set timeout to 3 seconds
-
     try:
-        mod = types.ModuleType("dynamic_module")
-        exec(code, mod.__dict__)
-        func_name = "generate_prompt"
-        prompt_func = mod.__dict__[func_name]
-        prompt = prompt_func(**input_data)
+        with Timeout_(DEFAULT_TIMEOUT):
+            prompt_func = compile_function(code, "generate_prompt").func
+            prompt = prompt_func(**input_data)
         response = get_response(prompt)
 
         try:
@@ -267,9 +1058,6 @@ def _call_func_prompt_new(
         return {"error": "Processing timed out"}
     except Exception as e:
         return {"error": f"Processing failed: {str(e)}"}
-    finally:
-        # Ensure the alarm is disabled
-        signal.alarm(0)
 
 
 def process_single_prompt(args):
@@ -306,8 +1094,8 @@ def func_prompt_batch_multiproc(
     # Prepare arguments for each worker
     worker_args = [(data, code, get_response) for data in input_datas]
 
-    # Create process pool with initialization
-    with Pool(processes=max_workers, initializer=worker_init) as pool:
+    # Create process pool
+    with Pool(processes=max_workers) as pool:
         results = pool.map(process_single_prompt, worker_args)
 
     # Return single result if input was single dict
@@ -335,23 +1123,18 @@ def _call_func_prompt_batch(
 
     valid_prompt_indices, valid_prompts = [], []
     for idx, input_data in zip(input_indices, input_datas):
-        # Set up the timeout handler
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(3)  # Set timeout to 3 seconds
         try:
-            mod = types.ModuleType("dynamic_module")
-            exec(code, mod.__dict__)
-            func_name = "generate_prompt"
-            prompt_func = mod.__dict__[func_name]
-            prompt = prompt_func(project_description=input_data["project_description"])
+            with Timeout_(DEFAULT_TIMEOUT):
+                prompt_func = compile_function(code, "generate_prompt").func
+                prompt = prompt_func(
+                    project_description=input_data["project_description"]
+                )
             if prompt and isinstance(prompt, str):
                 valid_prompt_indices.append(idx)
                 valid_prompts.append(prompt)
         except Exception as e:
             error_messages[idx] += str(e)
             continue
-        finally:
-            signal.alarm(0)
 
     print("Valid Prompts: ", len(valid_prompts))
     # print(valid_prompts[1])
@@ -389,30 +1172,14 @@ def call_func_prompt(input_data: Dict[str, Any], code: str, get_response: callab
         return None, str(e)
 
 
-class Timeout_:
-    def __init__(self, seconds):
-        self.seconds = seconds
-
-    def __enter__(self):
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(self.seconds)
-
-    def __exit__(self, *args):
-        signal.alarm(0)
-
-
 def process_single_input(code, input_tuple, max_tries):
     input_index, input_dict = input_tuple
     prompts = []
     errors = []
 
-    mod = types.ModuleType("dynamic_module")
     try:
         # Remove the Timeout_ wrapper
-        exec(code, mod.__dict__)
-        func_name = "generate_prompt"
-        assert func_name in mod.__dict__, f"Function {func_name} not found in code"
-        prompt_func = mod.__dict__[func_name]
+        prompt_func = compile_function(code, "generate_prompt").func
 
         prompt = prompt_func(**input_dict)
         for _ in range(max_tries):
@@ -425,18 +1192,16 @@ def process_single_input(code, input_tuple, max_tries):
     return input_index, prompts, errors
 
 
-def process_single_input_with_timeout(code, input_tuple, max_tries, timeout: int = 3):
+def process_single_input_with_timeout(
+    code, input_tuple, max_tries, timeout: float = DEFAULT_TIMEOUT
+):
     input_index, input_dict = input_tuple
     prompts = []
     errors = []
 
-    mod = types.ModuleType("dynamic_module")
     try:
         # Remove the Timeout_ wrapper
-        exec(code, mod.__dict__)
-        func_name = "generate_prompt"
-        assert func_name in mod.__dict__, f"Function {func_name} not found in code"
-        prompt_func = mod.__dict__[func_name]
+        prompt_func = compile_function(code, "generate_prompt").func
 
         with Timeout_(seconds=timeout):
             prompt = prompt_func(**input_dict)
@@ -451,7 +1216,7 @@ def process_single_input_with_timeout(code, input_tuple, max_tries, timeout: int
     return input_index, prompts, errors
 
 
-def process_all_inputs(codes, input_dicts, max_tries, timeout: int = 3):
+def process_all_inputs(codes, input_dicts, max_tries, timeout: float = DEFAULT_TIMEOUT):
     input_indices = []
     full_prompts = []
     errors_per_code_per_test = defaultdict(lambda: defaultdict(list))
@@ -466,7 +1231,11 @@ def process_all_inputs(codes, input_dicts, max_tries, timeout: int = 3):
     with ThreadPoolExecutor(max_workers=min(32, total_iterations)) as executor:
         futures = {
             executor.submit(
-                process_single_input, code, (input_index, input_dict), max_tries
+                process_single_input_with_timeout,
+                code,
+                (input_index, input_dict),
+                max_tries,
+                timeout,
             ): (code_index, input_index)
             for code_index, code, input_index, input_dict in tasks
         }
@@ -478,15 +1247,11 @@ def process_all_inputs(codes, input_dicts, max_tries, timeout: int = 3):
             for future in as_completed(futures):
                 code_index, input_index = futures[future]
                 try:
-                    # Add timeout here
-                    input_index, prompts, errors = future.result(timeout=timeout)
+                    # prompt functions time out inside their worker thread
+                    input_index, prompts, errors = future.result()
                     input_indices.extend([(input_index, code_index)] * len(prompts))
                     full_prompts.extend(prompts)
                     errors_per_code_per_test[code_index][input_index].extend(errors)
-                except concurrent.futures.TimeoutError:
-                    errors_per_code_per_test[code_index][input_index].append(
-                        f"Execution timed out after {timeout} seconds"
-                    )
                 except Exception as e:
                     errors_per_code_per_test[code_index][input_index].append(str(e))
                 pbar.update(1)
@@ -518,9 +1283,9 @@ def call_func_prompt_parallel(
     desc_str = (
         f"Executing prompt node with LLM in parallel with batch size {len(prompts)}"
     )
-    responses = get_response(full_prompts, desc=desc_str)
-
-    for response, (input_index, code_index) in zip(responses, input_indices):
+    # Parse each response as soon as it lands
+    for prompt_index, response in iter_responses(get_response, full_prompts, desc_str):
+        input_index, code_index = input_indices[prompt_index]
         try:
             output_dict = extract_json_from_text(response)
             outputs_per_code_per_test[code_index][input_index].append(output_dict)
@@ -561,20 +1326,27 @@ def _clean_up_duplicate_functions_in_ast_tree(tree):
     return new_tree
 
 
+def _import_key(node) -> tuple:
+    """
+    Structural identity of an import statement, equal iff both render to the same source
+    """
+    names = tuple((alias.name, alias.asname) for alias in node.names)
+    if isinstance(node, ast.Import):
+        return ("import", names)
+    return ("from", node.module, node.level, names)
+
+
 def clean_up_ast_tree(new_tree):
-    # Sort imports and remove duplicates
-    import_nodes = []
+    # Sort imports and remove duplicates (one pass, keyed on the import's structure)
+    import_nodes = {}
     other_nodes = []
 
     for node in new_tree.body:
         if isinstance(node, (ast.Import, ast.ImportFrom)):
-            if not any(
-                astor.to_source(node) == astor.to_source(existing)
-                for existing in import_nodes
-            ):
-                import_nodes.append(node)
+            import_nodes.setdefault(_import_key(node), node)
         else:
             other_nodes.append(node)
+    import_nodes = list(import_nodes.values())
 
     # Sort import nodes
     import_nodes.sort(
@@ -589,83 +1361,33 @@ def clean_up_ast_tree(new_tree):
     return new_tree
 
 
-def include_func_check(original_code, referrable_function_dict):
-    """
-    The AST parsing somehow misses out function call, this is to patch that issue with regex
-    """
-    need_include_func = []
-    for func_name, func_code in referrable_function_dict.items():
-        func_call_pattern = rf"(?<!def\s){re.escape(func_name)}\s*\("
-        if re.search(func_call_pattern, original_code):
-            # Function is called in the code, so we need to include its definition
-            need_include_func.append(func_name)
-    return need_include_func
-
-
-def _compile_code_with_references(node_code, referrable_function_dict):
-    """
-    Compile code with references to other functions
-    """
-    tree = ast.parse(node_code)
-
-    added_functions = set()
-
-    class ReferenceReplacer(ast.NodeTransformer):
-        def visit_Import(self, node):
-            return (
-                None
-                if any(alias.name in referrable_function_dict for alias in node.names)
-                else node
-            )
-
-        def visit_ImportFrom(self, node):
-            return None if node.module in referrable_function_dict else node
-
-        def visit_FunctionDef(self, node):
-            if (
-                node.name in referrable_function_dict
-                and node.name not in added_functions
-            ):
-                new_func = ast.parse(referrable_function_dict[node.name]).body[0]
-                added_functions.add(node.name)
-                return new_func
-            return node
-
-        def visit_Call(self, node):
-            if isinstance(node.func, ast.Name):
-                func_name = node.func.id
-                if (
-                    func_name in referrable_function_dict
-                    and func_name not in added_functions
-                ):
-                    added_functions.add(func_name)
-            return node
-
-    new_tree = ReferenceReplacer().visit(tree)
-
-    # Add all referenced functions to the beginning of the tree
-    for func_name in added_functions:
-        new_func_tree = ast.parse(referrable_function_dict[func_name])
-        new_tree.body = new_func_tree.body + new_tree.body
-
-    # Patch
-    patch_functions = include_func_check(node_code, referrable_function_dict)
-    for func_name in patch_functions:
-        if func_name not in added_functions:
-            added_functions.add(func_name)
-            new_func_tree = ast.parse(referrable_function_dict[func_name])
-            new_tree.body = new_func_tree.body + new_tree.body
+# Reference compilation cache
+# - Each referrable function's source is parsed once into AST fragments, shared (never mutated) across outputs
+# - Referenced functions are bundled with their transitive callees (ReferenceIndex call graph)
+# - Compiled output is keyed on (node code, sources of the functions it names and their callees):
+#   no other library function can change the output
+REFERENCE_CACHE_SIZE = 1024
 
-    new_tree = clean_up_ast_tree(new_tree)
 
-    new_code = astor.to_source(new_tree)
-    return new_code
+@functools.lru_cache(maxsize=REFERENCE_CACHE_SIZE)
+def parse_reference(source: str) -> Tuple[ast.stmt, ...]:
+    return tuple(ast.parse(source).body)
 
 
 def compile_code_with_references(node_code, referrable_function_dict):
     """
     Compile code with references to other functions
+    - Library functions called by referenced ones are inlined too, transitively
     """
+    index = get_reference_index(referrable_function_dict)
+    names = index.closure(index.matcher.occurrences(node_code))
+    return _compile_code_with_references_cached(node_code, index.subset(names))
+
+
+@functools.lru_cache(maxsize=REFERENCE_CACHE_SIZE)
+def _compile_code_with_references_cached(node_code, references):
+    referrable_function_dict = dict(references)
+    index = reference_index(references)
     tree = ast.parse(node_code)
 
     added_functions = set()
@@ -695,7 +1417,7 @@ def compile_code_with_references(node_code, referrable_function_dict):
             if node.name in added_functions:
                 return None
             elif node.name in referrable_function_dict:
-                new_func = ast.parse(referrable_function_dict[node.name]).body[0]
+                new_func = parse_reference(referrable_function_dict[node.name])[0]
                 added_functions.add(node.name)
                 return new_func
             else:
@@ -716,20 +1438,13 @@ def compile_code_with_references(node_code, referrable_function_dict):
 
     new_tree = ReferenceReplacer().visit(tree)
 
-    # Add all referenced functions to the beginning of the tree
+    # Patch calls the AST pass missed, then bundle every function they need (one closure lookup)
+    added_functions |= index.matcher.calls(node_code)
     new_functions = []
-    for func_name in added_functions:
-        new_func_tree = ast.parse(referrable_function_dict[func_name])
-        new_functions.extend(new_func_tree.body)
-
-    # Patch
-    patch_functions = include_func_check(node_code, referrable_function_dict)
-    for func_name in patch_functions:
-        if func_name not in added_functions:
-            added_functions.add(func_name)
-            new_func_tree = ast.parse(referrable_function_dict[func_name])
-            new_functions.extend(new_func_tree.body)
+    for func_name in sorted(index.closure(added_functions)):
+        new_functions.extend(parse_reference(referrable_function_dict[func_name]))
 
+    # Add all referenced functions to the beginning of the tree
     new_tree.body = new_functions + new_tree.body
     new_tree = clean_up_ast_tree(new_tree)
 
@@ -9,8 +9,6 @@ from typing import Any, Callable, Dict, Optional
 import httpx
 import requests
 from bs4 import BeautifulSoup
-from langchain_community.document_transformers import Html2TextTransformer
-from langchain_core.documents import Document
 from tiny_dag import add_nodes, get_graph_state
 
 from .evolnode import QueryEngine
@@ -198,6 +196,9 @@ def nodes_from_library(
             break
         except Exception:
             continue
+    from langchain_community.document_transformers import Html2TextTransformer
+    from langchain_core.documents import Document
+
     docs = [Document(page_content=html) for html in htmls]
     html2text = Html2TextTransformer()
     docs_transformed = html2text.transform_documents(docs)
@@ -7,6 +7,8 @@ from typing import Callable, Optional, Union
 
 import networkx as nx
 
+from .usage import tagged
+
 
 class PromptMode(StrEnum):
     CODE = "code"
@@ -644,6 +646,7 @@ def combine_test_cases_list(t1, t2, unique=True):
     return combined_t
 
 
+@tagged("test-case")
 def _spawn_test_cases(
     plan_dict: dict, main_test_cases: list, get_response: Callable
 ) -> tuple[list, str]:
@@ -676,6 +679,7 @@ def _build_test_cases_dict(spawned_test_cases: list):
     return output_dict
 
 
+@tagged("test-case")
 def spawn_test_cases_sequential(
     plan_dict: dict, main_test_cases: list, get_response: Callable, max_tries: int = 6
 ) -> tuple[dict, str]:  # Deprecated
@@ -706,6 +710,7 @@ def spawn_test_cases_sequential(
         return {}, "\n".join(err_msg) if err_msg else ""
 
 
+@tagged("test-case")
 def spawn_test_cases(
     plan_dict: dict,
     main_test_cases: list,
@@ -6,8 +6,12 @@ from typing import Callable, Dict, List, Optional, Union
 
 import numpy as np
 
+from .checkpoint import Checkpoint
 from .evolnode import EvolNode, PlanNode
 from .meta_prompt import MetaPlan, MetaPrompt, PromptMode
+from .population_store import PopulationStore
+from .sandbox import SandboxPool
+from .selection import Selector
 
 # Managing population of evolving nodes
 # - Natural selection
@@ -17,35 +21,34 @@ from .meta_prompt import MetaPlan, MetaPrompt, PromptMode
 
 
 def parent_selection(
-    pop: List[EvolNode], m: int, proportion: float = 0.8
+    pop: List[EvolNode],
+    m: int,
+    proportion: float = 0.8,
+    rng: Optional[np.random.Generator] = None,
+    mode: str = "tournament",
 ) -> List[dict]:
     """
-    Select m parents from the population using tournament selection.
+    Select m distinct parents from the population (tournament selection by default).
 
     Args:
         pop: List of dictionaries containing individuals with their properties
         m: Number of parents to select
-        tournament_size: Number of individuals to compete in each tournament
+        proportion: Cap on the tournament size, as a fraction of the population
+        rng: Random generator to draw from (seeded from numpy's global state by default)
+        mode: "tournament", "rank", "proportional" or "novelty" (see selection.py)
 
     Returns:
         List of selected parent dictionaries
     """
-    selected_parents = []
+    pop = list(pop)  # snapshot: offspring may be inserted concurrently
+    if len(pop) <= m:  # every tournament would crown the same winner
+        return pop
+    if rng is None:  # np.random.seed still makes runs reproducible
+        rng = np.random.default_rng(np.random.randint(0, 2**31))
     tournament_size = min(
         len(pop) // m, int(len(pop) * proportion)
     )  # Dynamic tournament size
-
-    while len(selected_parents) != m:
-        # Each tournament now looks at population_size/m individuals
-        tournament = np.random.choice(pop, size=max(2, tournament_size), replace=False)
-        winner = max(
-            tournament,
-            key=lambda x: x["fitness"] if x["fitness"] is not None else float("-inf"),
-        )
-        if winner not in selected_parents:
-            selected_parents.append(winner)
-
-    return selected_parents
+    return Selector(pop).select(m, mode, rng, tournament_size)
 
 
 # Evolution process will keep populations of EvolNodes
@@ -76,8 +79,15 @@ class Evolution:
         mutation_rate: float = 0.1,
         plan: bool = False,
         plan_threshold: float = 0.7,
+        query_node: bool = True,
+        seed: Optional[int] = None,
+        capacity: Optional[int] = None,
+        replacement: str = "worst",
+        selection: str = "tournament",
+        sandbox: Union[SandboxPool, bool] = False,
     ):
-        self.pop_size = pop_size  # not used (for capping population size I suppose?)
+        # offspring batch size; the population is unbounded unless `capacity` is given
+        self.pop_size = pop_size
         self.get_response = get_response
         self.meta_prompt = meta_prompt
         self.max_attempts = max_attempts
@@ -85,6 +95,11 @@ class Evolution:
         self.plan_threshold = plan_threshold
         self.load = load
         self.test_cases = test_cases
+        self.query_node = query_node  # query the node library for referrable functions
+        self.rng = None if seed is None else np.random.default_rng(seed)
+        self.selection = selection  # parent selection scheme
+        self.usage_history = []  # (operator, LLM usage per caller tag) per generation
+        self.step = 0  # operators applied so far, where a resumed run picks up
         if not plan:
             self.evol = EvolNode(
                 meta_prompt,
@@ -93,11 +108,15 @@ class Evolution:
                 get_response=get_response,
                 test_cases=test_cases,
                 custom_metric_map=custom_metric_map,
+                sandbox=sandbox,
             )
             self.num_parents = num_parents
-            self.population = []
-            if load:
-                self.population = self.load_population(filename)
+            # steady state: at capacity, offspring replace the worst / most similar individual
+            self.population = PopulationStore(
+                None if capacity is None else max(capacity, num_parents),
+                replacement,
+                self.load_population(filename) if load else (),
+            )
             self.mutation_rate = mutation_rate
             self.strategy_trace = (
                 "Initial Population information: " + self.population_info
@@ -106,8 +125,17 @@ class Evolution:
             pass
 
     def check_duplicate(self, population, code):
+        if isinstance(population, PopulationStore):
+            return population.has_code(code)  # O(1), formatting-insensitive
         return any(code == ind["code"] for ind in population)
 
+    @staticmethod
+    def population_codes(population) -> set:
+        """
+        Codes already in the population: offspring duplicating them are skipped before evaluation
+        """
+        return {ind["code"] for ind in population if ind["code"] is not None}
+
     def _get_offspring(
         self, operator, pop: list = [], max_attempts: int = -1, feedback: str = ""
     ):
@@ -129,6 +157,8 @@ class Evolution:
                 num_runs=self.num_eval_runs,
                 batch_size=self.pop_size,
                 feedback=feedback,
+                skip_codes=self.population_codes(pop),
+                query_node=self.query_node,
             )
             offspring["reasoning"], offspring["code"], offspring["fitness"] = (
                 self.evol.reasoning,
@@ -139,19 +169,23 @@ class Evolution:
         elif operator.startswith("e"):  # cross-over operator
             if not self.load and len(pop) < self.num_parents:
                 while len(pop) < self.num_parents:
-                    pop.extend(
-                        self.evol.evolve(
-                            "i1",
-                            max_tries=1,
-                            num_runs=self.num_eval_runs,
-                            batch_size=self.pop_size,
-                        )
+                    offsprings = self.evol.evolve(
+                        "i1",
+                        replace=False,  # replace=True returns no offspring
+                        max_tries=1,
+                        num_runs=self.num_eval_runs,
+                        batch_size=self.pop_size,
+                        skip_codes=self.population_codes(pop),
+                        query_node=self.query_node,
                     )
+                    if not offsprings:  # nothing new, reported by the assert below
+                        break
+                    pop.extend(offsprings)
             assert (
                 len(pop) >= self.num_parents
             ), "Population size is less than the number of parents required for Crossover operator"
             parents = parent_selection(
-                pop, self.num_parents
+                pop, self.num_parents, rng=self.rng, mode=self.selection
             )  # in fact we don't mind 3P
             self.evol.evolve(
                 operator,
@@ -161,6 +195,8 @@ class Evolution:
                 num_runs=self.num_eval_runs,
                 batch_size=self.pop_size,
                 feedback=feedback,
+                skip_codes=self.population_codes(pop),
+                query_node=self.query_node,
             )
             offspring["reasoning"], offspring["code"], offspring["fitness"] = (
                 self.evol.reasoning,
@@ -175,7 +211,9 @@ class Evolution:
             assert (
                 len(pop) >= 1
             ), "Population size is less than the number of parents required for Mutation operator"
-            parents = parent_selection(pop, 1)  # one parent used for mutation
+            parents = parent_selection(
+                pop, 1, rng=self.rng, mode=self.selection
+            )  # one parent used for mutation
             self.evol.evolve(
                 operator,
                 parents[0],
@@ -184,6 +222,8 @@ class Evolution:
                 num_runs=self.num_eval_runs,
                 batch_size=self.pop_size,
                 feedback=feedback,
+                skip_codes=self.population_codes(pop),
+                query_node=self.query_node,
             )
             offspring["reasoning"], offspring["code"], offspring["fitness"] = (
                 self.evol.reasoning,
@@ -216,6 +256,8 @@ class Evolution:
         #             break
         #     return pop
 
+        self.usage_history.append((operator, self.evol.usage))
+
         # Evolution Info Tracing
         offspring_info = f"Going through {max_attempts} of {operator} evolution steps, obtaining offspring:\n {indiv_to_prompt(offspring, self.meta_prompt.mode)}"
         self.strategy_trace += offspring_info
@@ -236,11 +278,13 @@ class Evolution:
             self.population = self._get_offspring(
                 method, self.population, feedback=feedback
             )
+            self.step += 1
         elif isinstance(method, list):
             for m in method:
                 self.population = self._get_offspring(
                     m, self.population, feedback=feedback
                 )
+                self.step += 1
         if convert_to_plan and (
             (len(self.population) == 0)
             or (
@@ -262,6 +306,28 @@ class Evolution:
             self.plan_node.spawn_test_cases_majority(self.test_cases)
             self.plan_node.evolve_sub_nodes()
 
+    def run(
+        self,
+        methods: List[str],
+        checkpoint: Optional[Checkpoint] = None,
+        checkpoint_every: int = 1,
+        feedback: str = "",
+    ):
+        """
+        Apply the operators in `methods` in turn, saving `checkpoint` every `checkpoint_every` steps
+        - An existing checkpoint is restored first: the run resumes after its last saved step
+        """
+        if checkpoint is not None and checkpoint.exists():
+            checkpoint.restore(self)
+            print(f" :: Resuming from step {self.step} of {len(methods)}")
+        while self.step < len(methods):
+            self.get_offspring(methods[self.step], feedback=feedback)
+            if checkpoint is not None and (
+                self.step % checkpoint_every == 0 or self.step == len(methods)
+            ):
+                checkpoint.save(self)
+        return self.population
+
     def save_population(
         self,
         pop: list,
@@ -272,7 +338,7 @@ class Evolution:
         os.makedirs(population_folder, exist_ok=True)
         filepath = os.path.join(population_folder, filename + ".json")
         with open(filepath, "w") as f:
-            json.dump(pop, f, indent=2)
+            json.dump(list(pop), f, indent=2)
 
     @property
     def population_info(self):
@@ -284,7 +350,7 @@ class Evolution:
             return f"Population size is 1, information on the best individual:\n {indiv_to_prompt(indiv, self.meta_prompt.mode)}"
         else:
             # get the best 2 individuals from the population (if don't have 2, use 1)
-            best_2 = sorted(pop, key=lambda x: x["fitness"], reverse=True)[:2]
+            best_2 = pop.top_k(2)
             pop_size = len(pop)
             best_indiv_info = ""
             for i, indiv in enumerate(best_2, 1):
@@ -0,0 +1,224 @@
+import ast
+import hashlib
+import heapq
+import itertools
+import threading
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+# Steady-state population store
+# - Bounded: once at capacity, an offspring replaces the worst individual ("worst") or its most
+#   similar individual ("crowding"), and only if it is not worse; otherwise it is rejected
+# - Duplicates: O(1) lookup on a hash of the normalised AST (formatting, comments and docstrings ignored)
+# - Ranking: lazy min-heap for the worst individual, heapq.nlargest for the top-k
+# - Concurrency: writers serialise on a lock and only invalidate the immutable snapshot; readers
+#   (iteration, parent selection, top-k) rebuild it once on the first read after a batch of inserts,
+#   and otherwise only touch the current snapshot, so inserts stay O(1) in the population size
+
+REPLACEMENT_MODES = ("worst", "crowding")
+
+
+def fitness_rank(indiv: dict) -> Tuple[float, float]:
+    """
+    Sort key: fitness first (unevaluated last), cheaper code wins ties
+    """
+    fitness = indiv.get("fitness")
+    return (
+        fitness if fitness is not None else float("-inf"),
+        indiv.get("efficiency") or 0.0,
+    )
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        if isinstance(
+            node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        ):
+            body = node.body
+            if (
+                body
+                and isinstance(body[0], ast.Expr)
+                and isinstance(body[0].value, ast.Constant)
+                and isinstance(body[0].value.value, str)
+            ):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def code_key(code: Optional[str]) -> str:
+    """
+    Hash of the normalised AST of `code`; whitespace-normalised text if it does not parse
+    """
+    if code is None:
+        return ""
+    try:
+        normalised = ast.dump(_strip_docstrings(ast.parse(code)))
+    except (SyntaxError, ValueError):
+        normalised = " ".join(code.split())
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+
+def code_features(code: Optional[str]) -> FrozenSet[str]:
+    """
+    Set of normalised statements, for crowding distance between candidates
+    """
+    if code is None:
+        return frozenset()
+    try:
+        tree = _strip_docstrings(ast.parse(code))
+    except (SyntaxError, ValueError):
+        return frozenset(line.strip() for line in code.splitlines() if line.strip())
+    return frozenset(
+        ast.dump(node)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.stmt)
+        and not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    )
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class PopulationStore:
+    """
+    Bounded, duplicate-free population of individual dicts ({"reasoning", "code", "fitness", ...})
+    - add / append / extend: insert offspring (thread-safe), False when duplicate or rejected
+    - Partial individuals (raced out, fitness only a lower bound) are always rejected
+    - Iteration, len, indexing, top_k and best read the current snapshot, in insertion order
+    - capacity=None: unbounded
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        replacement: str = "worst",
+        individuals: Iterable[dict] = (),
+    ):
+        if replacement not in REPLACEMENT_MODES:
+            raise ValueError(
+                f"Unknown replacement {replacement!r}, expected one of {REPLACEMENT_MODES}"
+            )
+        self.capacity = capacity
+        self.replacement = replacement
+        self.evicted = 0
+        self.rejected = 0
+        self._members: Dict[str, dict] = {}  # code key -> individual
+        self._features: Dict[str, FrozenSet[str]] = {}
+        self._heap: List[Tuple[Tuple[float, float], int, str]] = []  # worst on top
+        self._order: Dict[str, int] = {}  # code key -> insertion counter
+        self._counter = itertools.count()
+        self._snapshot: Optional[Tuple[dict, ...]] = ()  # None: stale, rebuilt on read
+        self._lock = threading.Lock()
+        self.extend(individuals)
+
+    def _worst(self) -> str:
+        while True:  # entries of removed individuals are dropped lazily
+            _, order, key = self._heap[0]
+            if self._order.get(key) == order:
+                return key
+            heapq.heappop(self._heap)
+
+    def _nearest(self, features: FrozenSet[str]) -> str:
+        return max(
+            self._members,
+            key=lambda key: (
+                similarity(features, self._features[key]),
+                [-x for x in fitness_rank(self._members[key])],  # the weaker on ties
+            ),
+        )
+
+    def _remove(self, key: str) -> None:
+        del self._members[key]
+        del self._order[key]
+        self._features.pop(key, None)
+
+    def add(self, indiv: dict) -> bool:
+        key = code_key(indiv.get("code"))
+        features = (
+            code_features(indiv.get("code")) if self.replacement == "crowding" else None
+        )
+        with self._lock:
+            if key in self._members:
+                return False
+            if indiv.get("partial"):
+                self.rejected += 1
+                return False
+            if self.capacity is not None and len(self._members) >= self.capacity:
+                if self.replacement == "crowding":
+                    victim = self._nearest(features)
+                else:
+                    victim = self._worst()
+                if fitness_rank(indiv) < fitness_rank(self._members[victim]):
+                    self.rejected += 1
+                    return False
+                self._remove(victim)
+                self.evicted += 1
+            order = next(self._counter)
+            self._members[key] = indiv
+            self._order[key] = order
+            if features is not None:
+                self._features[key] = features
+            heapq.heappush(self._heap, (fitness_rank(indiv), order, key))
+            if len(self._heap) > 2 * len(self._members) + 16:  # compact stale entries
+                self._heap = [
+                    entry
+                    for entry in self._heap
+                    if self._order.get(entry[2]) == entry[1]
+                ]
+                heapq.heapify(self._heap)
+            self._snapshot = None
+            return True
+
+    def append(self, indiv: dict) -> bool:
+        return self.add(indiv)
+
+    def extend(self, individuals: Iterable[dict]) -> int:
+        return sum(self.add(indiv) for indiv in individuals)
+
+    def has_code(self, code: Optional[str]) -> bool:
+        return code_key(code) in self._members
+
+    def snapshot(self) -> Tuple[dict, ...]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = tuple(self._members.values())
+                snapshot = self._snapshot
+        return snapshot
+
+    def top_k(self, k: int) -> List[dict]:
+        return heapq.nlargest(k, self.snapshot(), key=fitness_rank)
+
+    @property
+    def best(self) -> Optional[dict]:
+        top = self.top_k(1)
+        return top[0] if top else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._members.clear()
+            self._features.clear()
+            self._order.clear()
+            self._heap = []
+            self._snapshot = ()
+
+    def __len__(self) -> int:
+        return len(self.snapshot())
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.snapshot())
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+    def __bool__(self) -> bool:
+        return bool(self.snapshot())
+
+    def __repr__(self):
+        return (
+            f"PopulationStore(size={len(self)}, capacity={self.capacity}, "
+            f"replacement={self.replacement!r}, evicted={self.evicted}, rejected={self.rejected})"
+        )
@@ -0,0 +1,124 @@
+import functools
+import re
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Set, Tuple
+
+# Resolution of referenced node functions
+# - NameMatcher: Aho-Corasick automaton over all referrable names, one pass per source
+# - ReferenceIndex: call graph over the node library with a memoised transitive closure
+# - Both are built once per library (keyed on its (name, source) pairs) and shared by every candidate
+
+REFERENCE_INDEX_CACHE_SIZE = 64
+_CALL_SUFFIX = re.compile(r"\s*\(")
+
+
+class NameMatcher:
+    """
+    Aho-Corasick automaton: every occurrence of any name in a single scan of the text
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Tuple[str, ...]] = [()]
+        for name in names:
+            state = 0
+            for char in name:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state] += (name,)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.out[child] += self.out[self.fail[child]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (start index, name) for every occurrence, overlapping ones included
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for name in out[state]:
+                yield end - len(name) + 1, name
+
+    def occurrences(self, text: str) -> Set[str]:
+        return {name for _, name in self.finditer(text)}
+
+    def calls(self, text: str) -> Set[str]:
+        """
+        Names used as `name(` (whitespace allowed before the parenthesis), not in a `def name(`
+        """
+        found = set()
+        for start, name in self.finditer(text):
+            if name in found:
+                continue
+            if (
+                start >= 4
+                and text[start - 4 : start - 1] == "def"
+                and text[start - 1].isspace()
+            ):
+                continue
+            if _CALL_SUFFIX.match(text, start + len(name)):
+                found.add(name)
+        return found
+
+
+class ReferenceIndex:
+    """
+    Call graph over referrable functions: name -> names its source calls
+    - closure(names): the names plus everything they call, transitively (cycles are fine)
+    """
+
+    def __init__(self, references: Tuple[Tuple[str, str], ...]):
+        self.sources = dict(references)
+        self.matcher = NameMatcher(self.sources)
+        self.calls = {
+            name: frozenset(self.matcher.calls(source or "") - {name})
+            for name, source in self.sources.items()
+        }
+        self._closure: Dict[str, FrozenSet[str]] = {}
+
+    def _reachable(self, name: str) -> FrozenSet[str]:
+        if name not in self._closure:
+            seen, stack = {name}, [name]
+            while stack:
+                for callee in self.calls[stack.pop()]:
+                    if callee not in seen:
+                        seen.add(callee)
+                        stack.append(callee)
+            self._closure[name] = frozenset(seen)
+        return self._closure[name]
+
+    def closure(self, names: Iterable[str]) -> FrozenSet[str]:
+        needed = set()
+        for name in names:
+            if name in self.sources:
+                needed |= self._reachable(name)
+        return frozenset(needed)
+
+    def subset(self, names: Iterable[str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, self.sources[name]) for name in sorted(names))
+
+
+@functools.lru_cache(maxsize=REFERENCE_INDEX_CACHE_SIZE)
+def reference_index(references: Tuple[Tuple[str, str], ...]) -> ReferenceIndex:
+    return ReferenceIndex(references)
+
+
+def get_reference_index(referrable_function_dict: Dict[str, str]) -> ReferenceIndex:
+    return reference_index(tuple(sorted(referrable_function_dict.items())))
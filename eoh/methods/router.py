@@ -0,0 +1,442 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from os import getenv
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from tqdm.asyncio import tqdm_asyncio
+
+from .llm import (
+    DEFAULT_SYSTEM_PROMPT,
+    OpenRouterModel,
+    get_async_client,
+    group_samples,
+    mark_samples,
+)
+from .usage import record_call
+
+# Routing batch LLM calls over a pool of backends
+# - Backends: OpenAI-compatible APIs (OpenAI, OpenRouter, vLLM / SGLang), Anthropic, `/generate` servers
+# - Per backend: EWMA latency per prompt, EWMA error rate, shards in flight
+# - Each shard goes to the backend with the lowest expected latency, failed items fail over to the next one
+# - Backends whose error rate crosses `max_error_rate` sit out a cooldown period, then are probed again
+# - Routed API endpoints retry at most ROUTED_MAX_RETRIES times: failing over beats a long backoff
+
+ROUTED_MAX_RETRIES = 1
+
+
+def limit_retries(base_url: Optional[str], max_retries: int):
+    """
+    Cap the scheduler retries of an endpoint, keeping its other limits
+    """
+    client = get_async_client()
+    client.configure_endpoint(
+        base_url, **{**client.endpoint_config(base_url), "max_retries": max_retries}
+    )
+
+
+class Backend(ABC):
+    """
+    One routable LLM backend
+    - `acomplete_batch` returns one response per prompt, None for prompts that failed
+    """
+
+    name: str = "backend"
+
+    @abstractmethod
+    async def acomplete_batch(
+        self, prompts: List[str], system_prompt: str
+    ) -> List[Optional[str]]: ...
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class OpenAIBackend(Backend):
+    """
+    OpenAI-compatible chat completions (OpenAI, OpenRouter, vLLM / SGLang OpenAI servers)
+    - Requests go through the shared AsyncLLMClient, so pooling, rate limits and retries still apply
+    - Sampled duplicates within a shard are sent once with native `n`
+    - max_retries: scheduler retries of the endpoint before the router fails over
+    """
+
+    def __init__(
+        self,
+        model: str,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        name: Optional[str] = None,
+        max_retries: int = ROUTED_MAX_RETRIES,
+        **params,
+    ):
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.name = name or f"{model}@{base_url or 'openai'}"
+        self.params = params
+        limit_retries(base_url, max_retries)
+
+    async def acomplete_batch(
+        self, prompts: List[str], system_prompt: str
+    ) -> List[Optional[str]]:
+        client = get_async_client()
+        groups = group_samples(mark_samples(prompts))
+        completions = await asyncio.gather(
+            *[
+                client.acomplete_n(
+                    prompt,
+                    self.model,
+                    len(indices),
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    system_prompt=system_prompt,
+                    **self.params,
+                )
+                for prompt, indices in groups
+            ],
+            return_exceptions=True,
+        )
+        responses = [None] * len(prompts)
+        for (_, indices), group_responses in zip(groups, completions):
+            if not isinstance(group_responses, BaseException):
+                for i, response in zip(indices, group_responses):
+                    responses[i] = response
+        return responses
+
+
+class AnthropicBackend(Backend):
+    """
+    Anthropic messages API
+    """
+
+    BASEURL = "https://api.anthropic.com"
+
+    def __init__(
+        self,
+        model: str = "claude-3-5-sonnet-20240620",
+        api_key: Optional[str] = None,
+        max_tokens: int = 4000,
+        name: Optional[str] = None,
+        max_retries: int = ROUTED_MAX_RETRIES,
+    ):
+        self.model = model
+        self.api_key = api_key
+        self.max_tokens = max_tokens
+        self.name = name or f"{model}@anthropic"
+        self._client = None
+        limit_retries(self.BASEURL, max_retries)
+
+    @property
+    def client(self):
+        if self._client is None:
+            import anthropic
+
+            self._client = anthropic.AsyncAnthropic(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    async def _complete(self, prompt: str, system_prompt: str) -> str:
+        scheduler = get_async_client().get_scheduler(self.BASEURL)
+        trace = {}
+        start_time = time.monotonic()
+        response = await scheduler.submit(
+            lambda: self.client.messages.create(
+                model=self.model,
+                max_tokens=self.max_tokens,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}],
+            ),
+            trace=trace,
+        )
+        record_call(
+            self.model,
+            system_prompt + prompt,
+            [response.content[0].text],
+            time.monotonic() - start_time,
+            usage=response.usage,
+            trace=trace,
+        )
+        return response.content[0].text
+
+    async def acomplete_batch(
+        self, prompts: List[str], system_prompt: str
+    ) -> List[Optional[str]]:
+        responses = await asyncio.gather(
+            *[self._complete(prompt, system_prompt) for prompt in prompts],
+            return_exceptions=True,
+        )
+        return [None if isinstance(r, BaseException) else r for r in responses]
+
+
+class GenerateServerBackend(Backend):
+    """
+    Batch `/generate` server (tuning/vllm_serve.py, tuning/simple_serve.py, RunPod pods)
+    - POST a list of prompts, receive {"results": [...]}; the server applies its own chat template
+    - The endpoint takes bare prompts, so the system prompt is sent ahead of each prompt
+    - No retries: a failed request fails over at once
+    """
+
+    def __init__(
+        self, base_url: str, name: Optional[str] = None, timeout: float = 600.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.name = name or self.base_url
+        self.timeout = timeout
+
+    async def acomplete_batch(
+        self, prompts: List[str], system_prompt: str
+    ) -> List[Optional[str]]:
+        http_client = get_async_client().get_http_client(self.base_url)
+        payload = [
+            f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+            for prompt in prompts
+        ]
+        start_time = time.monotonic()
+        response = await http_client.post(
+            f"{self.base_url}/generate", json=payload, timeout=self.timeout
+        )
+        response.raise_for_status()
+        results = response.json()["results"]
+        if len(results) != len(prompts):
+            raise ValueError(
+                f"{self.name} returned {len(results)} results for {len(prompts)} prompts"
+            )
+        latency = (time.monotonic() - start_time) / len(prompts)
+        for prompt, result in zip(payload, results):
+            record_call(self.name, prompt, [result], latency)
+        return results
+
+
+def openrouter_backends(
+    models: Optional[List[str]] = None, api_key: Optional[str] = None, **params
+) -> List[OpenAIBackend]:
+    """
+    One backend per OpenRouter model, replacing the random model pick of OpenRouterModel
+    """
+    api_key = api_key or getenv(OpenRouterModel.KEY_ENV_VAR)
+    return [
+        OpenAIBackend(
+            model,
+            base_url=OpenRouterModel.BASEURL,
+            api_key=api_key,
+            name=f"openrouter/{model}",
+            **params,
+        )
+        for model in (models or OpenRouterModel.MODELS)
+    ]
+
+
+class BackendHealth:
+    """
+    Running view of one backend: EWMA latency per prompt, EWMA error rate, shards in flight
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.prompts = 0
+        self.failures = 0
+
+    def record(self, elapsed: float, num_prompts: int, num_failed: int):
+        self.prompts += num_prompts
+        self.failures += num_failed
+        error_rate = num_failed / num_prompts
+        self.error_rate += self.alpha * (error_rate - self.error_rate)
+        if num_failed < num_prompts:  # failed-fast shards say nothing about latency
+            per_prompt = elapsed / num_prompts
+            if self.latency is None:
+                self.latency = per_prompt
+            else:
+                self.latency += self.alpha * (per_prompt - self.latency)
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def readmit(self):
+        """
+        Back from cooldown: forget the error rate, so the backend is probed again
+        """
+        self.cooldown_until = 0.0
+        self.error_rate = 0.0
+
+    def __str__(self):
+        latency = (
+            "n/a" if self.latency is None else f"{self.latency * 1000:.0f}ms/prompt"
+        )
+        return f"latency {latency}, error rate {self.error_rate:.2f}, {self.prompts - self.failures}/{self.prompts} ok"
+
+
+class LLMRouter:
+    """
+    Drop-in `get_response` routing prompts over a pool of backends
+    - Prompts are split into shards of `shard_size`, each shard goes to the backend with the
+      lowest expected latency: EWMA latency x (shards in flight + 1) / (1 - error rate)
+    - Backends without measurements yet are tried first, least loaded first
+    - Failed prompts fail over to the next best backend not yet tried for that shard
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        shard_size: int = 8,
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+    ):
+        assert backends, "LLMRouter needs at least one backend"
+        self.backends = list(backends)
+        self.system_prompt = system_prompt
+        self.shard_size = shard_size
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.health: Dict[str, BackendHealth] = {
+            backend.name: BackendHealth(alpha) for backend in self.backends
+        }
+
+    @property
+    def model(self) -> str:
+        """
+        Identity of the backend pool, for cache / memo keys
+        """
+        return "router:" + ",".join(sorted(backend.name for backend in self.backends))
+
+    def expected_latency(self, backend: Backend) -> float:
+        health = self.health[backend.name]
+        if health.latency is None:  # unexplored / re-admitted first, failing-only last
+            return 0.0 if health.error_rate == 0.0 else float("inf")
+        return (
+            health.latency * (health.in_flight + 1) / max(1e-3, 1.0 - health.error_rate)
+        )
+
+    def pick(self, exclude: Optional[set] = None) -> Optional[Backend]:
+        """
+        Fastest healthy backend outside `exclude`; backends in cooldown only if nothing else is left
+        """
+        candidates = [b for b in self.backends if b.name not in (exclude or set())]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        for b in candidates:
+            health = self.health[b.name]
+            if health.cooldown_until and health.healthy(now):
+                health.readmit()
+        healthy = [b for b in candidates if self.health[b.name].healthy(now)]
+        return min(
+            healthy or candidates,
+            key=lambda b: (self.expected_latency(b), self.health[b.name].in_flight),
+        )
+
+    async def _dispatch(
+        self, backend: Backend, prompts: List[str], system_prompt: str
+    ) -> List[Optional[str]]:
+        health = self.health[backend.name]
+        health.in_flight += 1
+        start_time = time.monotonic()
+        try:
+            responses = await backend.acomplete_batch(prompts, system_prompt)
+        except Exception as e:
+            print(f" :: Backend {backend.name} failed on {len(prompts)} prompts: {e}")
+            responses = [None] * len(prompts)
+        finally:
+            health.in_flight -= 1
+        num_failed = sum(not r for r in responses)
+        health.record(time.monotonic() - start_time, len(prompts), num_failed)
+        if health.error_rate > self.max_error_rate:
+            health.cooldown_until = time.monotonic() + self.cooldown
+        return responses
+
+    async def _run_shard(
+        self, prompts: List[str], indices: List[int], system_prompt: str
+    ) -> List[Tuple[int, str]]:
+        results = {}
+        tried = set()
+        pending = list(indices)
+        while pending and (backend := self.pick(exclude=tried)) is not None:
+            tried.add(backend.name)
+            responses = await self._dispatch(
+                backend, [prompts[i] for i in pending], system_prompt
+            )
+            failed = []
+            for i, response in zip(pending, responses):
+                if response:
+                    results[i] = response
+                else:
+                    failed.append(i)
+            pending = failed
+        if pending:
+            print(f" :: {len(pending)} prompts failed on every backend")
+        return [(i, results.get(i, "")) for i in indices]
+
+    async def astream(
+        self,
+        prompts: List[str],
+        desc: str = "Processing LLM queries",
+        system_prompt: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yield (index, response) shard by shard as they complete
+        """
+        system_prompt = self.system_prompt if system_prompt is None else system_prompt
+        shards = [
+            list(range(start, min(start + self.shard_size, len(prompts))))
+            for start in range(0, len(prompts), self.shard_size)
+        ]
+        tasks = [
+            asyncio.ensure_future(self._run_shard(prompts, shard, system_prompt))
+            for shard in shards
+        ]
+        try:
+            for next_done in tqdm_asyncio.as_completed(tasks, desc=desc):
+                for item in await next_done:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def abatch(
+        self,
+        prompts: List[str],
+        desc: str = "Processing LLM queries",
+        system_prompt: Optional[str] = None,
+    ) -> List[str]:
+        start_time = time.time()
+        responses = [""] * len(prompts)
+        async for i, response in self.astream(prompts, desc, system_prompt):
+            responses[i] = response
+        elapsed_time = time.time() - start_time
+        print(f" :: Total time elapsed: {elapsed_time:.2f}s\n{self.report()}")
+        return responses
+
+    def __call__(
+        self,
+        prompt: Union[str, List[str]],
+        desc: str = "Processing LLM queries",
+        system_prompt: Optional[str] = None,
+    ) -> Union[str, List[str]]:
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        responses = get_async_client().run(self.abatch(prompts, desc, system_prompt))
+        if isinstance(prompt, str):
+            return responses[0]
+        return responses
+
+    def stream(
+        self,
+        prompts: List[str],
+        desc: str = "Processing LLM queries",
+        system_prompt: Optional[str] = None,
+    ) -> Iterator[Tuple[int, str]]:
+        return get_async_client().iterate(
+            self.astream(list(prompts), desc, system_prompt)
+        )
+
+    def report(self) -> str:
+        return "\n".join(
+            f" :: {backend.name}: {self.health[backend.name]}"
+            for backend in self.backends
+        )
+
+    def __repr__(self):
+        return f"LLMRouter({[backend.name for backend in self.backends]})"
@@ -0,0 +1,57 @@
+from collections import Counter
+from typing import List, Tuple
+
+# Sampled prompts: requests asking for independent samples of a prompt
+# - A SampledPrompt is never coalesced with identical in-flight requests
+# - Samples of one prompt are grouped into a single upstream request with native `n`
+
+
+class SampledPrompt(str):
+    """
+    Prompt asking for an independent sample, never coalesced with identical requests
+    """
+
+
+def sample_prompts(prompt: str, n: int) -> List[str]:
+    """
+    `n` independent samples of one prompt, replaces `[prompt] * n`
+    """
+    return [SampledPrompt(prompt)] * n
+
+
+def mark_samples(prompts: List[str]) -> List[str]:
+    """
+    A batch repeating a prompt wants distinct samples, so repeated prompts are marked as sampled
+    """
+    counts = Counter(prompts)
+    return [SampledPrompt(p) if counts[p] > 1 else p for p in prompts]
+
+
+def expand_samples(prompts: list) -> List[str]:
+    """
+    Flatten `(prompt, n)` entries into `n` sampled prompts
+    """
+    expanded = []
+    for prompt in prompts:
+        if isinstance(prompt, tuple):
+            expanded.extend(sample_prompts(*prompt))
+        else:
+            expanded.append(prompt)
+    return expanded
+
+
+def group_samples(prompts: List[str]) -> List[Tuple[str, List[int]]]:
+    """
+    One (prompt, indices) group per upstream request, sampled duplicates share a group
+    - ["a", s("b"), s("b")] -> [("a", [0]), ("b", [1, 2])], requested once with n=2
+    """
+    groups, sampled = [], {}
+    for i, prompt in enumerate(prompts):
+        if not isinstance(prompt, SampledPrompt):
+            groups.append((prompt, [i]))
+        elif prompt in sampled:
+            sampled[prompt][1].append(i)
+        else:
+            sampled[prompt] = (prompt, [i])
+            groups.append(sampled[prompt])
+    return groups
@@ -0,0 +1,476 @@
+import atexit
+import itertools
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional, Union
+
+from .meta_execute import BatchResult, CallResult
+from .meta_execute import TimeoutError as ExecutionTimeout
+from .meta_execute import (
+    Profiler,
+    _call_func_code,
+    call_func_code_batch,
+    timeout_message,
+)
+
+# Process-pool sandbox for generated code
+# - Pre-started worker processes run (code, inputs) batches, so candidates are evaluated on all cores
+# - Wall-clock limit per task: SIGALRM inside the worker, SIGKILL from the parent when a C-level loop ignores it
+# - Memory limit per worker through RLIMIT_AS, as headroom over the worker's own address space at start
+#   (mapped but unused virtual memory counts too): a blow-up raises MemoryError (or kills only that worker)
+# - Workers start from a forkserver (spawn where unavailable), not forked from the parent, which may already
+#   run the LLM client loop thread / HTTP pools and hold gigabytes of torch / sentence-transformers mappings
+# - Crashed / timed-out workers are replaced; healthy ones are recycled after `max_tasks_per_worker` tasks
+# - One message carries one source with many inputs; each worker compiles a source once (compile_function)
+# - submit_batch: a chunk of inputs runs through call_func_code_batch and comes back as one BatchResult
+
+KILL_GRACE = 1.0  # seconds past the timeout before the parent kills a worker
+DEFAULT_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def _address_space() -> Optional[int]:
+    """
+    Current virtual size of this process in bytes, None where /proc is unavailable
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _set_limits(memory_limit: Optional[int]):
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if memory_limit:
+        limit = memory_limit * 1024 * 1024 + (_address_space() or 0)
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _send(conn, task_id: int, result: CallResult):
+    try:
+        conn.send((task_id, result))
+    except Exception as e:
+        conn.send((task_id, CallResult(error=f"Output could not be returned: {e}")))
+
+
+def _send_batch(conn, task_id: int, batch: BatchResult):
+    try:
+        conn.send((task_id, batch))
+    except Exception:  # drop the unpicklable outputs only
+        values = list(batch.values)
+        for i, value in enumerate(values):
+            try:
+                pickle.dumps(value)
+            except Exception as e:
+                values[i] = None
+                batch.errors[i] = f"Output could not be returned: {e}"
+        batch.values = values
+        conn.send((task_id, batch))
+
+
+def _worker_main(conn, memory_limit: Optional[int]):
+    """
+    Worker loop: receive (code, func_name, tasks, timeout, vectorised, profile), send back (task_id, CallResult) per task
+    - vectorised: a single task whose input is a list of input dicts, answered with a BatchResult
+    - profile: Profiler mode for each per-row call (wall / CPU time and peak RSS are always recorded)
+    """
+    _set_limits(memory_limit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent
+
+    timeout = None
+
+    def on_alarm(signum, frame):
+        raise ExecutionTimeout(timeout_message(timeout))
+
+    signal.signal(signal.SIGALRM, on_alarm)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        code, func_name, tasks, timeout, vectorised, profile = message
+        if vectorised:
+            ((task_id, input_datas),) = tasks
+            batch = call_func_code_batch(input_datas, code, func_name, timeout)
+            _send_batch(conn, task_id, batch)
+            continue
+        for task_id, input_data in tasks:
+            result = CallResult()
+            with Profiler(result, profile):
+                if timeout:
+                    signal.setitimer(signal.ITIMER_REAL, timeout)
+                try:
+                    result.value = _call_func_code(
+                        input_data, code, func_name, timeout=False
+                    )
+                except ExecutionTimeout as e:
+                    result.error, result.timed_out = str(e), True
+                except (
+                    BaseException
+                ) as e:  # includes SystemExit raised by generated code
+                    result.error = str(e) or repr(e)
+                    result.crashed = isinstance(e, MemoryError)
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            _send(conn, task_id, result)
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit: Optional[int]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, memory_limit), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.batch = deque()  # (task_id, input_data) sent and not yet answered
+        self.code = self.func_name = None
+        self.timeout = None
+        self.vectorised = False
+        self.profile = None
+        self.deadline = None
+        self.tasks_done = 0
+
+    def send(
+        self,
+        code: str,
+        func_name: str,
+        tasks: list,
+        timeout: Optional[float],
+        vectorised: bool,
+        profile: Optional[str] = None,
+    ):
+        self.code, self.func_name = code, func_name
+        self.timeout, self.vectorised, self.profile = timeout, vectorised, profile
+        self.batch.extend(tasks)
+        self.reset_deadline()
+        self.conn.send((code, func_name, tasks, timeout, vectorised, profile))
+
+    def reset_deadline(self):
+        if not self.timeout or not self.batch:
+            self.deadline = None
+            return
+        # a vectorised chunk answers once, after every row has had its timeout
+        rows = len(self.batch[0][1]) if self.vectorised else 1
+        self.deadline = time.monotonic() + self.timeout * rows + KILL_GRACE
+
+    def stop(self, kill: bool = False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(KILL_GRACE)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of sandboxed worker processes executing generated node functions
+    - `submit(code, func_name, input_datas)` returns one Future per input, resolving to a CallResult like call_func_code
+    - `map(...)` blocks for the same results
+    - timeout: per-task wall-clock seconds (None disables)
+    - memory_limit: MB of address space a worker may add to its footprint at start (None disables)
+    - start_method: multiprocessing start method of the workers, forkserver / spawn by default
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        timeout: Optional[float] = 3.0,
+        memory_limit: Optional[int] = 4096,
+        max_tasks_per_worker: int = 1000,
+        batch_size: int = 16,
+        start_method: Optional[str] = None,
+    ):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.batch_size = batch_size
+        # spawn / forkserver re-import the __main__ script in every worker: scripts need a main guard
+        self._ctx = multiprocessing.get_context(start_method or DEFAULT_START_METHOD)
+        if self._ctx.get_start_method() == "forkserver":
+            # forked workers start with the sandbox already imported
+            self._ctx.set_forkserver_preload([__name__])
+        self.stats = Counter()  # tasks / timeouts / crashes / recycled
+
+        # (code, func_name, tasks, timeout, vectorised, profile) batches awaiting a worker
+        self._queue = deque()
+        self._futures: Dict[int, Future] = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._wakeup_r, self._wakeup_w = multiprocessing.Pipe(duplex=False)
+        self._workers = [
+            _Worker(self._ctx, memory_limit) for _ in range(self.num_workers)
+        ]
+        self._thread = threading.Thread(
+            target=self._dispatch, name="sandbox-dispatch", daemon=True
+        )
+        self._thread.start()
+
+    def _enqueue(
+        self,
+        code: str,
+        func_name: str,
+        payloads: list,
+        timeout: Optional[float],
+        vectorised: bool,
+        size: int,
+        profile: Optional[str] = None,
+    ) -> List[Future]:
+        timeout = self.timeout if timeout == -1 else timeout
+        futures, tasks = [], []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SandboxPool is closed")
+            for payload in payloads:
+                task_id = next(self._task_ids)
+                self._futures[task_id] = Future()
+                futures.append(self._futures[task_id])
+                tasks.append((task_id, payload))
+            for start in range(0, len(tasks), size):
+                self._queue.append(
+                    (
+                        code,
+                        func_name,
+                        tasks[start : start + size],
+                        timeout,
+                        vectorised,
+                        profile,
+                    )
+                )
+            self._wakeup_w.send(None)
+        return futures
+
+    def submit(
+        self,
+        code: str,
+        func_name: str,
+        input_datas: List[Dict[str, Any]],
+        timeout: Optional[float] = -1,
+        profile: Optional[str] = None,
+    ) -> List[Future]:
+        """
+        Queue 'func_name' from 'code' on every input; timeout=-1 uses the pool default
+        - profile: None, "memory" or "cpu", summary returned in CallResult.profile
+        """
+        # split so that a single candidate still spreads over idle workers
+        size = max(1, min(self.batch_size, -(-len(input_datas) // self.num_workers)))
+        return self._enqueue(
+            code, func_name, input_datas, timeout, False, size, profile
+        )
+
+    def map(
+        self,
+        code: str,
+        func_name: str,
+        input_datas: List[Dict[str, Any]],
+        timeout: Optional[float] = -1,
+        profile: Optional[str] = None,
+    ) -> List[CallResult]:
+        futures = self.submit(code, func_name, input_datas, timeout, profile)
+        return [future.result() for future in futures]
+
+    def submit_batch(
+        self,
+        code: str,
+        func_name: str,
+        input_datas: List[Dict[str, Any]],
+        timeout: Optional[float] = -1,
+    ) -> List[Future]:
+        """
+        Vectorised submit: one Future per chunk of inputs (one chunk per worker), resolving to a BatchResult
+        - A hard kill (runaway C code) fails the whole chunk it happened in
+        """
+        size = max(1, -(-len(input_datas) // self.num_workers))
+        chunks = [
+            input_datas[start : start + size]
+            for start in range(0, len(input_datas), size)
+        ]
+        return self._enqueue(code, func_name, chunks, timeout, True, 1)
+
+    def map_batch(
+        self,
+        code: str,
+        func_name: str,
+        input_datas: List[Dict[str, Any]],
+        timeout: Optional[float] = -1,
+    ) -> BatchResult:
+        futures = self.submit_batch(code, func_name, input_datas, timeout)
+        return BatchResult.concat([future.result() for future in futures])
+
+    def _resolve(self, task_id: int, result: Union[CallResult, BatchResult]):
+        future = self._futures.pop(task_id, None)
+        if future is not None:
+            self.stats["tasks"] += 1
+            future.set_result(result)
+
+    def _replace(self, index: int, kill: bool):
+        self._workers[index].stop(kill=kill)
+        self._workers[index] = _Worker(self._ctx, self.memory_limit)
+
+    def _fail_current(self, index: int, result: CallResult):
+        """
+        Resolve the running task with 'result', requeue the rest of its batch and replace the worker
+        """
+        worker = self._workers[index]
+        task_id, payload = worker.batch.popleft()
+        if worker.vectorised:
+            n = len(payload)
+            result = BatchResult(
+                [None] * n,
+                [result.error] * n,
+                [result.timed_out] * n,
+                crashed=[result.crashed] * n,
+            )
+        self._resolve(task_id, result)
+        if worker.batch:
+            with self._lock:
+                self._queue.appendleft(
+                    (
+                        worker.code,
+                        worker.func_name,
+                        list(worker.batch),
+                        worker.timeout,
+                        worker.vectorised,
+                        worker.profile,
+                    )
+                )
+        self._replace(index, kill=True)
+
+    def _assign(self):
+        for index, worker in enumerate(self._workers):
+            if worker.batch:
+                continue
+            with self._lock:
+                if not self._queue:
+                    return
+                batch = self._queue.popleft()
+            try:
+                worker.send(*batch)
+            except OSError:  # died while idle
+                worker.batch.clear()
+                with self._lock:
+                    self._queue.appendleft(batch)
+                self.stats["crashes"] += 1
+                self._replace(index, kill=True)
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                closed = self._closed
+            if closed:
+                break
+            self._assign()
+
+            busy = {w.conn: i for i, w in enumerate(self._workers) if w.batch}
+            deadlines = [
+                self._workers[i].deadline
+                for i in busy.values()
+                if self._workers[i].deadline is not None
+            ]
+            wait_time = (
+                max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            )
+            for conn in wait([self._wakeup_r, *busy], timeout=wait_time):
+                if conn is self._wakeup_r:
+                    while self._wakeup_r.poll():
+                        self._wakeup_r.recv()
+                    continue
+                index = busy[conn]
+                worker = self._workers[index]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join(KILL_GRACE)
+                    self.stats["crashes"] += 1
+                    error = (
+                        f"Sandbox worker crashed (exit code {worker.process.exitcode})"
+                    )
+                    self._fail_current(index, CallResult(error=error, crashed=True))
+                    continue
+                task_id, result = message
+                worker.batch.popleft()
+                worker.tasks_done += 1
+                worker.reset_deadline()
+                self._resolve(task_id, result)
+                if not worker.batch and worker.tasks_done >= self.max_tasks_per_worker:
+                    self.stats["recycled"] += 1
+                    self._replace(index, kill=False)
+
+            now = time.monotonic()
+            for index in list(busy.values()):
+                worker = self._workers[index]
+                if worker.batch and worker.deadline and now >= worker.deadline:
+                    self.stats["timeouts"] += 1
+                    error = timeout_message(worker.timeout)
+                    result = CallResult(
+                        error=error,
+                        timed_out=True,
+                        elapsed=worker.timeout,
+                        cpu_time=worker.timeout,  # spinning until killed
+                    )
+                    self._fail_current(index, result)
+
+        # closed: fail what is left and stop the workers
+        with self._lock:
+            self._queue.clear()
+        for future in self._futures.values():
+            future.set_exception(RuntimeError("SandboxPool closed"))
+        self._futures.clear()
+        for worker in self._workers:
+            worker.stop(kill=bool(worker.batch))
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup_w.send(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_sandbox: Optional[SandboxPool] = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox() -> SandboxPool:
+    """
+    Process-wide SandboxPool, created on first use
+    """
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = SandboxPool()
+            atexit.register(_sandbox.close)
+        return _sandbox
@@ -0,0 +1,245 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+# Rate-limit-aware scheduling of LLM requests (one scheduler per endpoint)
+# - AIMD concurrency window: grow by ~1 per window of successes, halve on throttling
+# - Token buckets for requests-per-minute and tokens-per-minute budgets
+# - Jittered exponential backoff on 429 / 5xx / timeouts, retries reported apart from failures
+
+RETRYABLE_STATUS = {408, 409, 425, 429}
+RETRYABLE_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectError",
+    "ReadTimeout",
+}
+
+
+def status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = status_code(exc)
+    if status is None:
+        return type(exc).__name__ in RETRYABLE_ERRORS
+    return status in RETRYABLE_STATUS or status >= 500
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:  # FIFO among waiters
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency window
+    - success: limit += increase / limit (about +1 per full window)
+    - throttled: limit *= decrease, at most once per `cooldown` seconds
+    """
+
+    def __init__(
+        self,
+        initial: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            while self.in_flight >= int(self.limit):
+                await self._cond.wait()
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False, success: bool = True):
+        async with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif success:
+                self.limit = min(
+                    self.max_limit, self.limit + self.increase / self.limit
+                )
+            self._cond.notify_all()
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    successes: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    status_counts: dict = field(default_factory=dict)
+
+    def snapshot(self) -> "SchedulerStats":
+        return SchedulerStats(
+            self.requests,
+            self.successes,
+            self.retries,
+            self.throttled,
+            self.failures,
+            dict(self.status_counts),
+        )
+
+    def since(self, other: "SchedulerStats") -> "SchedulerStats":
+        return SchedulerStats(
+            self.requests - other.requests,
+            self.successes - other.successes,
+            self.retries - other.retries,
+            self.throttled - other.throttled,
+            self.failures - other.failures,
+            {
+                k: v - other.status_counts.get(k, 0)
+                for k, v in self.status_counts.items()
+                if v - other.status_counts.get(k, 0)
+            },
+        )
+
+    def __str__(self):
+        return f"{self.successes}/{self.requests} ok, {self.retries} retries ({self.throttled} throttled), {self.failures} failures"
+
+
+class EndpointScheduler:
+    """
+    Per-endpoint scheduler: every request passes the RPM / TPM buckets and the
+    AIMD window, and is retried with jittered backoff on retryable errors
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 256,
+        initial_concurrency: int = 16,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+        request_timeout: Optional[float] = None,
+    ):
+        self.window = AdaptiveConcurrency(
+            initial_concurrency, max_limit=max_concurrency
+        )
+        self.rpm_bucket = TokenBucket(rpm) if rpm else None
+        self.tpm_bucket = TokenBucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_timeout = request_timeout
+        self.stats = SchedulerStats()
+
+    def backoff(self, attempt: int, exc: Optional[Exception] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        hinted = retry_after(exc) if exc is not None else None
+        return max(delay, hinted) if hinted is not None else delay
+
+    async def _acquire_budget(self, tokens: int):
+        if self.rpm_bucket is not None:
+            await self.rpm_bucket.acquire(1)
+        if self.tpm_bucket is not None and tokens:
+            await self.tpm_bucket.acquire(tokens)
+
+    async def submit(
+        self,
+        request: Callable[[], Awaitable],
+        tokens: int = 0,
+        trace: Optional[dict] = None,
+    ):
+        """
+        Run `request()` under the scheduler, raising the last error once retries are exhausted
+        - `trace` (optional dict) receives the time spent queued and the number of retries
+        """
+        self.stats.requests += 1
+        trace = {} if trace is None else trace
+        trace.update(queue_wait=0.0, retries=0)
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            await self._acquire_budget(tokens)
+            await self.window.acquire()
+            trace["queue_wait"] += time.monotonic() - queued_at
+            throttled, success = False, False
+            try:
+                if self.request_timeout is not None:
+                    async with asyncio.timeout(self.request_timeout):
+                        result = await request()
+                else:
+                    result = await request()
+                success = True
+                self.stats.successes += 1
+                return result
+            except Exception as e:
+                status = status_code(e)
+                key = status if status is not None else type(e).__name__
+                self.stats.status_counts[key] = self.stats.status_counts.get(key, 0) + 1
+                throttled = status == 429
+                self.stats.throttled += int(throttled)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self.stats.failures += 1
+                    raise
+                self.stats.retries += 1
+                trace["retries"] += 1
+                delay = self.backoff(attempt, e)
+            finally:
+                await self.window.release(throttled=throttled, success=success)
+            await asyncio.sleep(delay)
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.window.limit)
@@ -0,0 +1,203 @@
+import functools
+import re
+import zlib
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+# Vectorised parent selection over a population snapshot
+# - Fitness / efficiency / rank live in NumPy arrays, each scheme draws all m parents at once
+# - tournament: m * TOURNAMENT_OVERSAMPLE tournaments in one draw, entrants distinct within each
+#   tournament (argpartition of random keys per row), the first m distinct winners;
+#   short of m (heavy cloning), the best unselected individuals fill in, so it never spins
+# - rank (linear ranking) and proportional (fitness-proportionate): one draw without replacement
+# - novelty: tournament on fitness rank blended with novelty, the mean cosine distance of a code
+#   to its k nearest codes (against a random reference sample on large populations)
+# - Code embeddings are cached per code: hashed bag of tokens / token bigrams by default, or any `embed`
+
+SELECTION_MODES = ("tournament", "rank", "proportional", "novelty")
+TOURNAMENT_OVERSAMPLE = 4
+RANK_PRESSURE = 1.5  # linear ranking: expected picks of the best individual, in [1, 2]
+NOVELTY_WEIGHT = 0.5
+NOVELTY_K = 5
+NOVELTY_REFERENCE_SIZE = 2048
+NOVELTY_BLOCK_SIZE = 1024
+EMBEDDING_DIM = 256
+EMBEDDING_CACHE_SIZE = 1 << 16
+
+_TOKEN = re.compile(r"[A-Za-z_]\w*|\d+|[^\s\w]")
+
+
+@functools.lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
+def code_embedding(code: Optional[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Unit-norm hashed bag of tokens and token bigrams (read-only, shared through the cache)
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    tokens = _TOKEN.findall(code or "")
+    for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+        bucket = zlib.crc32(feature.encode("utf-8"))
+        vector[bucket % dim] += 1.0 if bucket & (1 << 31) else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    vector.flags.writeable = False
+    return vector
+
+
+def novelty_scores(
+    embeddings: np.ndarray,
+    k: int = NOVELTY_K,
+    reference: Optional[np.ndarray] = None,
+    block_size: int = NOVELTY_BLOCK_SIZE,
+) -> np.ndarray:
+    """
+    1 - mean cosine similarity to the k nearest other rows (of sorted `reference` row indices if given)
+    - Blocked matrix products: memory stays at block_size x len(reference)
+    """
+    n = len(embeddings)
+    if n < 2:
+        return np.zeros(n)
+    reference = np.arange(n) if reference is None else reference
+    others = embeddings[reference]
+    k = max(1, min(k, len(reference) - 1))
+    scores = np.empty(n)
+    for start in range(0, n, block_size):
+        stop = min(n, start + block_size)
+        similarity = embeddings[start:stop] @ others.T
+        rows = np.arange(start, stop)
+        cols = np.minimum(np.searchsorted(reference, rows), len(reference) - 1)
+        own = reference[cols] == rows  # not its own neighbour
+        similarity[np.flatnonzero(own), cols[own]] = -np.inf
+        nearest = np.partition(similarity, -k, axis=1)[:, -k:]
+        scores[start:stop] = 1.0 - nearest.mean(axis=1)
+    return scores
+
+
+def distinct_rows(rng: np.random.Generator, rows: int, n: int, size: int) -> np.ndarray:
+    """
+    (rows, size) indices into range(n), sampled without replacement within each row
+    """
+    keys = rng.random((rows, n))
+    if size == n:
+        return keys.argsort(axis=1)
+    return keys.argpartition(size - 1, axis=1)[:, :size]
+
+
+class Selector:
+    """
+    Selection over a snapshot of individual dicts ({"code", "fitness", "efficiency", ...})
+    - ranks: 0 (worst) .. n - 1 (best) by (fitness, efficiency), clones ordered by position
+    - Partial fitness (a racing lower bound) ranks like no fitness at all
+    - Every scheme returns distinct indices into `individuals`
+    """
+
+    def __init__(
+        self,
+        pop: Iterable[dict],
+        embed: Optional[Callable[[Optional[str]], np.ndarray]] = None,
+    ):
+        self.individuals = list(pop)
+        self.embed = code_embedding if embed is None else embed
+        self.fitness = np.array(
+            [
+                (
+                    indiv["fitness"]
+                    if indiv.get("fitness") is not None and not indiv.get("partial")
+                    else -np.inf
+                )
+                for indiv in self.individuals
+            ],
+            dtype=float,
+        )
+        self.efficiency = np.array(
+            [indiv.get("efficiency") or 0.0 for indiv in self.individuals], dtype=float
+        )
+        order = np.lexsort((self.efficiency, self.fitness))
+        self.ranks = np.empty(len(order), dtype=np.int64)
+        self.ranks[order] = np.arange(len(order))
+
+    def __len__(self) -> int:
+        return len(self.individuals)
+
+    def tournament(
+        self,
+        m: int,
+        tournament_size: int,
+        rng: np.random.Generator,
+        scores: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        n = len(self)
+        m = min(m, n)
+        scores = self.ranks if scores is None else scores
+        size = min(max(2, tournament_size), n)
+        entrants = distinct_rows(rng, m * TOURNAMENT_OVERSAMPLE, n, size)
+        winners = entrants[
+            np.arange(len(entrants)), np.argmax(scores[entrants], axis=1)
+        ]
+        _, first = np.unique(winners, return_index=True)
+        chosen = winners[np.sort(first)][:m]
+        if len(chosen) < m:
+            rest = np.setdiff1d(np.arange(n), chosen)
+            rest = rest[np.argsort(-scores[rest], kind="stable")]
+            chosen = np.concatenate([chosen, rest[: m - len(chosen)]])
+        return chosen
+
+    def rank(
+        self, m: int, rng: np.random.Generator, pressure: float = RANK_PRESSURE
+    ) -> np.ndarray:
+        n = len(self)
+        if n == 1:
+            return np.zeros(min(m, 1), dtype=np.int64)
+        p = (2 - pressure) / n + 2 * self.ranks * (pressure - 1) / (n * (n - 1))
+        return rng.choice(n, size=min(m, n), replace=False, p=p / p.sum())
+
+    def proportional(self, m: int, rng: np.random.Generator) -> np.ndarray:
+        n = len(self)
+        fitness = np.where(np.isfinite(self.fitness), self.fitness, np.nan)
+        floor = np.nanmin(fitness) if np.isfinite(fitness).any() else 0.0
+        weights = np.nan_to_num(fitness - floor, nan=0.0) + 1e-6
+        return rng.choice(n, size=min(m, n), replace=False, p=weights / weights.sum())
+
+    def embeddings(self) -> np.ndarray:
+        return np.stack([self.embed(indiv.get("code")) for indiv in self.individuals])
+
+    def novelty(
+        self,
+        m: int,
+        rng: np.random.Generator,
+        tournament_size: int = 2,
+        weight: float = NOVELTY_WEIGHT,
+        k: int = NOVELTY_K,
+        reference_size: int = NOVELTY_REFERENCE_SIZE,
+    ) -> np.ndarray:
+        n = len(self)
+        reference = None
+        if n > reference_size:
+            reference = np.sort(rng.choice(n, size=reference_size, replace=False))
+        novelty = novelty_scores(self.embeddings(), k, reference)
+        spread = novelty.max() - novelty.min()
+        novelty = (novelty - novelty.min()) / spread if spread > 0 else 0.0
+        quality = self.ranks / max(1, n - 1)
+        scores = (1 - weight) * quality + weight * novelty
+        return self.tournament(m, tournament_size, rng, scores)
+
+    def select(
+        self,
+        m: int,
+        mode: str = "tournament",
+        rng: Optional[np.random.Generator] = None,
+        tournament_size: int = 2,
+    ) -> List[dict]:
+        if mode not in SELECTION_MODES:
+            raise ValueError(
+                f"Unknown selection mode {mode!r}, expected one of {SELECTION_MODES}"
+            )
+        rng = np.random.default_rng() if rng is None else rng
+        if mode == "tournament":
+            indices = self.tournament(m, tournament_size, rng)
+        elif mode == "novelty":
+            indices = self.novelty(m, rng, tournament_size)
+        else:
+            indices = getattr(self, mode)(m, rng)
+        return [self.individuals[i] for i in indices]
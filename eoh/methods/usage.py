@@ -0,0 +1,283 @@
+import contextvars
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, fields, replace
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .scheduler import estimate_tokens
+
+# Token, latency and cost accounting for every LLM call
+# - One CallRecord per upstream request: tokens (API usage fields, tiktoken fallback), latency, queue wait, retries, cost
+# - Records are tagged with the caller (evolve / alignment / test-case / plan / ...) through a context variable
+# - The tag is captured on the calling thread and re-set inside the async client's loop, so batch calls keep it
+# - Running totals per (tag, model) plus a bounded deque of recent records: memory stays flat on long runs
+
+RECENT_RECORDS = 1000
+
+# USD per 1M (prompt, completion) tokens, matched on the longest model-name prefix
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-haiku": (0.25, 1.25),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+_current_tag: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_usage_tag", default="untagged"
+)
+
+
+def current_tag() -> str:
+    return _current_tag.get()
+
+
+@contextmanager
+def usage_tag(tag: str):
+    """
+    Tag every LLM call made inside the block, e.g. `with usage_tag("alignment"): ...`
+    """
+    token = _current_tag.set(tag)
+    try:
+        yield
+    finally:
+        _current_tag.reset(token)
+
+
+def tagged(tag: str) -> Callable:
+    """
+    Decorator form of `usage_tag`
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with usage_tag(tag):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def with_tag(coro, tag: str):
+    """
+    Await `coro` under `tag`, used to carry the caller's tag onto the event loop thread
+    """
+    _current_tag.set(tag)  # scoped to the task running this coroutine
+    return await coro
+
+
+_tiktoken_unavailable = (
+    False  # not installed or its encodings cannot be loaded (e.g. offline)
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """
+    Token count with tiktoken, or a characters / 4 estimate when tiktoken is unavailable
+    - A failure to load tiktoken is remembered, later calls go straight to the estimate
+    """
+    global _tiktoken_unavailable
+    if not _tiktoken_unavailable:
+        try:
+            return len(_encoding(model.split("/")[-1]).encode(text))
+        except Exception:
+            _tiktoken_unavailable = True
+    return estimate_tokens(text)
+
+
+def price_of(model: str) -> tuple:
+    name = model.split("/")[-1]
+    matches = [prefix for prefix in PRICES if name.startswith(prefix)]
+    return PRICES[max(matches, key=len)] if matches else (0.0, 0.0)
+
+
+@dataclass
+class CallRecord:
+    tag: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    queue_wait: float = 0.0
+    retries: int = 0
+    samples: int = 1
+    estimated: bool = False  # token counts from tiktoken rather than API usage
+    failed: bool = False
+
+    @property
+    def cost(self) -> float:
+        prompt_price, completion_price = price_of(self.model)
+        return (
+            self.prompt_tokens * prompt_price
+            + self.completion_tokens * completion_price
+        ) / 1e6
+
+
+@dataclass
+class UsageStats:
+    calls: int = 0
+    failures: int = 0
+    samples: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    latency: float = 0.0
+    queue_wait: float = 0.0
+    retries: int = 0
+
+    def add(self, record: CallRecord):
+        self.calls += 1
+        self.failures += int(record.failed)
+        self.samples += record.samples
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost += record.cost
+        self.latency += record.latency
+        self.queue_wait += record.queue_wait
+        self.retries += record.retries
+
+    def __add__(self, other: "UsageStats") -> "UsageStats":
+        return UsageStats(
+            *(getattr(self, f.name) + getattr(other, f.name) for f in fields(self))
+        )
+
+    def __sub__(self, other: "UsageStats") -> "UsageStats":
+        return UsageStats(
+            *(getattr(self, f.name) - getattr(other, f.name) for f in fields(self))
+        )
+
+    def __str__(self):
+        return (
+            f"{self.calls} calls ({self.failures} failed), {self.prompt_tokens} prompt + "
+            f"{self.completion_tokens} completion tokens, ${self.cost:.4f}, "
+            f"{self.latency:.1f}s latency, {self.queue_wait:.1f}s queued, {self.retries} retries"
+        )
+
+
+class UsageTracker:
+    """
+    Thread-safe usage totals per (tag, model), with the last `max_records` CallRecords in `records`
+    - `mark()` then `summary(since=mark)` isolates the calls of one evolve step
+    """
+
+    def __init__(self, max_records: int = RECENT_RECORDS):
+        self.records: Deque[CallRecord] = deque(maxlen=max_records)
+        self._totals: Dict[Tuple[str, str], UsageStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord):
+        with self._lock:
+            self.records.append(record)
+            key = (record.tag, record.model)
+            self._totals.setdefault(key, UsageStats()).add(record)
+
+    def mark(self) -> Dict[Tuple[str, str], UsageStats]:
+        with self._lock:
+            return {key: replace(stats) for key, stats in self._totals.items()}
+
+    def summary(
+        self, since: Optional[dict] = None, by: str = "tag"
+    ) -> Dict[str, UsageStats]:
+        """
+        Usage per tag or per model, of the calls recorded after the `since` mark
+        """
+        if by not in ("tag", "model"):
+            raise ValueError(f"Usage is aggregated by 'tag' or 'model', not {by!r}")
+        since = since or {}
+        stats = {}
+        for (tag, model), total in self.mark().items():
+            delta = total - since.get((tag, model), UsageStats())
+            if delta.calls:
+                key = tag if by == "tag" else model
+                stats[key] = stats[key] + delta if key in stats else delta
+        return stats
+
+    def total(self, since: Optional[dict] = None) -> UsageStats:
+        return sum(self.summary(since).values(), UsageStats())
+
+    def report(self, since: Optional[dict] = None, by: str = "tag") -> str:
+        lines = [
+            f"     :: {key}: {stats}"
+            for key, stats in sorted(self.summary(since, by).items())
+        ]
+        return "\n".join(lines + [f"     :: total: {self.total(since)}"])
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+            self._totals = {}
+
+
+_usage_tracker = UsageTracker()
+
+
+def get_usage_tracker() -> UsageTracker:
+    return _usage_tracker
+
+
+def _usage_field(usage, *names) -> Optional[int]:
+    for name in names:
+        value = getattr(usage, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def record_call(
+    model: str,
+    prompt: str,
+    completions: List[str],
+    latency: float,
+    usage=None,
+    trace: Optional[dict] = None,
+    failed: bool = False,
+) -> Optional[CallRecord]:
+    """
+    Record one upstream call under the current tag, None if it cannot be accounted
+    - `usage`: API usage object (prompt_tokens / completion_tokens or input_tokens / output_tokens)
+    - `trace`: scheduler trace with queue_wait and retries
+    """
+    try:
+        prompt_tokens = _usage_field(usage, "prompt_tokens", "input_tokens")
+        completion_tokens = _usage_field(usage, "completion_tokens", "output_tokens")
+        estimated = prompt_tokens is None or completion_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(prompt, model)
+        if completion_tokens is None:
+            completion_tokens = sum(count_tokens(c or "", model) for c in completions)
+
+        trace = trace or {}
+        record = CallRecord(
+            tag=current_tag(),
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency=latency,
+            queue_wait=trace.get("queue_wait", 0.0),
+            retries=trace.get("retries", 0),
+            samples=max(1, len(completions)),
+            estimated=estimated,
+            failed=failed,
+        )
+    except Exception as e:  # accounting must never fail or mask the request itself
+        print(f" :: Usage accounting failed: {e!r}")
+        return None
+    _usage_tracker.record(record)
+    return record
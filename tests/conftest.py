@@ -1,5 +1,106 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 
+# unit tests import the eoh modules the way the scripts do: `from methods.x import ...`
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "eoh"))
+
+
+class FakeServer:
+    """
+    Local LLM server: OpenAI-compatible `/v1/chat/completions` and batch `/generate`
+    - mode: "ok", "error" (HTTP 500), "slow" (answers after `delay` seconds),
+      "reject_n" (HTTP 400 with `n_error` when n > 1) or "invalid" (HTTP 400 on every prompt)
+    - Answers are "<name>:<prompt>", so tests can tell which server served which prompt
+    """
+
+    def __init__(self, name: str, mode: str = "ok", delay: float = 1.0):
+        self.name = name
+        self.mode = mode
+        self.delay = delay
+        self.requests = 0
+        self.bodies = []
+        self.n_error = "Unsupported parameter: 'n' must be 1"
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                server.bodies.append(body)
+                if server.mode == "error":
+                    return self._reply(500, {"error": {"message": "boom"}})
+                if server.mode == "invalid":
+                    message = "This model's maximum context length is 8 tokens"
+                    return self._reply(400, {"error": {"message": message}})
+                if server.mode == "reject_n" and body.get("n", 1) > 1:
+                    return self._reply(400, {"error": {"message": server.n_error}})
+                if server.mode == "slow":
+                    time.sleep(server.delay)
+                if self.path.endswith("/generate"):
+                    results = [f"{server.name}:{prompt}" for prompt in body]
+                    return self._reply(200, {"results": results})
+                prompt = body["messages"][-1]["content"]
+                choices = [
+                    {
+                        "index": i,
+                        "message": {
+                            "role": "assistant",
+                            "content": f"{server.name}:{prompt}",
+                        },
+                        "finish_reason": "stop",
+                    }
+                    for i in range(body.get("n", 1))
+                ]
+                self._reply(
+                    200,
+                    {
+                        "id": "fake",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": body["model"],
+                        "choices": choices,
+                    },
+                )
+
+            def _reply(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(name: str, mode: str = "ok", delay: float = 1.0) -> FakeServer:
+        started.append(FakeServer(name, mode, delay))
+        return started[-1]
+
+    yield start
+    for server in started:
+        server.close()
+
 
 # @pytest.fixture
 # def sample_data():
@@ -0,0 +1,146 @@
+import pytest
+
+from methods.cache import CachedResponse, SQLiteLRUStore, sample_indices
+from methods.sampling import SampledPrompt
+
+
+class CountingLLM:
+    """
+    get_response stand-in: "<prompt>#<call>", so every real call gives a fresh answer
+    """
+
+    model = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        self.calls += 1
+        return f"{prompt}#{self.calls}"
+
+    def __call__(self, prompt, desc: str = ""):
+        if isinstance(prompt, str):
+            return self._answer(prompt)
+        return [self._answer(p) for p in prompt]
+
+
+def test_store_evicts_least_recently_used_entries():
+    store = SQLiteLRUStore(max_entries=3)
+    for key in "abc":
+        store.set(key, key.encode())
+    store.get("a")  # b is now the least recently used
+    store.set("d", b"d")
+    assert len(store) == 3
+    assert store.get("b") is None
+    assert store.get_many(["a", "c", "d"]) == {"a": b"a", "c": b"c", "d": b"d"}
+
+
+def test_store_evicts_by_bytes():
+    store = SQLiteLRUStore(max_bytes=10)
+    store.set("a", b"x" * 4)
+    store.set("b", b"x" * 4)
+    store.set("a", b"x" * 5)  # replacing an entry frees its old size
+    assert (len(store), store.size_bytes) == (2, 9)
+    store.set("c", b"x" * 4)
+    assert store.get("b") is None and store.size_bytes == 9
+
+
+def test_store_persists_and_exports(tmp_path):
+    path, exported = str(tmp_path / "cache.db"), str(tmp_path / "export.db")
+    store = SQLiteLRUStore(path, max_entries=2)
+    store.set("a", b"1")
+    store.set("b", b"2")
+    assert store.export_to(exported) == 2
+    store.set("c", b"3")
+    assert store.export_to(exported) == 1
+    store.close()
+
+    reopened = SQLiteLRUStore(path, max_entries=2)
+    assert (len(reopened), reopened.get("c")) == (2, b"3")
+    assert len(SQLiteLRUStore(exported)) == 3
+
+
+def test_sample_indices():
+    assert sample_indices(["a", "b", "a", "a"]) == [0, 0, 1, 2]
+
+
+def test_cached_response_needs_a_model():
+    with pytest.raises(ValueError):
+        CachedResponse(lambda prompt, desc="": prompt)
+    assert CachedResponse(CountingLLM()).model == "counting"
+    assert CachedResponse(CountingLLM(), model="other").model == "other"
+
+
+def test_cached_response_replays_a_run(tmp_path):
+    path = str(tmp_path / "llm.db")
+    llm = CountingLLM()
+    cached = CachedResponse(llm, path=path)
+    first = cached(["a", "a", "b"]) + [cached("a"), cached("b")]
+    assert first == ["a#1", "a#2", "b#3", "a#4", "b#5"]  # repeats are fresh samples
+    assert sorted(cached.occurrences.values()) == [2, 3]
+    assert llm.calls == 5 and cached.stats["misses"] == 5
+
+    replay = CachedResponse(CountingLLM(), path=path)
+    assert replay(["a", "a", "b"]) + [replay("a"), replay("b")] == first
+    assert replay.stats["hits"] == 5 and replay._get_response.calls == 0
+
+
+def test_cached_response_keys_depend_on_model_and_params():
+    cached = CachedResponse(CountingLLM())
+    assert cached.key("p") != cached.key("p", 1)
+    assert cached.key("p") != CachedResponse(CountingLLM(), model="other").key("p")
+    other = CachedResponse(CountingLLM(), sampling_params={"temperature": 0})
+    assert cached.key("p") != other.key("p")
+
+
+def test_cached_response_does_not_cache_failures():
+    answers = iter(["", "ok"])
+    cached = CachedResponse(lambda prompt, desc="": next(answers), model="flaky")
+    assert cached("p") == ""
+    assert len(cached.store) == 0
+    assert cached("p") == "ok"
+    assert len(cached.store) == 1
+
+
+def test_cached_response_stream_yields_hits_first():
+    cached = CachedResponse(CountingLLM())
+    cached(["a"])
+    cached.occurrences.clear()  # ask for the same samples again
+    assert list(cached.stream(["b", "a"])) == [(1, "a#1"), (0, "b#2")]
+
+
+class RecordingLLM(CountingLLM):
+    """
+    CountingLLM keeping the prompt objects of every batch it is sent
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def __call__(self, prompt, desc: str = ""):
+        if not isinstance(prompt, str):
+            self.batches.append(list(prompt))
+        return super().__call__(prompt, desc)
+
+
+def test_cached_response_takes_prompt_and_sample_count():
+    llm = RecordingLLM()
+    cached = CachedResponse(llm)
+    assert cached(("a", 3)) == ["a#1", "a#2", "a#3"]
+    assert cached(["b", ("a", 2)]) == ["b#4", "a#5", "a#6"]
+    assert all(isinstance(p, SampledPrompt) for p in llm.batches[0])
+
+
+def test_cached_response_misses_keep_their_sample_marking():
+    llm = RecordingLLM()
+    cached = CachedResponse(llm)
+    cached(["a"])
+    cached.occurrences.clear()  # sample 0 of "a" is cached, samples 1 and 2 are not
+    assert cached(["a", "a", "a"]) == ["a#1", "a#2", "a#3"]
+    assert llm.batches[-1] == ["a", "a"]
+    assert all(isinstance(p, SampledPrompt) for p in llm.batches[-1])
+
+    sampled = SampledPrompt("c")
+    cached([sampled])
+    assert type(llm.batches[-1][0]) is SampledPrompt
@@ -0,0 +1,129 @@
+import hashlib
+import re
+
+import pytest
+
+from methods.cache import CachedResponse, SQLiteLRUStore
+from methods.checkpoint import Checkpoint
+from methods.meta_prompt import MetaPrompt, PromptMode
+from methods.population import Evolution
+
+METHODS = ["i1", "e1", "m1", "e2", "m2", "e1", "m1"]
+CANDIDATE = """{{"reasoning": "square the inputs below {k}"}}
+```python
+def square(x: int) -> int:
+    k = {k}
+    variant = {variant}
+    return x * x if x < k else -1
+```"""
+SKILL = re.compile(r"k = (\d+)")
+
+
+class Crash(Exception):
+    pass
+
+
+class StubLLM:
+    """
+    Answers from the prompt alone, so a fresh instance answers like the crashed one
+    - Each candidate squares the inputs below the best parent k in the prompt, plus a prompt-keyed step
+    """
+
+    def __init__(self, crash_after: int = None):
+        self.crash_after = crash_after
+        self.calls = 0
+
+    @staticmethod
+    def _candidate(prompt: str, index: int) -> str:
+        digest = int(hashlib.sha256(f"{index}|{prompt}".encode()).hexdigest(), 16)
+        k = max((int(k) for k in SKILL.findall(prompt)), default=0) + digest % 3
+        return CANDIDATE.format(k=k, variant=digest % 2**32)
+
+    def __call__(self, prompts, desc=""):
+        if self.crash_after is not None and self.calls >= self.crash_after:
+            raise Crash()
+        self.calls += 1
+        if isinstance(prompts, str):
+            return self._candidate(prompts, 0)
+        return [self._candidate(prompt, i) for i, prompt in enumerate(prompts)]
+
+
+@pytest.fixture
+def make_evolution(tmp_path):
+    def make(llm: StubLLM) -> Evolution:
+        meta_prompt = MetaPrompt(
+            task="Square an integer",
+            func_name="square",
+            inputs=["x"],
+            outputs=["y"],
+            input_types=["int"],
+            output_types=["int"],
+            mode=PromptMode.CODE,
+        )
+        evolution = Evolution(
+            3,
+            meta_prompt,
+            CachedResponse(llm, model="stub"),
+            test_cases=[({"x": x}, {"y": x * x}) for x in range(8)],
+            max_attempts=1,
+            query_node=False,
+            seed=1,
+        )
+        evolution.evol.library_dir = str(tmp_path / "nodes")
+        return evolution
+
+    return make
+
+
+def individuals(evolution: Evolution) -> list:
+    return sorted((indiv["code"], indiv["fitness"]) for indiv in evolution.population)
+
+
+def test_resume_after_crash_matches_an_uninterrupted_run(tmp_path, make_evolution):
+    full_llm = StubLLM()
+    full = make_evolution(full_llm)
+    full.run(METHODS)
+
+    crashed_llm = StubLLM(crash_after=4)
+    crashed = make_evolution(crashed_llm)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"))
+    with pytest.raises(Crash):
+        crashed.run(METHODS, checkpoint)
+    checkpoint.close()
+
+    resumed_llm = StubLLM()
+    resumed = make_evolution(resumed_llm)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"))
+    assert checkpoint.exists()
+    resumed.run(METHODS, checkpoint)
+
+    assert individuals(resumed) == individuals(full)
+    assert resumed.strategy_trace == full.strategy_trace
+    assert crashed_llm.calls + resumed_llm.calls == full_llm.calls  # nothing paid twice
+
+
+def test_saves_are_incremental(tmp_path, make_evolution):
+    evolution = make_evolution(StubLLM())
+    evolution.run(METHODS[:3])
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"))
+    checkpoint.save(evolution)
+    assert checkpoint.save(evolution)["written"] == 0
+
+    restored = make_evolution(StubLLM())
+    assert Checkpoint(str(tmp_path / "checkpoint")).restore(restored) == evolution.step
+    assert individuals(restored) == individuals(evolution)
+
+
+def test_store_exports_only_entries_since_the_last_export(tmp_path):
+    store, path = SQLiteLRUStore(), str(tmp_path / "export.sqlite")
+    for i in range(5):
+        store.set(f"k{i}", b"v")
+    assert store.export_to(path) == 5
+    assert store.export_to(path) == 0
+    store.set("k5", b"v")
+    store.set("k0", b"new")
+    assert store.export_to(path) == 2
+    exported = SQLiteLRUStore(path)
+    assert len(exported) == 6 and exported.get("k0") == b"new"
+    # a new path starts with a full copy
+    assert store.export_to(str(tmp_path / "other.sqlite")) == 6
@@ -0,0 +1,75 @@
+import inspect
+
+import pytest
+
+from methods.evolnode import EvolNode
+from methods.meta_prompt import MetaPrompt, PromptMode
+
+SQUARE = """
+def square(x: int) -> int:
+    while x < 0:
+        pass
+    return x * x if x < {k} else -1
+"""
+
+LATE_SQUARE = """
+def square(x: int) -> int:
+    return x * x if x >= {k} else -1
+"""
+
+
+def square_node(tmp_path) -> EvolNode:
+    meta_prompt = MetaPrompt(
+        task="Square an integer",
+        func_name="square",
+        inputs=["x"],
+        outputs=["y"],
+        input_types=["int"],
+        output_types=["int"],
+        mode=PromptMode.CODE,
+    )
+    return EvolNode(
+        meta_prompt,
+        test_cases=[({"x": x}, {"y": x * x}) for x in range(16)],
+        get_response=None,
+        memo=False,
+        libary_dir=str(tmp_path / "nodes"),
+    )
+
+
+def test_racing_drops_hopeless_candidates_and_flags_them_partial(tmp_path):
+    node = square_node(tmp_path)
+    codes = [SQUARE.format(k=k) for k in (16, 0, 12, 3)]
+    fitness, errors, summary = node._race_fitness(codes=codes, min_cases=4, eta=3)
+
+    assert [fitness[i].partial for i in range(4)] == [False, True, False, True]
+    assert fitness[0]() == 1.0
+    assert "Evaluated cells:           56/64" in summary
+    assert any("stopped early after 12/16" in error for error in errors[1])
+
+    full, _, _ = node._race_fitness(codes=codes, min_cases=16)
+    for i in range(4):
+        assert not full[i].partial
+        if fitness[i].partial:  # a lower bound: unseen cells count as failed
+            assert fitness[i]() <= full[i]()
+        else:
+            assert fitness[i]() == full[i]()
+
+
+def test_racing_keeps_a_candidate_that_wins_on_later_cases(tmp_path):
+    node = square_node(tmp_path)
+    codes = [SQUARE.format(k=4), LATE_SQUARE.format(k=4)]  # early vs late winner
+    fitness, _, _ = node._race_fitness(codes=codes, min_cases=2, eta=2)
+    assert not any(fitness[i].partial for i in range(2))
+    assert fitness[1]() > fitness[0]()
+
+
+def test_racing_evaluates_a_lone_candidate_fully(tmp_path):
+    node = square_node(tmp_path)
+    fitness, _, summary = node._race_fitness(codes=[SQUARE.format(k=8)], min_cases=2)
+    assert not fitness[0].partial and fitness[0]() == pytest.approx(0.75)
+    assert "Evaluated cells:           16/16" in summary
+
+
+def test_racing_is_opt_in():
+    assert inspect.signature(EvolNode.evolve).parameters["racing"].default is False
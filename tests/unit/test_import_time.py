@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+EOH_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "eoh")
+IMPORT_BUDGET = float(os.getenv("EOH_IMPORT_BUDGET", "2.0"))  # seconds
+HEAVY_MODULES = [
+    "anthropic",
+    "groq",
+    "langchain_community",
+    "openai",
+    "sentence_transformers",
+    "sklearn",
+    "torch",
+    "transformers",
+    "vllm",
+]
+
+SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import methods.evolnode
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def test_evolnode_import_is_lazy_and_fast():
+    env = {
+        k: v
+        for k, v in os.environ.items()
+        if not k.endswith("_API_KEY")  # importing must not need credentials
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=EOH_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if "ModuleNotFoundError" in result.stderr:
+        pytest.skip(f"missing dependency: {result.stderr.strip().splitlines()[-1]}")
+    assert result.returncode == 0, result.stderr
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["loaded"] == [], f"heavy modules imported eagerly: {report['loaded']}"
+    assert (
+        report["elapsed"] < IMPORT_BUDGET
+    ), f"import took {report['elapsed']:.2f}s (budget {IMPORT_BUDGET}s)"
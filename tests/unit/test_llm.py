@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from methods.llm import (
+    AsyncLLMClient,
+    SampledPrompt,
+    get_async_client,
+    get_async_llm_func,
+    rejects_native_n,
+)
+from methods.scheduler import status_code
+
+
+@pytest.fixture
+def client():
+    client = AsyncLLMClient()
+    yield client
+    client.close()
+
+
+def complete_n(client: AsyncLLMClient, server, n: int):
+    base_url = f"{server.url}/v1"
+    client.configure_endpoint(base_url, max_retries=0)
+    return base_url, client.run(
+        client.acomplete_n("p", "fake-model", n, base_url=base_url, api_key="test")
+    )
+
+
+def test_native_n_is_one_request(servers, client):
+    server = servers("a")
+    base_url, responses = complete_n(client, server, 3)
+    assert responses == ["a:p"] * 3
+    assert server.requests == 1
+    assert base_url not in client._no_native_n
+
+
+def test_rejected_n_falls_back_to_replicated_requests(servers, client):
+    server = servers("a", mode="reject_n")
+    base_url, responses = complete_n(client, server, 3)
+    assert responses == ["a:p"] * 3
+    assert base_url in client._no_native_n
+
+    requests = server.requests
+    complete_n(client, server, 2)
+    assert server.requests == requests + 2  # no native attempt anymore
+
+
+def test_unrelated_400_is_raised_and_keeps_native_n(servers, client):
+    server = servers("a", mode="invalid")
+    with pytest.raises(Exception) as error:
+        complete_n(client, server, 3)
+    assert status_code(error.value) == 400
+    assert f"{server.url}/v1" not in client._no_native_n
+
+
+def test_unnamed_400_marks_endpoint_once_n1_succeeds(servers, client):
+    server = servers("a", mode="reject_n")
+    server.n_error = "Unsupported sampling configuration"
+    base_url, responses = complete_n(client, server, 3)
+    assert responses == ["a:p"] * 3
+    assert base_url in client._no_native_n
+
+
+def test_rejects_native_n():
+    assert rejects_native_n(Exception("Unsupported parameter: 'n' must be 1"))
+    assert rejects_native_n(Exception("best_of is not supported"))
+    assert not rejects_native_n(Exception("maximum context length is 8 tokens"))
+    assert not rejects_native_n(Exception("invalid prompt: n-grams too long"))
+
+
+def test_identical_in_flight_prompts_share_one_call(servers):
+    server = servers("a", mode="slow", delay=0.3)
+    base_url = f"{server.url}/v1"
+    get_async_client().configure_endpoint(base_url, max_retries=0)
+    get_response = get_async_llm_func("fake-model", base_url=base_url, api_key="test")
+
+    responses = [None] * 2
+
+    def ask(i):  # e.g. the same alignment check from two evaluations at once
+        responses[i] = get_response(["p"])[0]
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert responses == ["a:p", "a:p"]
+    assert server.requests == 1
+
+
+def test_sampled_prompts_are_not_coalesced(servers, client):
+    server = servers("a", mode="slow", delay=0.3)
+    base_url = f"{server.url}/v1"
+    client.configure_endpoint(base_url, max_retries=0)
+
+    async def ask_twice(prompt):
+        return await asyncio.gather(
+            *[
+                client.acomplete(prompt, "fake-model", base_url=base_url, api_key="t")
+                for _ in range(2)
+            ]
+        )
+
+    assert client.run(ask_twice("p")) == ["a:p", "a:p"]
+    assert (server.requests, client.coalesced) == (1, 1)
+    assert client.run(ask_twice(SampledPrompt("p"))) == ["a:p", "a:p"]
+    assert server.requests == 3
@@ -0,0 +1,91 @@
+import threading
+
+from methods.evolnode import EvolNode
+from methods.memo import EvaluationMemo
+from methods.meta_prompt import MetaPrompt, PromptMode
+
+SQUARE = """
+def square(x: int) -> int:
+    while x < 0:
+        pass
+    return x * x if x < {k} else -1
+"""
+
+
+def square_node(tmp_path, memo: EvaluationMemo) -> EvolNode:
+    meta_prompt = MetaPrompt(
+        task="Square an integer",
+        func_name="square",
+        inputs=["x"],
+        outputs=["y"],
+        input_types=["int"],
+        output_types=["int"],
+        mode=PromptMode.CODE,
+    )
+    return EvolNode(
+        meta_prompt,
+        test_cases=[({"x": x}, {"y": x * x}) for x in range(16)],
+        get_response=None,
+        sandbox=False,
+        memo=memo,
+        libary_dir=str(tmp_path / "nodes"),
+    )
+
+
+def test_memo_round_trip_and_stats():
+    memo = EvaluationMemo()
+    key = memo.execution_key("def f(): pass", {"x": 1}, ("f", "int"))
+    assert memo.get(key) is None
+    assert memo.set(key, ({"y": 1}, []))
+    assert memo.get(key) == ({"y": 1}, [])
+    assert (memo.stats["hits"], memo.stats["misses"]) == (1, 1)
+    memo.clear()
+    assert memo.get(key) is None and memo.stats["hits"] == 0
+
+
+def test_memo_keys_separate_code_inputs_and_config():
+    key = EvaluationMemo.execution_key
+    assert key("a", {"x": 1}, "s") != key("a ", {"x": 1}, "s")  # any edit is a miss
+    assert key("a", {"x": 1}, "s") != key("a", {"x": 2}, "s")
+    assert key("a", {"x": 1}, "s") != key("a", {"x": 1}, "t")
+    score = EvaluationMemo.score_key
+    assert score("a", {"x": 1}, {"y": 1}, "c") != score("a", {"x": 1}, {"y": 1}, "d")
+
+
+def test_memo_skips_unpicklable_values():
+    memo = EvaluationMemo()
+    assert not memo.set("lock", threading.Lock())
+    assert len(memo.store) == 0
+
+
+def test_memo_persists_on_disk(tmp_path):
+    path = str(tmp_path / "memo.sqlite")
+    EvaluationMemo(path).set("k", [1, 2])
+    assert EvaluationMemo(path).get("k") == [1, 2]
+
+
+def test_evaluation_reuses_memoised_cells(tmp_path):
+    memo = EvaluationMemo()
+    node = square_node(tmp_path, memo)
+    codes = [SQUARE.format(k=k) for k in (16, 4)]
+    first = node._race_fitness(codes=codes, min_cases=16)[0]
+    entries, misses = len(memo.store), memo.misses
+    assert entries == 2 * 16 * 2  # an execution and a score cell per (code, test case)
+
+    again = node._race_fitness(codes=codes, min_cases=16)[0]
+    assert [again[i]() for i in range(2)] == [first[i]() for i in range(2)]
+    assert memo.misses == misses and len(memo.store) == entries
+
+    node._race_fitness(codes=[SQUARE.format(k=5)], min_cases=16)  # a new candidate
+    assert memo.misses == misses + 2 * 16
+
+
+def test_timeouts_are_not_memoised(tmp_path):
+    memo = EvaluationMemo()
+    node = square_node(tmp_path, memo)
+    code = SQUARE.format(k=16)
+    outputs, errors = node.call_code_function_parallel(
+        [{"x": -1}, {"x": 3}], [code], timeout=0.2
+    )
+    assert "timed out" in errors[0][0][0] and outputs[0][1] == {"y": 9}
+    assert len(memo.store) == 1
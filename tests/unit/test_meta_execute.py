@@ -0,0 +1,196 @@
+import ast
+import threading
+import time
+
+import pytest
+
+from methods.meta_execute import (
+    CallResult,
+    Timeout_,
+    TimeoutError,
+    call_func_code,
+    call_func_code_batch,
+    call_with_timeout,
+    compile_function,
+    keeps_module_state,
+    reset_peak_rss,
+    timeout_message,
+)
+
+
+def spin(seconds: float) -> int:
+    end, n = time.monotonic() + seconds, 0
+    while time.monotonic() < end:
+        n += 1
+    return n
+
+
+def test_timeout_interrupts_the_block():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError) as error:
+        with Timeout_(0.2):
+            spin(5.0)
+    assert time.monotonic() - start < 1.0
+    assert str(error.value) == timeout_message(0.2)
+
+
+def test_timeout_not_raised_after_the_block():
+    with Timeout_(0.2) as timer:
+        spin(0.05)
+    spin(0.4)  # the deadline passes outside the block
+    assert not timer.timed_out
+
+
+@pytest.mark.parametrize("seconds", [None, 0])
+def test_timeout_disabled(seconds):
+    with Timeout_(seconds) as timer:
+        spin(0.05)
+    assert not timer.timed_out
+
+
+def test_timeout_reset_restarts_the_clock():
+    with Timeout_(0.3) as timer:
+        for _ in range(4):
+            spin(0.15)
+            timer.reset()
+    assert not timer.timed_out
+
+
+def test_timeout_outside_the_main_thread():
+    results = {}
+
+    def run(name, seconds):
+        results[name] = call_with_timeout(spin, seconds, timeout=0.2)
+
+    threads = [
+        threading.Thread(target=run, args=("slow", 5.0)),
+        threading.Thread(target=run, args=("fast", 0.01)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2.0)
+    assert results["slow"].timed_out and not results["slow"].ok
+    assert results["fast"].ok and results["fast"].value > 0
+
+
+def test_call_result_unpacks_as_value_and_error():
+    value, error = CallResult(value=3)
+    assert (value, error) == (3, "")
+    assert CallResult(error="boom").ok is False
+    assert CallResult(value=1, elapsed=1.0) == CallResult(value=1, elapsed=2.0)
+
+
+def test_call_with_timeout_records_errors_and_usage():
+    result = call_with_timeout(spin, 0.05, timeout=1.0)
+    assert result.ok and result.elapsed >= 0.05 and result.cpu_time > 0
+    result = call_with_timeout(lambda: 1 / 0)
+    assert not result.ok and not result.timed_out and "division" in result.error
+
+
+@pytest.mark.skipif(not reset_peak_rss(), reason="needs /proc/self/clear_refs")
+def test_peak_rss_is_measured_per_call():
+    def touch(mb: int) -> int:
+        return len(b"x" * (mb * 2**20))  # written, so resident
+
+    big = call_with_timeout(touch, 256)
+    small = call_with_timeout(touch, 1)
+    assert big.peak_rss - small.peak_rss > 128 * 2**20
+    assert call_func_code_batch([{"x": 1}], CODE, "double").peak_rss < big.peak_rss
+
+
+CODE = """
+def double(x: int) -> int:
+    while x < 0:
+        pass
+    return 2 * x
+"""
+
+
+def test_call_func_code():
+    assert tuple(call_func_code({"x": 2}, CODE, "double")) == (4, "")
+    result = call_func_code({"x": -1}, CODE, "double", timeout=0.2)
+    assert result.timed_out and result.error == timeout_message(0.2)
+    assert "type mismatch" in call_func_code({"x": "2"}, CODE, "double").error
+    assert "Missing required" in call_func_code({}, CODE, "double").error
+
+
+COUNTER = """
+calls = 0
+
+def count(x: int) -> int:
+    global calls
+    calls += 1
+    return calls
+"""
+
+APPEND = """
+seen = []
+
+def count(x: int) -> int:
+    seen.append(x)
+    return len(seen)
+"""
+
+DEFAULT = """
+def count(x: int, seen=[]) -> int:
+    seen.append(x)
+    return len(seen)
+"""
+
+CLASS_STATE = """
+class Tally:
+    total = 0
+
+def count(x: int) -> int:
+    Tally.total += x
+    return Tally.total
+"""
+
+
+@pytest.mark.parametrize("code", [COUNTER, APPEND, DEFAULT, CLASS_STATE])
+def test_module_state_does_not_leak_between_calls(code):
+    assert keeps_module_state(ast.parse(code))
+    assert [call_func_code({"x": 1}, code, "count").value for _ in range(3)] == [1] * 3
+    batch = call_func_code_batch([{"x": 1}] * 3, code, "count")
+    assert list(batch.values) == [1, 1, 1]
+
+
+STATELESS = """
+import math
+from typing import List
+
+SCALE = 2 * 3
+
+class Point:
+    def __init__(self, x: int):
+        self.x = x
+
+def scale(xs: List[int], offset: int = 0) -> List[int]:
+    cache = {}
+    cache[0] = [Point(x).x * SCALE + offset for x in xs]
+    return cache[0]
+"""
+
+
+def test_stateless_modules_are_compiled_once():
+    assert not keeps_module_state(ast.parse(STATELESS))
+    first = compile_function(STATELESS, "scale")
+    assert compile_function(STATELESS, "scale") is first and first.stateless
+    assert compile_function(COUNTER, "count") is not compile_function(COUNTER, "count")
+    assert call_func_code({"xs": [1, 2]}, STATELESS, "scale").value == [6, 12]
+
+
+def test_fresh_modules_still_check_their_own_classes():
+    code = """
+class Box:
+    pass
+
+BOXES = []
+
+def make(x: int) -> Box:
+    BOXES.append(x)
+    return Box()
+"""
+    assert call_func_code({"x": 1}, code, "make").ok
+    assert all(call_func_code_batch([{"x": 1}] * 2, code, "make").ok)
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from methods.meta_prompt import MetaPrompt, PromptMode
+from methods.population import Evolution
+from methods.population_store import PopulationStore, code_key
+
+
+def indiv(k: int, fitness: float = None, **extra) -> dict:
+    return {"code": f"def f():\n    return {k}\n", "fitness": fitness, **extra}
+
+
+def fitnesses(store: PopulationStore) -> list:
+    return [individual["fitness"] for individual in store]
+
+
+def test_code_key_ignores_formatting_comments_and_docstrings():
+    code = "def f(x):\n    return x + 1\n"
+    same = 'def f(x):\n    """Add one"""\n    # comment\n    return (x+1)\n'
+    assert code_key(code) == code_key(same)
+    assert code_key(code) != code_key("def f(x):\n    return x + 2\n")
+    assert code_key("def f(:") == code_key("def  f(:")  # unparsable: whitespace only
+
+
+def test_duplicates_and_partial_individuals_are_rejected():
+    store = PopulationStore()
+    assert store.add(indiv(1, 0.5))
+    assert not store.add({"code": "def f():\n    return 1  # again\n", "fitness": 0.9})
+    assert not store.add(indiv(2, 1.0, partial=True))
+    assert (len(store), store.rejected) == (1, 1)
+    assert store.has_code(indiv(1)["code"]) and not store.has_code(indiv(2)["code"])
+
+
+def test_worst_replacement_at_capacity():
+    store = PopulationStore(capacity=3)
+    assert store.extend(indiv(k, f) for k, f in enumerate([0.5, 0.2, 0.8])) == 3
+    assert store.add(indiv(3, 0.6))  # replaces 0.2
+    assert not store.add(indiv(4, 0.1))  # worse than the worst
+    assert fitnesses(store) == [0.5, 0.8, 0.6]
+    assert (store.evicted, store.rejected) == (1, 1)
+    assert store.best["fitness"] == 0.8
+    assert fitnesses(store.top_k(2)) == [0.8, 0.6]
+
+
+def test_unevaluated_and_ties():
+    store = PopulationStore(capacity=2)
+    store.add(indiv(0, None))
+    store.add({**indiv(1, 0.5), "efficiency": 0.9})
+    assert store.add(
+        {**indiv(2, 0.5), "efficiency": 0.1}
+    )  # replaces the unevaluated one
+    assert not store.add({**indiv(3, 0.5), "efficiency": 0.05})  # slower on a tie
+    assert [i["efficiency"] for i in store] == [0.9, 0.1]
+
+
+def test_crowding_replaces_the_most_similar_individual():
+    base = "def f(x):\n    y = x * 2\n    z = y + 1\n    return z\n"
+    similar = "def f(x):\n    y = x * 2\n    z = y + 3\n    return z\n"
+    other = "def f(x):\n    return x\n"
+    store = PopulationStore(capacity=2, replacement="crowding")
+    store.add({"code": base, "fitness": 0.5})
+    store.add({"code": other, "fitness": 0.1})
+    assert store.add({"code": similar, "fitness": 0.6})  # not the worst, the nearest
+    assert [i["code"] for i in store] == [other, similar]
+    with pytest.raises(ValueError):
+        PopulationStore(replacement="random")
+
+
+def test_snapshot_is_rebuilt_once_per_batch_of_inserts():
+    store = PopulationStore()
+    store.extend(indiv(k, 0.1 * k) for k in range(5))
+    snapshot = store.snapshot()
+    assert store.snapshot() is snapshot and len(snapshot) == 5
+    store.add(indiv(5, 0.5))
+    assert len(snapshot) == 5  # readers keep their immutable view
+    assert len(store.snapshot()) == 6 and store[-1]["fitness"] == 0.5
+    store.clear()
+    assert not store and len(store) == 0
+
+
+def test_concurrent_inserts():
+    store = PopulationStore(capacity=50)
+
+    def insert(offset):
+        for k in range(offset, offset + 100):
+            store.add(indiv(k, k / 400))
+            store.top_k(3)
+
+    threads = [threading.Thread(target=insert, args=(i * 100,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store) == 50
+    assert sorted(fitnesses(store)) == [k / 400 for k in range(350, 400)]
+
+
+@pytest.mark.parametrize("capacity, expected", [(None, None), (1, 2), (8, 8)])
+def test_evolution_population_is_unbounded_unless_capped(tmp_path, capacity, expected):
+    meta_prompt = MetaPrompt(
+        task="Square an integer",
+        func_name="square",
+        inputs=["x"],
+        outputs=["y"],
+        input_types=["int"],
+        output_types=["int"],
+        mode=PromptMode.CODE,
+    )
+    evolution = Evolution(
+        4,
+        meta_prompt,
+        None,
+        test_cases=[({"x": 2}, {"y": 4})],
+        num_parents=2,
+        capacity=capacity,
+    )
+    assert evolution.population.capacity == expected
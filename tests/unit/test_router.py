@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from methods.llm import get_async_client
+from methods.router import (
+    ROUTED_MAX_RETRIES,
+    GenerateServerBackend,
+    LLMRouter,
+    OpenAIBackend,
+)
+
+
+def openai_backend(server, request_timeout: float = 5.0, **kwargs) -> OpenAIBackend:
+    base_url = f"{server.url}/v1"
+    get_async_client().configure_endpoint(base_url, request_timeout=request_timeout)
+    return OpenAIBackend(
+        "fake-model", base_url=base_url, api_key="test", name=server.name, **kwargs
+    )
+
+
+def generate_backend(server, timeout: float = 5.0) -> GenerateServerBackend:
+    return GenerateServerBackend(server.url, name=server.name, timeout=timeout)
+
+
+def route(backends, **kwargs) -> LLMRouter:
+    kwargs.setdefault("system_prompt", "")  # fake servers answer "<name>:<prompt>"
+    return LLMRouter(backends, **kwargs)
+
+
+PROMPTS = [f"p{i}" for i in range(10)]
+
+
+@pytest.mark.parametrize("make_backend", [openai_backend, generate_backend])
+def test_results_keep_prompt_order(servers, make_backend):
+    router = route([make_backend(servers("a"))], shard_size=3)
+    assert router(PROMPTS) == [f"a:{p}" for p in PROMPTS]
+    assert router("single") == "a:single"
+    assert router.health["a"].failures == 0
+
+
+@pytest.mark.parametrize("make_backend", [openai_backend, generate_backend])
+def test_failover_on_5xx(servers, make_backend):
+    down, up = servers("down", mode="error"), servers("up")
+    router = route([make_backend(down), make_backend(up)], shard_size=4)
+    assert router(PROMPTS) == [f"up:{p}" for p in PROMPTS]
+    assert down.requests > 0
+    assert router.health["down"].failures > 0
+    assert router.health["up"].failures == 0
+
+
+def test_failover_on_timeout(servers):
+    slow, fast = servers("slow", mode="slow", delay=2.0), servers("fast")
+    router = route(
+        [openai_backend(slow, request_timeout=0.2), generate_backend(fast)],
+        shard_size=len(PROMPTS),
+    )
+    start = time.monotonic()
+    assert router(PROMPTS) == [f"fast:{p}" for p in PROMPTS]
+    assert time.monotonic() - start < 2.0
+    assert slow.requests > 0
+
+    slow_generate = GenerateServerBackend(slow.url, name="slow-generate", timeout=0.2)
+    router = route([slow_generate, generate_backend(fast)], shard_size=len(PROMPTS))
+    assert router(PROMPTS) == [f"fast:{p}" for p in PROMPTS]
+
+
+def test_cooldown_and_readmission(servers):
+    flaky, steady = servers("flaky", mode="error"), servers("steady")
+    router = route(
+        [generate_backend(flaky), generate_backend(steady)],
+        shard_size=len(PROMPTS),
+        alpha=1.0,
+        max_error_rate=0.5,
+        cooldown=0.5,
+    )
+    assert router(PROMPTS) == [f"steady:{p}" for p in PROMPTS]
+    assert not router.health["flaky"].healthy(time.monotonic())
+
+    # in cooldown: a healthy backend is left, the flaky one is not even tried
+    flaky.mode = "ok"
+    requests = flaky.requests
+    assert router(PROMPTS) == [f"steady:{p}" for p in PROMPTS]
+    assert flaky.requests == requests
+
+    # cooldown over: probed again ahead of the measured backend, and serves
+    time.sleep(0.6)
+    assert router(PROMPTS) == [f"flaky:{p}" for p in PROMPTS]
+    assert router.health["flaky"].healthy(time.monotonic())
+
+
+def test_every_backend_down_returns_empty_responses(servers):
+    router = route(
+        [generate_backend(servers("a", mode="error"))], shard_size=len(PROMPTS)
+    )
+    assert router(PROMPTS[:3]) == ["", "", ""]
+
+
+def test_system_prompt_reaches_every_backend(servers):
+    chat, generate = servers("chat"), servers("generate")
+    router = LLMRouter([openai_backend(chat)], system_prompt="Be brief.")
+    router("p")
+    assert chat.bodies[-1]["messages"][0] == {"role": "system", "content": "Be brief."}
+
+    router = LLMRouter([generate_backend(generate)], system_prompt="Be brief.")
+    router(["p", "q"])
+    assert generate.bodies[-1] == ["Be brief.\n\np", "Be brief.\n\nq"]
+
+
+def test_dead_endpoint_fails_over_without_the_full_backoff(servers):
+    down, up = servers("down", mode="error"), servers("up")
+    backend = openai_backend(down)
+    assert get_async_client().get_scheduler(backend.base_url).max_retries == (
+        ROUTED_MAX_RETRIES
+    )
+    router = route([backend, generate_backend(up)], shard_size=len(PROMPTS))
+    start = time.monotonic()
+    assert router(PROMPTS) == [f"up:{p}" for p in PROMPTS]
+    assert time.monotonic() - start < 2.0
+    assert down.requests == len(PROMPTS) * (ROUTED_MAX_RETRIES + 1)
@@ -0,0 +1,118 @@
+import pytest
+
+from methods.evolnode import EvolNode
+from methods.memo import EvaluationMemo
+from methods.meta_execute import timeout_message
+from methods.meta_prompt import MetaPrompt, PromptMode
+from methods.sandbox import SandboxPool
+
+CODE = """
+import os
+
+def run(mode: str, n: int = 0) -> int:
+    if mode == "spin":
+        while True:
+            pass
+    if mode == "c_loop":  # one C call: SIGALRM never gets a bytecode boundary
+        return sum(range(10 ** 13))
+    if mode == "crash":
+        os._exit(3)
+    if mode == "allocate":
+        return len(bytearray(n * 1024 * 1024))
+    return n
+"""
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with SandboxPool(num_workers=2, timeout=0.3, memory_limit=256) as pool:
+        yield pool
+
+
+def run(pool: SandboxPool, mode: str, n: int = 0, **kwargs):
+    (result,) = pool.map(CODE, "run", [{"mode": mode, "n": n}], **kwargs)
+    return result
+
+
+def test_results_keep_input_order(pool):
+    inputs = [{"mode": "echo", "n": i} for i in range(50)]
+    assert [r.value for r in pool.map(CODE, "run", inputs)] == list(range(50))
+
+
+def test_timeout_in_worker(pool):
+    result = run(pool, "spin")
+    assert result.timed_out and result.error == timeout_message(0.3)
+    assert run(pool, "echo", 1).value == 1
+
+
+def test_c_level_loop_is_killed_and_worker_replaced(pool):
+    timeouts = pool.stats["timeouts"]
+    pids = {worker.process.pid for worker in pool._workers}
+    result = run(pool, "c_loop")
+    assert result.timed_out and result.error == timeout_message(0.3)
+    assert pool.stats["timeouts"] == timeouts + 1
+    assert run(pool, "echo", 2).value == 2
+    assert len({worker.process.pid for worker in pool._workers} - pids) == 1
+
+
+def test_crash_fails_only_its_task(pool):
+    crashes = pool.stats["crashes"]
+    inputs = [{"mode": "echo", "n": 1}, {"mode": "crash"}, {"mode": "echo", "n": 3}]
+    results = pool.map(CODE, "run", inputs)
+    assert results[0].value == 1 and results[2].value == 3
+    assert "crashed (exit code 3)" in results[1].error
+    assert results[1].crashed and not results[1].reproducible
+    assert pool.stats["crashes"] == crashes + 1
+    assert run(pool, "echo", 4).value == 4
+
+
+def test_memory_limit(pool):
+    assert run(pool, "allocate", 64).value == 64 * 1024 * 1024
+    result = run(pool, "allocate", 1024, timeout=5.0)
+    assert not result.ok and "MemoryError" in result.error and result.crashed
+    assert run(pool, "echo", 5).value == 5
+
+
+def test_closed_pool_rejects_work():
+    pool = SandboxPool(num_workers=1)
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.submit(CODE, "run", [{"mode": "echo"}])
+
+
+def run_node(tmp_path, **kwargs) -> EvolNode:
+    meta_prompt = MetaPrompt(
+        task="Run a mode",
+        func_name="run",
+        inputs=["mode", "n"],
+        outputs=["y"],
+        input_types=["str", "int"],
+        output_types=["int"],
+        mode=PromptMode.CODE,
+    )
+    test_cases = [({"mode": "echo", "n": 0}, {"y": 0})]
+    return EvolNode(
+        meta_prompt,
+        test_cases=test_cases,
+        get_response=None,
+        libary_dir=str(tmp_path),
+        **kwargs,
+    )
+
+
+def test_crashes_are_not_memoised(pool, tmp_path):
+    memo = EvaluationMemo()
+    node = run_node(tmp_path, sandbox=pool, memo=memo)
+    inputs = [
+        {"mode": "echo", "n": 1},
+        {"mode": "crash"},
+        {"mode": "allocate", "n": 1024},
+    ]
+    outputs, errors = node.call_code_function_parallel(inputs, [CODE], timeout=5.0)
+    assert outputs[0][0] == {"y": 1}
+    assert "crashed" in errors[0][1][0] and "MemoryError" in errors[0][2][0]
+    assert len(memo.store) == 1
+
+
+def test_sandbox_is_opt_in(tmp_path):
+    assert run_node(tmp_path).sandbox is False
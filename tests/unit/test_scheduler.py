@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+
+from methods.scheduler import (
+    AdaptiveConcurrency,
+    EndpointScheduler,
+    TokenBucket,
+    is_retryable,
+    retry_after,
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def test_aimd_grows_additively_and_halves_on_throttling():
+    async def scenario():
+        window = AdaptiveConcurrency(initial=4, max_limit=8, cooldown=10.0)
+        for _ in range(4):
+            await window.acquire()
+        assert window.in_flight == 4
+        for _ in range(4):
+            await window.release()
+        assert window.limit == pytest.approx(4.9, abs=0.1)  # about +1 per window
+
+        await window.acquire()
+        await window.release(throttled=True)
+        throttled = window.limit
+        await window.acquire()
+        await window.release(throttled=True)  # within the cooldown: no second cut
+        return throttled, window.limit
+
+    throttled, limit = asyncio.run(scenario())
+    assert throttled == pytest.approx(2.45, abs=0.05)
+    assert limit == throttled
+
+
+def test_aimd_window_bounds_in_flight_requests():
+    async def scenario():
+        window = AdaptiveConcurrency(initial=2)
+        peak = 0
+
+        async def task():
+            nonlocal peak
+            await window.acquire()
+            peak = max(peak, window.in_flight)
+            await asyncio.sleep(0.01)
+            await window.release(success=False)
+
+        await asyncio.gather(*(task() for _ in range(10)))
+        return peak, window.limit
+
+    assert asyncio.run(scenario()) == (2, 2.0)
+
+
+def test_token_bucket_paces_after_the_burst():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=600, capacity=5)  # 10 / second
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        for _ in range(3):
+            await bucket.acquire()
+        return burst, time.monotonic() - start
+
+    burst, total = asyncio.run(scenario())
+    assert burst < 0.05
+    assert 0.25 <= total < 0.6
+
+
+def test_retry_classification():
+    assert is_retryable(HTTPError(429)) and is_retryable(HTTPError(503))
+    assert not is_retryable(HTTPError(400))
+    assert is_retryable(asyncio.TimeoutError()) and not is_retryable(ValueError())
+    assert retry_after(HTTPError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(HTTPError(429)) is None
+
+
+def test_scheduler_retries_then_succeeds():
+    errors = [HTTPError(429), HTTPError(500)]
+
+    async def request():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    scheduler = EndpointScheduler(initial_concurrency=8, base_delay=0.01)
+    trace = {}
+    assert asyncio.run(scheduler.submit(request, trace=trace)) == "ok"
+    assert trace["retries"] == 2
+    assert str(scheduler.stats) == "1/1 ok, 2 retries (1 throttled), 0 failures"
+    assert scheduler.stats.status_counts == {429: 1, 500: 1}
+    assert scheduler.concurrency == 4  # halved once by the 429
+
+
+def test_scheduler_raises_non_retryable_and_exhausted_errors():
+    async def bad_request():
+        raise HTTPError(400)
+
+    async def unavailable():
+        raise HTTPError(503)
+
+    scheduler = EndpointScheduler(max_retries=2, base_delay=0.01)
+    with pytest.raises(HTTPError):
+        asyncio.run(scheduler.submit(bad_request))
+    assert scheduler.stats.retries == 0
+    with pytest.raises(HTTPError):
+        asyncio.run(scheduler.submit(unavailable))
+    assert (scheduler.stats.retries, scheduler.stats.failures) == (2, 2)
+
+
+def test_scheduler_request_timeout():
+    async def hang():
+        await asyncio.sleep(5)
+
+    scheduler = EndpointScheduler(max_retries=0, request_timeout=0.1)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scheduler.submit(hang))
+    assert time.monotonic() - start < 1.0
+
+
+def test_backoff_honours_retry_after():
+    scheduler = EndpointScheduler(base_delay=0.01, max_delay=0.1)
+    assert scheduler.backoff(10) <= 0.1
+    assert scheduler.backoff(0, HTTPError(429, {"retry-after": "3"})) == 3.0
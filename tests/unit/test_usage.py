@@ -0,0 +1,31 @@
+from methods.usage import CallRecord, UsageTracker
+
+
+def call(tag: str, model: str = "gpt-4o-mini", tokens: int = 10) -> CallRecord:
+    return CallRecord(tag, model, tokens, tokens, latency=0.1)
+
+
+def test_totals_since_a_mark():
+    tracker = UsageTracker()
+    tracker.record(call("evolve"))
+    mark = tracker.mark()
+    tracker.record(call("evolve", tokens=5))
+    tracker.record(call("alignment", model="gpt-4o"))
+
+    summary = tracker.summary(since=mark)
+    assert set(summary) == {"evolve", "alignment"}
+    assert (summary["evolve"].calls, summary["evolve"].prompt_tokens) == (1, 5)
+    assert set(tracker.summary(since=mark, by="model")) == {"gpt-4o-mini", "gpt-4o"}
+    assert tracker.total(since=mark).calls == 2
+    assert tracker.total().calls == 3
+
+
+def test_records_are_bounded_but_totals_are_not():
+    tracker = UsageTracker(max_records=10)
+    for _ in range(1000):
+        tracker.record(call("evolve"))
+    assert len(tracker.records) == 10
+    assert tracker.total().calls == 1000
+    assert tracker.total().prompt_tokens == 10_000
+    tracker.reset()
+    assert tracker.total().calls == 0 and not tracker.records